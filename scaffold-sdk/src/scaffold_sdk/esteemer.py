@@ -1,4 +1,6 @@
+import threading
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 
 
 class Esteemer(ABC):
@@ -13,17 +15,46 @@ class Esteemer(ABC):
     def version(self) -> str:
         pass
 
+    def select_candidates(self, batch) -> list:
+        """
+        Selects a candidate for each run in the batch, in order. Each item is a context like the one
+        passed to the constructor (performance_month, subject, request_info, subject_graph).
+
+        The default calls select_candidate once per item; plugins that can score many subjects
+        at once can override it.
+        """
+        selections = []
+        for context in batch:
+            with self.selecting_for(context):
+                selections.append(self.select_candidate())
+        return selections
+
+    @contextmanager
+    def selecting_for(self, context):
+        """Reads the per-run values from the given context, on this thread, until the block exits"""
+        previous = getattr(self._batch, "context", None)
+        self._batch.context = context
+        try:
+            yield self
+        finally:
+            self._batch.context = previous
+
     def __new__(cls, *args, **kwargs):
         if cls not in cls._instances:
             instance = super().__new__(cls)
+            instance._batch = threading.local()
             cls._instances[cls] = instance
         return cls._instances[cls]
 
+    @classmethod
+    def reset(cls):
+        """Drops the shared instance so the next one is initialized again"""
+        cls._instances.pop(cls, None)
+
     def __init__(self, context):
-        self.performance_month = context.performance_month
-        self.subject = context.subject
-        self.req_info = context.request_info
-        self.subject_graph = context.subject_graph
+        # the instance is shared, so the per-run values below are read from the context
+        # on every access rather than copied onto it
+        self._context = context
 
         if not getattr(self, "_initialized", False):
             self._initialize()
@@ -31,3 +62,39 @@ class Esteemer(ABC):
 
     def _initialize(self):
         pass
+
+    def _active_context(self):
+        context = getattr(self._batch, "context", None)
+        return self._context if context is None else context
+
+    @property
+    def performance_month(self):
+        return self._active_context().performance_month
+
+    @performance_month.setter
+    def performance_month(self, value):
+        self._active_context().performance_month = value
+
+    @property
+    def subject(self):
+        return self._active_context().subject
+
+    @subject.setter
+    def subject(self, value):
+        self._active_context().subject = value
+
+    @property
+    def req_info(self):
+        return self._active_context().request_info
+
+    @req_info.setter
+    def req_info(self, value):
+        self._active_context().request_info = value
+
+    @property
+    def subject_graph(self):
+        return self._active_context().subject_graph
+
+    @subject_graph.setter
+    def subject_graph(self, value):
+        self._active_context().subject_graph = value
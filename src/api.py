@@ -1,7 +1,14 @@
+import asyncio
+import contextvars
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import RedirectResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 
 from src import context
+from src.pictoralist.pictoralist import IMAGE_MEDIA_TYPES, render_pool
 from src.pipeline import pipeline
 from src.startup import startup
 from src.utils.settings import settings
@@ -11,6 +18,10 @@ app = FastAPI()
 
 startup()
 
+# the pipeline runs on these threads so the event loop stays free for other requests
+executor = ThreadPoolExecutor(max_workers=settings.api_concurrency)
+pending_requests = 0  # running or waiting for a thread; only touched on the event loop
+
 
 @app.get("/")
 async def root():
@@ -28,14 +39,14 @@ async def template():
     return RedirectResponse(url=github_link)
 
 
-@app.post("/createprecisionfeedback/")
-async def createprecisionfeedback(info: Request):
-    req_info = await info.json()
-
+def create_feedback(req_info: dict) -> dict:
     try:
         context.from_req(req_info)
 
-        full_message = pipeline()
+        full_message = pipeline(
+            defer_image=settings.deferred_images,
+            binary_image=settings.image_encoding == "binary",
+        )
         full_message["message_instance_id"] = req_info["@id"]
         full_message["performance_measure_report"] = req_info[
             "performance_measure_report"
@@ -48,3 +59,102 @@ async def createprecisionfeedback(info: Request):
         raise e
 
     return full_message
+
+
+@app.post("/createprecisionfeedback/")
+async def createprecisionfeedback(info: Request):
+    global pending_requests
+
+    req_info = await info.json()
+
+    if pending_requests >= settings.api_concurrency + settings.api_queue_depth:
+        request_id = req_info.get("@id") if isinstance(req_info, dict) else None
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "message": "Server is busy, try again later.",
+                "message_instance_id": request_id,
+            },
+            headers={"Retry-After": "1"},
+        )
+
+    pending_requests += 1
+    try:
+        full_message = await asyncio.get_running_loop().run_in_executor(
+            # each request gets its own copy of the pipeline context
+            executor, contextvars.copy_context().run, create_feedback, req_info
+        )
+    finally:
+        pending_requests -= 1
+
+    if settings.image_encoding == "binary":
+        return multipart_response(full_message)
+    return full_message
+
+
+def multipart_response(full_message: dict) -> Response:
+    """
+    The feedback as a multipart/mixed response: the JSON message first, then the chart's raw bytes
+    if there is one. The message's image refers to the chart part by its Content-ID.
+    """
+    # responses without a selected message have no message, and so no chart
+    image = full_message.get("message", {}).get("image")
+    binary = isinstance(image, bytes)
+    if binary:
+        full_message["message"]["image"] = "cid:image"
+
+    parts = [
+        (
+            {"Content-Type": "application/json"},
+            JSONResponse(jsonable_encoder(full_message)).body,
+        )
+    ]
+    if binary:
+        parts.append(
+            (
+                {
+                    "Content-Type": IMAGE_MEDIA_TYPES[settings.image_format],
+                    "Content-ID": "<image>",
+                },
+                image,
+            )
+        )
+
+    boundary = uuid.uuid4().hex
+    body = b""
+    for headers, content in parts:
+        body += f"--{boundary}\r\n".encode()
+        body += "".join(f"{name}: {value}\r\n" for name, value in headers.items()).encode()
+        body += b"\r\n" + content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+
+    return Response(content=body, media_type=f"multipart/mixed; boundary={boundary}")
+
+
+@app.get("/image/{ticket}")
+async def image(ticket: str):
+    future = render_pool.get(ticket)
+    if future is None:
+        raise HTTPException(
+            status_code=404,
+            detail={"message": "Unknown image ticket.", "image_ticket": ticket},
+        )
+
+    try:
+        # shielded so a client giving up doesn't cancel the render for everyone else
+        image_bytes = await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)), settings.image_wait_timeout
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail={"message": "Image is not ready yet.", "image_ticket": ticket},
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail={"message": f"Image could not be drawn: {e}", "image_ticket": ticket},
+        )
+
+    return Response(content=image_bytes, media_type=IMAGE_MEDIA_TYPES[settings.image_format])
@@ -2,7 +2,7 @@ import pandas as pd
 from rdflib import RDF, BNode, Graph
 
 from src import context, startup
-from src.bitstomach.signals import SIGNALS
+from src.bitstomach.signals import SIGNALS, SignalEvaluation
 from src.utils.namespace import PSDO, SLOWMO
 from src.utils.settings import settings
 
@@ -19,15 +19,17 @@ def extract_signals(perf_df: pd.DataFrame) -> Graph:
     if perf_df.empty:
         return g
 
+    run = context.current()
     for measure in perf_df.attrs["valid_measures"]:
         measure_df = (
             perf_df[perf_df["measure"] == measure].tail(12).sort_values("period.start")
         )
-        comparator_df = context.comparator_df[
-            context.comparator_df["measure"] == measure
+        comparator_df = run.comparator_df[
+            run.comparator_df["measure"] == measure
         ].sort_values("period.start")
+        evaluation = SignalEvaluation(measure_df, comparator_df)
         for signal_type in SIGNALS:
-            signals = signal_type.detect(measure_df, comparator_df)
+            signals = evaluation.detect(signal_type)
             if not signals:
                 continue
 
@@ -39,10 +41,11 @@ def extract_signals(perf_df: pd.DataFrame) -> Graph:
 
 
 def prepare():
-    performance_df = context.performance_df
+    run = context.current()
+    performance_df = run.performance_df
 
     performance_df = performance_df[
-        performance_df["period.start"] <= context.performance_month
+        performance_df["period.start"] <= run.performance_month
     ].copy()
 
     # Mark rows as valid when denominator meets minimum count.
@@ -53,7 +56,7 @@ def prepare():
     # Collect measures that are valid for the current performance month.
     performance_df.attrs["valid_measures"] = performance_df[
         (
-            (performance_df["period.start"] == context.performance_month)
+            (performance_df["period.start"] == run.performance_month)
             & performance_df["valid"]
         )
     ]["measure"]
@@ -85,14 +85,22 @@ class Signal:
         return False
 
 
-# TODO: revisit. at this time must be loaded after Signal and in order Comparison, Trend and then Achievement
+# TODO: revisit. at this time must be loaded after Signal and in order Comparison, Trend, SignalEvaluation and then Achievement
 from src.bitstomach.signals._comparison import Comparison  # noqa: E402, I001
 from src.bitstomach.signals._trend import Trend  # noqa: E402, I001
+from src.bitstomach.signals._evaluation import SignalEvaluation  # noqa: E402, I001
 from src.bitstomach.signals._achievement import Achievement  # noqa: E402, I001
 from src.bitstomach.signals._loss import Loss  # noqa: E402, I001
 from src.bitstomach.signals._approach import Approach  # noqa: E402, I001
 
-__all__ = ["Comparison", "Trend", "Achievement", "Loss", "Approach"]
+__all__ = [
+    "Comparison",
+    "Trend",
+    "Achievement",
+    "Loss",
+    "Approach",
+    "SignalEvaluation",
+]
 
 SIGNALS = {
     Comparison: Signal,
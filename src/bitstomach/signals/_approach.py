@@ -5,8 +5,7 @@ import pandas as pd
 from rdflib import RDF, Literal, URIRef
 from rdflib.resource import Resource
 
-from src import startup
-from src.bitstomach.signals import Comparison, Signal, Trend
+from src.bitstomach.signals import Comparison, Signal, SignalEvaluation, Trend
 from src.utils.namespace import PSDO, SLOWMO
 
 
@@ -16,15 +15,17 @@ class Approach(Signal):
 
     @staticmethod
     def detect(
-        perf_data: pd.DataFrame, comparator_data: pd.DataFrame
+        perf_data: pd.DataFrame, comparator_data: pd.DataFrame, evaluation=None
     ) -> Optional[List[Resource]]:
         if perf_data.empty:
             raise ValueError
 
+        evaluation = evaluation or SignalEvaluation(perf_data, comparator_data)
+
         if Approach.check(perf_data) is False:
             return []
 
-        trend_signals = Trend.detect(perf_data)
+        trend_signals = evaluation.trend()
         if (
             not trend_signals
             or not trend_signals[0][RDF.type : PSDO.positive_performance_trend_content]
@@ -33,19 +34,17 @@ class Approach(Signal):
 
         negative_comparison_signals = [
             s
-            for s in Comparison.detect(perf_data, comparator_data)
+            for s in evaluation.comparisons()
             if s[RDF.type : PSDO.negative_performance_gap_content]
         ]
 
         negative_prior_month_comparisons = [
             s
-            for s in Comparison.detect(perf_data.iloc[:-1], comparator_data)
+            for s in evaluation.prior_comparisons()
             if s[RDF.type : PSDO.negative_performance_gap_content]
         ]
 
         approach_signals = []
-        current_measure_type =  startup.measure_catalog[perf_data["measure"].iloc[0]].improvement_notation
-
         for comparison_signal in negative_comparison_signals:
             previous_comparison_signal = next(
                 (
@@ -62,11 +61,8 @@ class Approach(Signal):
             if not previous_comparison_signal:
                 continue
 
-            streak_length = Approach._detect(
-                perf_data,
-                comparison_signal.value(SLOWMO.RegardingComparator),
-                comparator_data,
-                current_measure_type,
+            streak_length = Approach._streak(
+                evaluation.gaps(Comparison.comparator_type(comparison_signal))
             )
 
             mi = Approach._resource(
@@ -165,21 +161,19 @@ class Approach(Signal):
 
         comparator_id = comparator.value(RDF.type).identifier
 
-        comparator_values = comparator_data[
-            comparator_data["group.code"] == str(comparator_id)
-        ][["period.start", "measureScore.rate"]]
-        comparator_values = comparator_values.rename(
-            columns={"measureScore.rate": "comparator"}
+        gaps = Comparison.gaps(
+            perf_data, str(comparator_id), comparator_data, current_measure_type
         )
-        merged = pd.merge(perf_data, comparator_values, on="period.start", how="left")
 
-        if current_measure_type == "increase":
-            gaps = merged["measureScore.rate"] - merged["comparator"]
-        elif current_measure_type == "decrease":
-            gaps = merged["comparator"] - merged["measureScore.rate"]
+        return Approach._streak(gaps)
 
+    @staticmethod
+    def _streak(gaps: np.ndarray) -> int:
+        """
+        counts the consecutive negative gaps prior to this months gap.
+        """
         # find the number of consecutive negative gaps
-        diff_reversed = gaps.values[:-1][::-1]
+        diff_reversed = gaps[:-1][::-1]
 
         end_negative_gaps_index = np.argmax(diff_reversed >= 0)
         if end_negative_gaps_index == 0:
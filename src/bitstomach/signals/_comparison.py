@@ -1,5 +1,6 @@
 from typing import List, Optional, Union
 
+import numpy as np
 import pandas as pd
 from rdflib import RDF, BNode, Literal, URIRef
 from rdflib.resource import Resource
@@ -85,7 +86,7 @@ class Comparison(Signal):
         """Calculate gap from levels and comparators"""
 
         gaps: dict = {}
-        for comparator in context.subject_graph.subjects(
+        for comparator in context.current().subject_graph.subjects(
             RDF.type, PSDO.comparator_content
         ):
             comparator_iri = str(comparator)
@@ -106,6 +107,30 @@ class Comparison(Signal):
 
         return gaps
 
+    @staticmethod
+    def gaps(
+        perf_data: pd.DataFrame,
+        comparator_id: str,
+        comparator_data: pd.DataFrame,
+        current_measure_type: URIRef,
+    ) -> np.ndarray:
+        """Calculate the gap to the comparator for every period in the performance data"""
+
+        comparator_values = comparator_data[
+            comparator_data["group.code"] == comparator_id
+        ][["period.start", "measureScore.rate"]]
+        comparator_values = comparator_values.rename(
+            columns={"measureScore.rate": "comparator"}
+        )
+        merged = pd.merge(perf_data, comparator_values, on="period.start", how="left")
+
+        if current_measure_type == "increase":
+            gaps = merged["measureScore.rate"] - merged["comparator"]
+        elif current_measure_type == "decrease":
+            gaps = merged["comparator"] - merged["measureScore.rate"]
+
+        return gaps.values
+
     @classmethod
     def moderators(cls, motivating_informations: List[Resource]) -> List[dict]:
         """
@@ -139,7 +164,6 @@ class Comparison(Signal):
         disposition.append(comparator_type)
 
         disposition += list(comparator_type[RDF.type])
-        TypeError
         return disposition
 
     @classmethod
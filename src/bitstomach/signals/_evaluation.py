@@ -0,0 +1,68 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from rdflib.resource import Resource
+
+from src import startup
+from src.bitstomach.signals import Comparison, Trend
+
+
+class SignalEvaluation:
+    """
+    Per-measure memo of the sub-signals shared by the signal classes.
+
+    Achievement, Approach and Loss are built from the trend, this month's and last month's
+    comparisons and the gap history against each comparator. An evaluation computes each of
+    these once per measure, on first use, so every signal class detecting on the same measure
+    reuses them instead of recomputing.
+    """
+
+    def __init__(self, perf_data: pd.DataFrame, comparator_data: pd.DataFrame):
+        self.perf_data = perf_data
+        self.comparator_data = comparator_data
+        self._trend: Optional[List[Resource]] = None
+        self._comparisons: Optional[List[Resource]] = None
+        self._prior_comparisons: Optional[List[Resource]] = None
+        self._gaps: dict[str, np.ndarray] = {}
+
+    def detect(self, signal_type) -> Optional[List[Resource]]:
+        """The measure's signals of the signal type, the trend and comparisons computed only once"""
+        if signal_type is Trend:
+            return self.trend()
+        if signal_type is Comparison:
+            return self.comparisons()
+        return signal_type.detect(self.perf_data, self.comparator_data, self)
+
+    @property
+    def measure_type(self) -> str:
+        return startup.measure_catalog[
+            self.perf_data["measure"].iloc[0]
+        ].improvement_notation
+
+    def trend(self) -> List[Resource]:
+        if self._trend is None:
+            self._trend = Trend.detect(self.perf_data)
+        return self._trend
+
+    def comparisons(self) -> List[Resource]:
+        if self._comparisons is None:
+            self._comparisons = Comparison.detect(self.perf_data, self.comparator_data)
+        return self._comparisons
+
+    def prior_comparisons(self) -> List[Resource]:
+        """comparisons as of last month"""
+        if self._prior_comparisons is None:
+            self._prior_comparisons = Comparison.detect(
+                self.perf_data.iloc[:-1], self.comparator_data
+            )
+        return self._prior_comparisons
+
+    def gaps(self, comparator_id: str) -> np.ndarray:
+        """gaps to the comparator for every month of the performance data"""
+        comparator_id = str(comparator_id)
+        if comparator_id not in self._gaps:
+            self._gaps[comparator_id] = Comparison.gaps(
+                self.perf_data, comparator_id, self.comparator_data, self.measure_type
+            )
+        return self._gaps[comparator_id]
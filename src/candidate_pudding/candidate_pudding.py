@@ -5,24 +5,42 @@ from rdflib.resource import Resource
 
 from src import context, startup
 from src.bitstomach.signals import Signal
-from src.utils.namespace import CPO, IAO, PSDO, RO, SCHEMA, SLOWMO
-
-PERFORMANCE_SUMMARY_DISPLAY_TEMPLATE = URIRef(
-    "http://data.bioontology.org/ontologies/PSDO/classes/http%3A%2F%2Fpurl.obolibrary.org%2Fobo%2FPSDO_0000002"
-)
-CPO_HAS_PRECONDITIONS = URIRef(
-    "http://purl.bioontology.org/ontology/SNOMEDCT/has_precondition"
+from src.models.message_template import (  # noqa: F401
+    CPO_HAS_PRECONDITIONS,
+    DEFAULT_DISPLAY,
+    PERFORMANCE_SUMMARY_DISPLAY_TEMPLATE,
+    MessageTemplate,
 )
+from src.models.precondition_index import PreconditionIndex
+from src.utils.namespace import PSDO, RO, SLOWMO
+
+
+def message_template(template: Resource) -> MessageTemplate:
+    """Looks up the startup-built record for the template, compiling it from the graph if it is not in the catalog"""
+    record = startup.message_templates.get(template.identifier)
+    if record is None:
+        record = MessageTemplate.from_resource(template)
+    return record
 
-DEFAULT_DISPLAY = URIRef(
-    "https://schema.metadatacenter.org/properties/5b4f16a9-feb7-4724-8741-2739d8808760"
-)
 
+def candidate_template(candidate: Resource) -> MessageTemplate:
+    return message_template(candidate.value(SLOWMO.AncestorTemplate))
 
-def create_candidate(measure: Resource, template: Resource) -> Optional[Resource]:
+
+def precondition_index(record: MessageTemplate) -> PreconditionIndex:
+    """The startup-built index for catalog templates, or a single pathway index for any other template"""
+    if startup.message_templates.get(record.identifier) is record:
+        return startup.precondition_index
+    return PreconditionIndex.from_templates([record])
+
+
+def create_candidate(
+    measure: Resource, template: Resource, record: Optional[MessageTemplate] = None
+) -> Optional[Resource]:
     g: Graph = measure.graph
+    record = record or message_template(template)
 
-    if not template.value(CPO.has_causal_pathway):
+    if not record.causal_pathway:
         return None
 
     candidate = g.resource(BNode())
@@ -31,16 +49,18 @@ def create_candidate(measure: Resource, template: Resource) -> Optional[Resource
     candidate[SLOWMO.AncestorTemplate] = template
     # TODO: Add candidate[SLOWMO.CausalPathway] = causal_pathway, to make it easier for down stream code
 
-    if not add_motivating_information(candidate):
+    if not add_motivating_information(candidate, record):
         g.remove((candidate.identifier, None, None))
         return None
 
-    add_convenience_properties(candidate)
+    add_convenience_properties(candidate, record)
 
     return candidate
 
 
-def add_motivating_information(candidate: Resource):
+def add_motivating_information(
+    candidate: Resource, record: Optional[MessageTemplate] = None
+):
     performance_content = candidate.graph.resource(BNode("performance_content"))
     measure = candidate.value(SLOWMO.RegardingMeasure)
     motivating_informations = [
@@ -52,7 +72,8 @@ def add_motivating_information(candidate: Resource):
     if not motivating_informations:
         return None
 
-    roles = list(candidate[SLOWMO.AncestorTemplate / IAO.is_about])  #
+    record = record or candidate_template(candidate)
+    roles = [candidate.graph.resource(role) for role in record.roles]  #
 
     for motivating_information in motivating_informations:
         signal: Signal = Signal.for_type(motivating_information)  #
@@ -66,85 +87,60 @@ def add_motivating_information(candidate: Resource):
     return candidate
 
 
-def acceptable_by(candidate: Resource):
-    pathway = candidate.value(SLOWMO.AncestorTemplate / CPO.has_causal_pathway)
-
-    roles = list(candidate[SLOWMO.AncestorTemplate / IAO.is_about])
-
-    mi_dispositions = list(candidate[RO.has_disposition])
+def acceptable_by(candidate: Resource, record: Optional[MessageTemplate] = None):
+    record = record or candidate_template(candidate)
 
-    pre_conditions = set(pathway[CPO_HAS_PRECONDITIONS])
-
-    if not pre_conditions:
+    if not record.preconditions:
         raise ValueError(
-            f"The causal pathway {str(pathway.value(URIRef('http://schema.org/name')))} regarding which the candidate is created does not have preconditions defined."
+            f"The causal pathway {str(record.causal_pathway_name)} regarding which the candidate is created does not have preconditions defined."
         )
 
-    dispositions = roles + mi_dispositions
+    index = precondition_index(record)
+    mask = index.mask(record.roles) | index.mask(
+        candidate.graph.objects(candidate.identifier, RO.has_disposition)
+    )
 
-    if pre_conditions.issubset(dispositions):
-        candidate[SLOWMO.AcceptableBy] = pathway.value(SCHEMA.name)
+    if index.accepts(record.causal_pathway, mask):
+        candidate[SLOWMO.AcceptableBy] = record.causal_pathway_name
 
     return candidate
 
 
-def add_convenience_properties(candidate: Resource):
-    candidate[SLOWMO.name] = candidate.value(
-        SLOWMO.AncestorTemplate / URIRef("http://schema.org/name")
-    )
+def add_convenience_properties(
+    candidate: Resource, record: Optional[MessageTemplate] = None
+):
+    record = record or candidate_template(candidate)
 
-    candidate[URIRef("psdo:PerformanceSummaryTextualEntity")] = candidate.value(
-        SLOWMO.AncestorTemplate
-        / URIRef(
-            "https://schema.metadatacenter.org/properties/6b9dfdf9-9c8a-4d85-8684-a24bee4b85a8"
-        )
-    )
+    candidate[SLOWMO.name] = record.name
 
-    comparator = next(
-        (
-            ttype
-            for ttype in candidate[SLOWMO.AncestorTemplate / IAO.is_about]
-            if ttype[RDF.type : PSDO.comparator_content]
-        ),
-        None,
-    )
+    candidate[URIRef("psdo:PerformanceSummaryTextualEntity")] = record.text
 
-    candidate[SLOWMO.RegardingComparator] = comparator or Literal(None)
-    candidate[SLOWMO.Display] = candidate.value(
-        SLOWMO.AncestorTemplate / DEFAULT_DISPLAY
+    candidate[SLOWMO.RegardingComparator] = (
+        record.comparator if record.comparator is not None else Literal(None)
     )
+    candidate[SLOWMO.Display] = record.display
     return candidate
 
 
 def create_candidates():
     # measures = graph[: RDF.type : PSDO.performance_measure_content]
     # How do we get the measures for all MI?
+    subject_graph = context.current().subject_graph
     measures: set[BNode] = set(
-        context.subject_graph.objects(
+        subject_graph.objects(
             None, PSDO.motivating_information / SLOWMO.RegardingMeasure
         )
     )
     for measure in measures:
-        measure_resource = context.subject_graph.resource(measure)
-        for template in context.subject_graph[
-            : RDF.type : PERFORMANCE_SUMMARY_DISPLAY_TEMPLATE
-        ]:
-    
-            measure_type =  startup.measure_catalog[str(measure)].improvement_notation
-            
-            if measure_type == "increase":
-                measure_type_iri = PSDO.desired_increase
-            else:
-                measure_type_iri = PSDO.desired_decrease
-            template_resource = context.subject_graph.resource(template)
-            template_is_about = list(template_resource[IAO.is_about])
-            if not any(
-                str(res.identifier) == str(measure_type_iri)
-                for res in template_is_about
-            ):
-                continue
+        measure_resource = subject_graph.resource(measure)
+
+        measure_type = startup.measure_catalog[str(measure)].improvement_notation
+        direction = "increase" if measure_type == "increase" else "decrease"
+
+        for record in startup.message_templates_by_direction.get(direction, ()):
+            template_resource = subject_graph.resource(record.identifier)
 
-            candidate = create_candidate(measure_resource, template_resource)
+            candidate = create_candidate(measure_resource, template_resource, record)
             if not candidate:
                 continue
-            candidate = acceptable_by(candidate)
+            candidate = acceptable_by(candidate, record)
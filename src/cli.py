@@ -1,6 +1,12 @@
+import gc
+import multiprocessing
 import os
 import pathlib
 import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 from typing import Annotated
 
 import orjson
@@ -9,17 +15,22 @@ from fastapi import HTTPException
 from loguru import logger
 
 from src import context, startup
-from src.pipeline import pipeline
+from src.pipeline import compose_message, pipeline, prepare_candidates
+from src.utils.namespace import SLOWMO
 from src.utils.utils import (
     add_candidates,
     add_response,
     analyse_candidates,
     analyse_responses,
     extract_number,
+    load_esteemer,
+    select_candidate,
 )
 
 cli = typer.Typer(no_args_is_help=True)
 
+IO_WORKERS = 4  # threads reading inputs and writing outputs for the parallel batch commands
+
 
 def _failure_payload(exc: Exception, **extra_fields) -> dict:
     detail = getattr(exc, "detail", None)
@@ -34,6 +45,61 @@ def _failure_payload(exc: Exception, **extra_fields) -> dict:
     return payload
 
 
+def _load_input(input_file: pathlib.Path):
+    """Reads and decodes a JSON input, returning the exception instead of raising it so it is reported in order"""
+    try:
+        return orjson.loads(input_file.read_bytes())
+    except Exception as e:
+        return e
+
+
+def _run_input(
+    input_file: pathlib.Path, input_data, stats_only: bool
+) -> tuple[dict, bool, str]:
+    """Runs the pipeline for one JSON input, returns the message (or failure payload), success and performance month"""
+    try:
+        if isinstance(input_data, Exception):
+            raise input_data
+
+        try:
+            context.from_req(input_data)
+
+            full_message = pipeline()
+            full_message["message_instance_id"] = input_data["@id"]
+            full_message["performance_measure_report"] = input_data[
+                "performance_measure_report"
+            ]
+            full_message["comparator_measure_report"] = input_data[
+                "comparator_measure_report"
+            ]
+        except HTTPException as e:
+            e.detail["message_instance_id"] = input_data["@id"]
+            raise e
+
+        if stats_only:
+            logger.info(f"✔ Would process: {input_file}")
+
+        return full_message, True, context.current().performance_month
+    except Exception as e:
+        logger.error(f"✘ Failed to process {input_file}: {e}")
+        return (
+            _failure_payload(e, input_file=str(input_file)),
+            False,
+            context.current().performance_month,
+        )
+
+
+def _write_message(input_file: pathlib.Path, full_message: dict, performance_month):
+    directory = input_file.parent / "messages"
+    os.makedirs(directory, exist_ok=True)
+
+    new_filename = f"{input_file.stem} - message for {performance_month}.json"
+    output_path = directory / new_filename
+
+    output_path.write_bytes(orjson.dumps(full_message, option=orjson.OPT_INDENT_2))
+    logger.info(f"Message created at {output_path}")
+
+
 @cli.command()
 def batch(
     file_path: Annotated[
@@ -50,72 +116,257 @@ def batch(
             help="Only simulate processing; count successes and failures and additional stats",
         ),
     ] = False,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers", help="Number of worker processes to process input files with"
+        ),
+    ] = 1,
 ) -> None:
     startup.startup()
 
+    input_files = _input_files(file_path)[:max_files]
+    results = _prefetch_map(
+        partial(_run_input, stats_only=stats_only), _load_input, input_files, workers
+    )
+    if not stats_only:
+        results = _written(input_files, results, workers)
+    success_count, failure_count = _record_results(results, stats_only)
+
+    logger.info(f"Total files scanned: {len(input_files)}")
+    logger.info(f"Successful: {success_count}, Failed: {failure_count}")
+    analyse_responses()
+    if not stats_only:
+        analyse_candidates(file_path / "messages" / "candidates.csv")
+
+
+def _input_files(file_path: pathlib.Path) -> list[pathlib.Path]:
     if file_path.is_file() and file_path.suffix == ".json":
-        input_files = [file_path]
-    elif file_path.is_dir():
-        input_files = sorted(file_path.glob("*.json"), key=extract_number)
-    else:
-        logger.error(
-            f"Invalid input: {file_path} is neither a .json file nor a directory containing .json files."
-        )
-        raise SystemExit(1)
+        return [file_path]
+    if file_path.is_dir():
+        return sorted(file_path.glob("*.json"), key=extract_number)
 
-    success_count = 0
-    failure_count = 0
+    logger.error(
+        f"Invalid input: {file_path} is neither a .json file nor a directory containing .json files."
+    )
+    raise SystemExit(1)
 
-    for input_file in input_files[:max_files]:
-        try:
-            input_data = orjson.loads(input_file.read_bytes())
-
-            try:
-                context.from_req(input_data)
-
-                full_message = pipeline()
-                full_message["message_instance_id"] = input_data["@id"]
-                full_message["performance_measure_report"] = input_data[
-                    "performance_measure_report"
-                ]
-                full_message["comparator_measure_report"] = input_data[
-                    "comparator_measure_report"
-                ]
-            except HTTPException as e:
-                e.detail["message_instance_id"] = input_data["@id"]
-                raise e
-
-            if not stats_only:
-                directory = input_file.parent / "messages"
-                os.makedirs(directory, exist_ok=True)
-
-                new_filename = (
-                    f"{input_file.stem} - message for {context.performance_month}.json"
-                )
-                output_path = directory / new_filename
-
-                output_path.write_bytes(
-                    orjson.dumps(full_message, option=orjson.OPT_INDENT_2)
-                )
-                logger.info(f"Message created at {output_path}")
-            else:
-                logger.info(f"✔ Would process: {input_file}")
 
+def _record_results(results, stats_only: bool) -> tuple[int, int]:
+    """Adds each result to the response and candidate reports, returns the success and failure counts"""
+    success_count = 0
+    failure_count = 0
+    for full_message, success, performance_month in results:
+        if success:
             success_count += 1
-        except Exception as e:
-            logger.error(f"✘ Failed to process {input_file}: {e}")
+        else:
             failure_count += 1
-            full_message = _failure_payload(e, input_file=str(input_file))
 
         add_response(full_message)
         if not stats_only:
-            add_candidates(full_message)
+            add_candidates(full_message, performance_month)
+    return success_count, failure_count
+
+
+def _written(input_files: list[pathlib.Path], results, workers: int):
+    """
+    Writes the messages of the successful results by I/O threads while the workers carry on. Results are
+    passed on in input order once their message is written, so counts and reports match a serial run.
+    A message that can't be written turns its result into a failure.
+    """
+    limit = max(workers, 1) * 2
+    with ThreadPoolExecutor(max_workers=IO_WORKERS if workers > 1 else 1) as writer:
+        pending: deque = deque()
+        for input_file, result in zip(input_files, results):
+            pending.append((input_file, result, _submit_write(writer, input_file, result)))
+            while _write_ready(pending, limit):
+                yield _write_result(*pending.popleft())
+
+        while pending:
+            yield _write_result(*pending.popleft())
+
+
+def _submit_write(writer: ThreadPoolExecutor, input_file: pathlib.Path, result):
+    full_message, success, performance_month = result
+    if not success:
+        return None
+    return writer.submit(_write_message, input_file, full_message, performance_month)
+
+
+def _write_ready(pending: deque, limit: int) -> bool:
+    """Whether the oldest pending result can be passed on: written, or too many waiting behind it"""
+    if not pending:
+        return False
+    write = pending[0][2]
+    return len(pending) > limit or write is None or write.done()
+
+
+def _write_result(input_file: pathlib.Path, result, write) -> tuple[dict, bool, str]:
+    if write is None:
+        return result
+    try:
+        write.result()
+    except Exception as e:
+        logger.error(f"✘ Failed to process {input_file}: {e}")
+        return _failure_payload(e, input_file=str(input_file)), False, result[2]
+    return result
+
+
+def _run_subjects(
+    subjects: list, performance_data_path: pathlib.Path, stats_only: bool
+) -> list[tuple[dict, bool, str]]:
+    """
+    Runs the pipeline for a batch of subjects, returns the message (or failure payload), success and performance
+    month of each of them, in order. Candidates of the whole batch are selected with one call to the esteemer's
+    select_candidates.
+    """
+    results: dict = {}
+    runs = _prepare_runs(subjects, results)
+
+    try:
+        selections = _select_batch(runs)
+    except Exception as e:
+        for subject, run, _ in runs:
+            results[subject] = _subject_failure(subject, e, run.performance_month)
+        runs, selections = [], []
+
+    directory = performance_data_path.parent / "messages"
+    for (subject, run, performance_df), selected_candidate in zip(runs, selections):
+        results[subject] = _compose_subject(
+            subject, run, performance_df, selected_candidate, directory, stats_only
+        )
 
-    logger.info(f"Total files scanned: {len(input_files[:max_files])}")
-    logger.info(f"Successful: {success_count}, Failed: {failure_count}")
-    analyse_responses()
-    if not stats_only:
-        analyse_candidates(file_path / "messages" / "candidates.csv")
+    return [results[subject] for subject in subjects]
+
+
+def _prepare_runs(subjects: list, results: dict) -> list:
+    """Starts a run per subject and creates its candidates; failures go to results"""
+    runs = []
+    for subject in subjects:
+        try:
+            context.from_global(subject)
+            runs.append((subject, context.current(), prepare_candidates()))
+        except Exception as e:
+            results[subject] = _subject_failure(
+                subject, e, context.current().performance_month
+            )
+    return runs
+
+
+def _select_batch(runs: list) -> list:
+    """
+    The selected candidates of the runs, in order. When selecting a batch of more than one fails, the marks of
+    the candidates selected before the failure are dropped and each run is left to select on its own (None).
+    """
+    try:
+        return load_esteemer().select_candidates([run for _, run, _ in runs])
+    except Exception as e:
+        if len(runs) <= 1:
+            raise  # nothing to retry
+        logger.warning(f"Batch selection failed, selecting per subject: {e}")
+        for _, run, _ in runs:
+            run.subject_graph.remove((None, SLOWMO.Selected, None))
+        return [None] * len(runs)
+
+
+def _compose_subject(
+    subject, run, performance_df, selected_candidate, directory: pathlib.Path, stats_only: bool
+) -> tuple[dict, bool, str]:
+    context.activate(run)
+    try:
+        if selected_candidate is None:
+            selected_candidate = select_candidate()
+        full_message = compose_message(performance_df, selected_candidate)
+        full_message["performance_data"] = run.performance_month
+        if stats_only:
+            logger.info(f"✔ Would process: Provider_{subject}")
+        else:
+            _write_subject_message(full_message, subject, run.performance_month, directory)
+        return full_message, True, run.performance_month
+    except Exception as e:
+        return _subject_failure(subject, e, run.performance_month)
+
+
+def _write_subject_message(full_message: dict, subject, performance_month, directory: pathlib.Path):
+    os.makedirs(directory, exist_ok=True)
+    output_path = directory / f"Provider_{subject} - message for {performance_month}.json"
+    output_path.write_bytes(orjson.dumps(full_message, option=orjson.OPT_INDENT_2))
+    logger.info(f"Message created at {output_path}")
+
+
+def _subject_failure(subject, e: Exception, performance_month) -> tuple[dict, bool, str]:
+    logger.error(f"✘ Failed to process Provider_{subject}: {e}")
+    return _failure_payload(e, subject=subject), False, performance_month
+
+
+def _worker_map(func, items: list, workers: int):
+    """
+    Maps func over items, in order. With more than one worker the items are processed in chunks by forked
+    worker processes, which share the state loaded by startup copy-on-write.
+    """
+    if not _use_forked_workers(workers):
+        yield from map(func, items)
+        return
+
+    with _forked_pool(workers) as executor:
+        chunksize = max(1, len(items) // (workers * 4))
+        yield from executor.map(func, items, chunksize=chunksize)
+
+
+def _prefetch_map(func, load, items: list, workers: int):
+    """
+    Maps func over each item and its loaded data, in order, like _worker_map. Items are loaded ahead by
+    I/O threads while worker processes run func, with at most a couple of items per worker loaded or
+    in flight at any time so memory stays flat however many items there are.
+    """
+    if not _use_forked_workers(workers):
+        for item in items:
+            yield func(item, load(item))
+        return
+
+    # the workers are forked before the I/O threads start, a process forked with threads running can
+    # inherit locks they hold
+    with (
+        _forked_pool(workers) as executor,
+        ThreadPoolExecutor(max_workers=IO_WORKERS) as io_pool,
+    ):
+        yield from _prefetched(func, load, iter(items), executor, io_pool, workers * 2)
+
+
+def _prefetched(func, load, items, executor, io_pool, window: int):
+    loads = deque(_submit_loads(io_pool, load, items, window))
+    runs: deque = deque()
+    while loads or runs:
+        while loads and len(runs) < window:
+            item, loaded = loads.popleft()
+            runs.append(executor.submit(func, item, loaded.result()))
+            loads.extend(_submit_loads(io_pool, load, items, 1))
+        yield runs.popleft().result()
+
+
+def _submit_loads(io_pool: ThreadPoolExecutor, load, items, count: int) -> list:
+    return [(item, io_pool.submit(load, item)) for item in islice(items, count)]
+
+
+def _use_forked_workers(workers: int) -> bool:
+    if workers <= 1:
+        return False
+    if "fork" not in multiprocessing.get_all_start_methods():
+        logger.warning("Worker processes need the fork start method, processing serially")
+        return False
+    return True
+
+
+def _forked_pool(workers: int) -> ProcessPoolExecutor:
+    """A pool of worker processes forked from this one, forked right away rather than on first use"""
+    # keep the startup state out of the collector's reach so the workers' pages stay shared
+    gc.freeze()
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("fork")
+    )
+    # a fork pool forks all of its workers on the first submit
+    executor.submit(int).result()
+    return executor
 
 
 @cli.command()
@@ -139,49 +390,50 @@ def batch_csv(
             help="Only simulate processing; count successes and failures and additional stats",
         ),
     ] = False,
+    workers: Annotated[
+        int,
+        typer.Option(
+            "--workers", help="Number of worker processes to process subjects with"
+        ),
+    ] = 1,
+    batch_size: Annotated[
+        int,
+        typer.Option(
+            "--batch-size",
+            help="Number of subjects whose candidates are selected together",
+        ),
+    ] = 1,
 ):
     startup.startup(
         performance_data_path=performance_data_path, performance_m=performance_month
     )
 
-    success_count = 0
-    failure_count = 0
-    for subject in (
+    subjects = list(
         startup.practitioner_role["PractitionerRole.identifier"].drop_duplicates().head(max_files)
-    ):
-        try:
-            context.from_global(subject)
-            try:
-                full_message = pipeline()
-                full_message["performance_data"] = context.performance_month
-            except Exception as e:
-                raise e
-            if not stats_only:
-                directory = performance_data_path.parent / "messages"
-                os.makedirs(directory, exist_ok=True)
-
-                new_filename = (
-                    f"Provider_{subject} - message for {context.performance_month}.json"
-                )
-                output_path = directory / new_filename
-
-                output_path.write_bytes(
-                    orjson.dumps(full_message, option=orjson.OPT_INDENT_2)
-                )
-                logger.info(f"Message created at {output_path}")
-            else:
-                logger.info(f"✔ Would process: Provider_{subject}")
-
-            success_count += 1
-
-        except Exception as e:
-            logger.error(f"✘ Failed to process Provider_{subject}: {e}")
-            failure_count += 1
-            full_message = _failure_payload(e, subject=subject)
+    )
 
-        add_response(full_message)
-        if not stats_only:
-            add_candidates(full_message)
+    batch_size = max(1, batch_size)
+    batches = [
+        subjects[start : start + batch_size]
+        for start in range(0, len(subjects), batch_size)
+    ]
+
+    success_count, failure_count = _record_results(
+        (
+            result
+            for results in _worker_map(
+                partial(
+                    _run_subjects,
+                    performance_data_path=performance_data_path,
+                    stats_only=stats_only,
+                ),
+                batches,
+                workers,
+            )
+            for result in results
+        ),
+        stats_only,
+    )
 
     logger.info(f"Successful: {success_count}, Failed: {failure_count}")
     analyse_responses()
@@ -190,7 +442,30 @@ def batch_csv(
 
 
 @cli.command()
-def web(workers: int = 5):
+def web(
+    workers: int = 5,
+    preload: Annotated[
+        bool,
+        typer.Option(
+            "--preload",
+            help="Load the knowledge base once and share it with the workers (gunicorn, needs fork)",
+        ),
+    ] = False,
+):
+    if preload:
+        subprocess.run(
+            [
+                "gunicorn",
+                "src.api:app",
+                "--workers",
+                str(workers),
+                "--config",
+                "python:src.gunicorn_conf",
+            ],
+            check=True,
+        )
+        return
+
     subprocess.run(
         ["uvicorn", "src.api:app", "--workers", str(workers), "--use-colors"]
     )
@@ -1,111 +1,116 @@
 import ast
+from contextvars import ContextVar
 
 import pandas as pd
 from rdflib import Graph
 
 from src import startup
+from src.utils.layered_graph import LayeredGraph
 
-preferences_dict = {}
-subject = "0"
-performance_month = ""
-performance_df: pd.DataFrame
-comparator_df: pd.DataFrame
-subject_graph = Graph()
-practitioner_role = pd.DataFrame()
-request_info = None
+
+class PipelineContext:
+    """
+    The state of one pipeline run (a request or a subject).
+
+    Each run gets its own, made current for the thread or task running it by from_req or from_global,
+    and read with current(), so concurrent pipelines don't see each other's state.
+    """
+
+    def __init__(self):
+        self.preferences_dict: dict = {}
+        self.subject = "0"
+        self.performance_month = ""
+        self.performance_df = pd.DataFrame()
+        self.comparator_df = pd.DataFrame()
+        self.subject_graph: Graph = Graph()
+        self.practitioner_role = pd.DataFrame()
+        self.request_info = None
+
+
+_current: ContextVar[PipelineContext] = ContextVar("pipeline_context")
+
+
+def current() -> PipelineContext:
+    """The context of the run on this thread or task"""
+    try:
+        return _current.get()
+    except LookupError:
+        raise RuntimeError(
+            "No pipeline context, start a run with from_req or from_global first"
+        ) from None
+
+
+def activate(ctx: PipelineContext):
+    """Makes ctx the current context again, e.g. to finish a run started earlier"""
+    _current.set(ctx)
 
 
 def from_req(req_info):
-    global \
-        preferences_dict, \
-        subject, \
-        performance_month, \
-        performance_df, \
-        subject_graph, \
-        comparator_df, \
-        practitioner_role,\
-        request_info
+    ctx = PipelineContext()
+    _current.set(ctx)
 
     try:
-        request_info = req_info
-        performance_df = pd.DataFrame(req_info["performance_measure_report"])
-        
-        comparator_df = pd.DataFrame(req_info["comparator_measure_report"])
+        ctx.request_info = req_info
+        ctx.performance_df = pd.DataFrame(req_info["performance_measure_report"])
 
-        practitioner_role = pd.DataFrame(req_info["PractitionerRole"])
+        ctx.comparator_df = pd.DataFrame(req_info["comparator_measure_report"])
+
+        ctx.practitioner_role = pd.DataFrame(req_info["PractitionerRole"])
     except Exception:
         pass
 
-    performance_month = startup.performance_month
+    ctx.performance_month = startup.performance_month
     if req_info["performance_month"]:
-        performance_month = req_info["performance_month"]
-    if not performance_month:
-        performance_month = performance_df["period.start"].max()
+        ctx.performance_month = req_info["performance_month"]
+    if not ctx.performance_month:
+        ctx.performance_month = ctx.performance_df["period.start"].max()
 
-    subject = req_info["subject"] #int(req_info["subject"])
+    ctx.subject = req_info["subject"] #int(req_info["subject"])
 
-    preferences_dict = {}
     try:
-        preferences_dict = set_preferences(req_info.get("Preferences", {}))
+        ctx.preferences_dict = set_preferences(req_info.get("Preferences", {}))
     except Exception:
-        preferences_dict = set_preferences({})
+        ctx.preferences_dict = set_preferences({})
 
-    subject_graph = Graph()
-    subject_graph += startup.base_graph
+    ctx.subject_graph = LayeredGraph(startup.base_graph)
 
 
 def from_global(subject_num):
-    global \
-        preferences_dict, \
-        subject, \
-        performance_month, \
-        performance_df, \
-        subject_graph, \
-        comparator_df, \
-        practitioner_role
+    ctx = PipelineContext()
+    _current.set(ctx)
 
-    subject = subject_num #int(subject_num)
+    ctx.subject = subject_num #int(subject_num)
 
     try:
-        performance_df = startup.performance_measure_report[
-            startup.performance_measure_report["subject"] == subject
-        ].reset_index(drop=True)
-        practitioner_role = startup.practitioner_role[
-            startup.practitioner_role["PractitionerRole.identifier"] == subject
-        ].copy()
-        org_id = practitioner_role.iloc[0]["PractitionerRole.organization"]
-        role = practitioner_role.iloc[0]["PractitionerRole.code"]
-        comparator_df = startup.comparator_measure_report.copy().reset_index(drop=True)
-        if "group.subject" in startup.config["ComparatorMergeColumns"]:
-            comparator_df = comparator_df[
-                comparator_df["group.subject"] == org_id            
-            ].reset_index(drop=True)
-        if "PractitionerRole.code" in startup.config["ComparatorMergeColumns"]:    
-            comparator_df = comparator_df[
-               comparator_df["PractitionerRole.code"] == role
-            ].reset_index(drop=True)        
+        ctx.performance_df = startup.partition_rows(
+            startup.performance_measure_report, startup.performance_partitions, ctx.subject
+        ).reset_index(drop=True)
+        ctx.practitioner_role = startup.partition_rows(
+            startup.practitioner_role, startup.practitioner_role_partitions, ctx.subject
+        ).copy()
+        org_id = ctx.practitioner_role.iloc[0]["PractitionerRole.organization"]
+        role = ctx.practitioner_role.iloc[0]["PractitionerRole.code"]
+        ctx.comparator_df = startup.comparator_rows(
+            {"group.subject": org_id, "PractitionerRole.code": role}
+        ).reset_index(drop=True)
     except Exception:
         pass
 
-    performance_month = startup.performance_month
-    if not performance_month:
-        performance_month = performance_df["period.start"].max()
+    ctx.performance_month = startup.performance_month
+    if not ctx.performance_month:
+        ctx.performance_month = ctx.performance_df["period.start"].max()
 
-    preferences_dict = {}
     try:
-        p = ast.literal_eval(startup.preferences.loc[subject, "preferences.json"])
-        preferences_dict = set_preferences(p)
+        p = ast.literal_eval(startup.preferences.loc[ctx.subject, "preferences.json"])
+        ctx.preferences_dict = set_preferences(p)
     except Exception:
-        preferences_dict = set_preferences({})
-
+        ctx.preferences_dict = set_preferences({})
 
-    subject_graph = Graph()
-    subject_graph += startup.base_graph
+    ctx.subject_graph = LayeredGraph(startup.base_graph)
 
 
 def get_preferences():
-    global preferences_dict
-    return preferences_dict
+    return current().preferences_dict
 
 
 def set_preferences(req_info):
@@ -131,3 +136,4 @@ def set_preferences(req_info):
             display_format = key.lower()  # display formats are hardcoded with lower case in pictoralist so lower() is used to keep it the same
 
     return {"Message_Format": preferences, "Display_Format": display_format}
+
@@ -3,6 +3,7 @@ import csv
 import json
 import os
 import random
+import threading
 from datetime import datetime
 from io import StringIO
 from typing import List
@@ -23,6 +24,7 @@ from src.bitstomach.signals import (
     Signal,
     Trend,
 )
+from src.esteemer import scoring
 from src.esteemer.signals import History
 from src.utils import utils
 from src.utils.namespace import PSDO, SLOWMO
@@ -30,51 +32,25 @@ from src.utils.settings import settings
 
 
 class MPM_candidate_selector(Esteemer):
+    VERSION = "1.0.0"
+
     def _initialize(self):
         self.preferences, self.default_preferences = self._load_preferences()
         self.history = self._load_history()
+        self.history_by_subject = self._parse_history(self.history)
         self.mpm = self._load_mpm_from_env()
+        self._selection = threading.local()  # the instance is shared by concurrent requests
 
     def version(self) -> str:
-        return "1.0.0"
+        return self.VERSION
 
     def _score(self, candidate: Resource) -> Resource:
         """
         Calculates score for a candidate.
         """
-        # Get subject from candidate
-        history = self._get_history(self.subject)
-        preferences = self._get_preferences(self.subject)["Message_Format"]
+        history, preferences = self._subject_inputs()
 
-        CAUSAL_PATHWAY = {
-            "Social Better": {
-                "score": self._score_better,
-                "rules": self._rule_social_highest,
-            },
-            "Social Worse": {"score": self._score_worse, "rules": self._null_rule},
-            "Improving": {"score": self._score_improving, "rules": self._null_rule},
-            "Worsening": {"score": self._score_worsening, "rules": self._null_rule},
-            "Goal Gain": {"score": self._score_gain, "rules": self._null_rule},
-            "Goal Loss": {"score": self._score_loss, "rules": self._null_rule},
-            "Social Gain": {
-                "score": self._score_gain,
-                "rules": self._rule_social_highest,
-            },
-            "Social Loss": {
-                "score": self._score_loss,
-                "rules": self._rule_social_lowest,
-            },
-            "Goal Worse": {"score": self._score_worse, "rules": self._null_rule},
-            "Goal Better": {
-                "score": self._score_better,
-                "rules": self._rule_social_highest,
-            },
-            "Goal Approach": {"score": self._score_approach, "rules": self._null_rule},
-            "Social Approach": {
-                "score": self._score_approach,
-                "rules": self._rule_social_lowest,
-            },
-        }
+        CAUSAL_PATHWAY = self._causal_pathways()
 
         causal_pathway = candidate.value(SLOWMO.AcceptableBy).value
         motivating_informations = list(candidate[PSDO.motivating_information])
@@ -121,13 +97,96 @@ class MPM_candidate_selector(Esteemer):
         candidates = utils.candidates(
             self.subject_graph, filter_acceptable=True, measure=None
         )
-        for candidate in candidates:
-            self._score(candidate)
-        selected_candidate = self._select(candidates)
+        self._selection.inputs = None
+        self._selection.comparators = None
+        if settings.vectorized_scoring:
+            selected_candidate = scoring.select(*scoring.score_candidates(self, candidates))
+        else:
+            for candidate in candidates:
+                self._score(candidate)
+            selected_candidate = self._select(candidates)
+        self._selection.comparators = None  # don't hold on to the subject's graph
         selected_candidate[SLOWMO.Selected] = Literal(True)
         return selected_candidate
 
+    def select_candidates(self, batch) -> list:
+        """
+        Selects a candidate for each run in the batch. With vectorized scoring, the candidates of all
+        the runs are scored together in one pass before selecting per run.
+        """
+        if not settings.vectorized_scoring:
+            return super().select_candidates(batch)
+
+        tables = []
+        for run in batch:
+            with self.selecting_for(run):
+                candidates = utils.candidates(
+                    self.subject_graph, filter_acceptable=True, measure=None
+                )
+                self._selection.inputs = None
+                self._selection.comparators = None
+                tables.append(scoring.tabulate(self, candidates))
+                self._selection.comparators = None
+
+        selections = [scoring.select(*scored) for scored in scoring.score_tables(self, tables)]
+        # marked once all are selected, so a failure leaves no run marked
+        for selected_candidate in selections:
+            selected_candidate[SLOWMO.Selected] = Literal(True)
+        return selections
+
     # Internal methods
+    def _subject_inputs(self) -> tuple[dict, dict]:
+        """
+        History and message format preferences of the subject, looked up once per selection and
+        shared by all of its candidates
+        """
+        cached = getattr(self._selection, "inputs", None)
+        if (
+            cached is None
+            or cached[0] != self.subject
+            or cached[1] is not self.req_info
+        ):
+            cached = (
+                self.subject,
+                self.req_info,
+                self._get_history(self.subject),
+                self._get_preferences(self.subject)["Message_Format"],
+            )
+            self._selection.inputs = cached
+        return cached[2], cached[3]
+
+    def _causal_pathways(self) -> dict:
+        """score and business rules of each causal pathway"""
+        return {
+            "Social Better": {
+                "score": self._score_better,
+                "rules": self._rule_social_highest,
+            },
+            "Social Worse": {"score": self._score_worse, "rules": self._null_rule},
+            "Improving": {"score": self._score_improving, "rules": self._null_rule},
+            "Worsening": {"score": self._score_worsening, "rules": self._null_rule},
+            "Goal Gain": {"score": self._score_gain, "rules": self._null_rule},
+            "Goal Loss": {"score": self._score_loss, "rules": self._null_rule},
+            "Social Gain": {
+                "score": self._score_gain,
+                "rules": self._rule_social_highest,
+            },
+            "Social Loss": {
+                "score": self._score_loss,
+                "rules": self._rule_social_lowest,
+            },
+            "Goal Worse": {"score": self._score_worse, "rules": self._null_rule},
+            "Goal Better": {
+                "score": self._score_better,
+                "rules": self._rule_social_highest,
+            },
+            "Goal Approach": {"score": self._score_approach, "rules": self._null_rule},
+            "Social Approach": {
+                "score": self._score_approach,
+                "rules": self._rule_social_lowest,
+            },
+        }
+
     def _final_score(self, m, h, p):
         score = m * 1 + h * 2 + p * 1.3
         return round(score, 2)
@@ -144,69 +203,54 @@ class MPM_candidate_selector(Esteemer):
         return True
 
     def _rule_social_highest(self, candidate: Resource):
-        causal_pathway = candidate.value(SLOWMO.AcceptableBy).value
+        comparators = self._group_comparators(candidate)
         if candidate[SLOWMO.RegardingComparator : PSDO.peer_average_comparator]:
-            candidates = utils.candidates(
-                candidate.graph,
-                candidate.value(SLOWMO.RegardingMeasure).identifier,
-                filter_acceptable=True,
-            )
-            return not any(
-                (
-                    candid[
-                        SLOWMO.RegardingComparator : PSDO.peer_90th_percentile_benchmark
-                    ]
-                    or candid[
-                        SLOWMO.RegardingComparator : PSDO.peer_75th_percentile_benchmark
-                    ]
-                )
-                and candid.value(SLOWMO.AcceptableBy).value == causal_pathway
-                for candid in candidates
+            return (
+                PSDO.peer_90th_percentile_benchmark not in comparators
+                and PSDO.peer_75th_percentile_benchmark not in comparators
             )
         if candidate[SLOWMO.RegardingComparator : PSDO.peer_75th_percentile_benchmark]:
-            candidates = utils.candidates(
-                candidate.graph,
-                candidate.value(SLOWMO.RegardingMeasure).identifier,
-                filter_acceptable=True,
-            )
-            return not any(
-                candid[SLOWMO.RegardingComparator : PSDO.peer_90th_percentile_benchmark]
-                and candid.value(SLOWMO.AcceptableBy).value == causal_pathway
-                for candid in candidates
-            )
+            return PSDO.peer_90th_percentile_benchmark not in comparators
         return True
 
     def _rule_social_lowest(self, candidate: Resource):
-        causal_pathway = candidate.value(SLOWMO.AcceptableBy).value
+        comparators = self._group_comparators(candidate)
         if candidate[SLOWMO.RegardingComparator : PSDO.peer_90th_percentile_benchmark]:
-            candidates = utils.candidates(
-                candidate.graph,
-                candidate.value(SLOWMO.RegardingMeasure).identifier,
-                filter_acceptable=True,
-            )
-            return not any(
-                (
-                    candid[SLOWMO.RegardingComparator : PSDO.peer_average_comparator]
-                    or candid[
-                        SLOWMO.RegardingComparator : PSDO.peer_75th_percentile_benchmark
-                    ]
-                )
-                and candid.value(SLOWMO.AcceptableBy).value == causal_pathway
-                for candid in candidates
+            return (
+                PSDO.peer_average_comparator not in comparators
+                and PSDO.peer_75th_percentile_benchmark not in comparators
             )
         if candidate[SLOWMO.RegardingComparator : PSDO.peer_75th_percentile_benchmark]:
-            candidates = utils.candidates(
-                candidate.graph,
-                candidate.value(SLOWMO.RegardingMeasure).identifier,
-                filter_acceptable=True,
-            )
-            return not any(
-                candid[SLOWMO.RegardingComparator : PSDO.peer_average_comparator]
-                and candid.value(SLOWMO.AcceptableBy).value == causal_pathway
-                for candid in candidates
-            )
+            return PSDO.peer_average_comparator not in comparators
         return True
 
+    def _group_comparators(self, candidate: Resource) -> set:
+        """
+        Comparators of the acceptable candidates about the same measure and causal pathway as the candidate.
+        The candidates are grouped by measure and causal pathway once per selection
+        """
+        index = getattr(self._selection, "comparators", None)
+        if index is None or index[0] is not candidate.graph:
+            groups: dict = {}
+            for candid in utils.candidates(candidate.graph, filter_acceptable=True):
+                key = (
+                    candid.value(SLOWMO.RegardingMeasure).identifier,
+                    candid.value(SLOWMO.AcceptableBy).value,
+                )
+                groups.setdefault(key, set()).update(
+                    candid.graph.objects(candid.identifier, SLOWMO.RegardingComparator)
+                )
+            index = (candidate.graph, groups)
+            self._selection.comparators = index
+
+        return index[1].get(
+            (
+                candidate.value(SLOWMO.RegardingMeasure).identifier,
+                candidate.value(SLOWMO.AcceptableBy).value,
+            ),
+            set(),
+        )
+
     def _score_worse(
         self, candidate: Resource, motivating_informations: List[Resource], mpm: dict
     ) -> float:
@@ -266,13 +310,18 @@ class MPM_candidate_selector(Esteemer):
     def _comparator_moderators(
         self, candidate, motivating_informations, signal: Signal
     ):
+        return self._comparator_moderator(
+            candidate, signal.moderators(motivating_informations)
+        )
+
+    def _comparator_moderator(self, candidate, moderators: List[dict]) -> dict:
+        """the moderators regarding the candidate's comparator"""
         comparator = candidate.value(SLOWMO.RegardingComparator)
         if str(comparator) == "None":
             raise ValueError(
                 "A candidate is created using a message template which is regarding a comparator that is not defined in the Knowledge Base."
             )
         comparator_type = comparator.identifier
-        moderators = signal.moderators(motivating_informations)
         scoring_detail = [
             moderator
             for moderator in moderators
@@ -284,7 +333,11 @@ class MPM_candidate_selector(Esteemer):
         if not history or not settings.use_history:
             return 1.0
         g: Graph = candidate.graph
-        history.pop(self.performance_month, None)
+        history = {
+            period: message
+            for period, message in history.items()
+            if period != self.performance_month
+        }
         signals = History.detect(
             history,
             {
@@ -420,18 +473,32 @@ class MPM_candidate_selector(Esteemer):
         }
         return preferences, default_preferences
 
-    def _get_history(self, subject):
-        history_dict = {}
+    def _parse_history(self, history) -> dict:
+        """
+        Message history by subject, each a dict of messages by period start. A subject whose
+        history can't be parsed gets an empty one
+        """
+        history_by_subject: dict = {}
+        unparsable = set()
         try:
-            history_data = self.history[self.history["subject"] == subject].copy()
-            history_data["history.json"] = history_data["history.json"].apply(
-                ast.literal_eval
-            )
-            history_dict = history_data.set_index("period.start")[
-                "history.json"
-            ].to_dict()
+            for subject, period, message in zip(
+                history["subject"], history["period.start"], history["history.json"]
+            ):
+                if subject in unparsable:
+                    continue
+                try:
+                    history_by_subject.setdefault(subject, {})[period] = (
+                        ast.literal_eval(message)
+                    )
+                except Exception:
+                    unparsable.add(subject)
+                    history_by_subject[subject] = {}
         except Exception:
             pass
+        return history_by_subject
+
+    def _get_history(self, subject):
+        history_dict = dict(self.history_by_subject.get(subject, {}))
 
         history_dict_from_request = {}
         try:
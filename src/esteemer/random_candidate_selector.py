@@ -6,11 +6,13 @@ from scaffold_sdk import Esteemer
 
 
 class Random_candidate_selector(Esteemer):
+    VERSION = "1.0.1"
+
     def _initialize(self):
         pass
 
     def version(self) -> str:
-        return "1.0.1"
+        return self.VERSION
 
     def select_candidate(self) -> Resource:
         """
@@ -0,0 +1,186 @@
+import random
+from typing import List
+
+import numpy as np
+from rdflib import XSD, Literal, URIRef
+from rdflib.resource import Resource
+
+from src.bitstomach.signals import Achievement, Approach, Comparison, Loss, Trend
+from src.utils.namespace import PSDO, SLOWMO
+from src.utils.settings import settings
+
+MODERATORS = ("comparison_size", "trend_size", "achievement_recency", "loss_recency")
+
+# the signal each causal pathway's motivating information score is taken from, and the
+# moderators it averages (weighted by the MPM when there is more than one)
+PATHWAY_MODERATORS = {
+    "Social Better": (Comparison, ("comparison_size",)),
+    "Social Worse": (Comparison, ("comparison_size",)),
+    "Goal Better": (Comparison, ("comparison_size",)),
+    "Goal Worse": (Comparison, ("comparison_size",)),
+    "Improving": (Trend, ("trend_size",)),
+    "Worsening": (Trend, ("trend_size",)),
+    "Social Gain": (Achievement, ("comparison_size", "trend_size", "achievement_recency")),
+    "Goal Gain": (Achievement, ("comparison_size", "trend_size", "achievement_recency")),
+    "Social Loss": (Loss, ("comparison_size", "trend_size", "loss_recency")),
+    "Goal Loss": (Loss, ("comparison_size", "trend_size", "loss_recency")),
+    "Social Approach": (Approach, ("comparison_size", "trend_size", "achievement_recency")),
+    "Goal Approach": (Approach, ("comparison_size", "trend_size", "achievement_recency")),
+}
+
+
+def weights(mpm: dict, pathway: str) -> List[float]:
+    """The pathway's row of the weight matrix, one weight per moderator in MODERATORS"""
+    _, moderators = PATHWAY_MODERATORS[pathway]
+    if len(moderators) == 1:
+        return [1.0 if name in moderators else 0.0 for name in MODERATORS]
+    return [mpm[pathway][name] if name in moderators else 0.0 for name in MODERATORS]
+
+
+def moderators(selector, candidate: Resource, pathway: str, cache: dict) -> List[float]:
+    """
+    The candidate's row of the moderator table. Candidates about the same measure share their
+    motivating information, so each signal's moderators are extracted once per selection
+    """
+    signal, names = PATHWAY_MODERATORS[pathway]
+    motivating_informations = list(candidate[PSDO.motivating_information])
+
+    key = (signal, tuple(mi.identifier for mi in motivating_informations))
+    if key not in cache:
+        cache[key] = signal.moderators(motivating_informations)
+
+    if signal is Trend:
+        moderator = cache[key][0]
+    else:
+        moderator = selector._comparator_moderator(candidate, cache[key])
+
+    return [moderator[name] if name in names else 0.0 for name in MODERATORS]
+
+
+def tabulate(selector, candidates: List[Resource]) -> tuple:
+    """
+    One subject's rows of the scoring table: the candidates that pass the business rules, their
+    causal pathways, moderators, history scores and preference scores. History and preferences
+    are those of the subject the selector is selecting for.
+    """
+    history, preferences = selector._subject_inputs()
+    causal_pathways = selector._causal_pathways()
+
+    scored, pathways, table = [], [], []
+    cache: dict = {}
+    for candidate in candidates:
+        pathway = candidate.value(SLOWMO.AcceptableBy).value
+        if not causal_pathways[pathway]["rules"](candidate):
+            continue
+        scored.append(candidate)
+        pathways.append(pathway)
+        table.append(
+            moderators(selector, candidate, pathway, cache)
+            if settings.use_mi
+            else [0.0] * len(MODERATORS)
+        )
+
+    history_scores = [
+        selector._score_history(candidate, history, selector.mpm[pathway])
+        for candidate, pathway in zip(scored, pathways)
+    ]
+    preference_scores = [
+        selector._score_preferences(candidate, preferences) for candidate in scored
+    ]
+    return scored, pathways, table, history_scores, preference_scores
+
+
+def score_tables(selector, tables: List[tuple]) -> List[tuple]:
+    """
+    Scores the rows of any number of subjects the way MPM_candidate_selector._score does, as one
+    set of array operations over all of them, and writes the scores to the candidates.
+
+    Returns each subject's scored candidates with their scores and coachiness.
+    """
+    pathways = [pathway for table in tables for pathway in table[1]]
+    matrix = {pathway: weights(selector.mpm, pathway) for pathway in set(pathways)}
+
+    values = np.array(
+        [row for table in tables for row in table[2]], dtype=float
+    ).reshape(-1, len(MODERATORS))
+    weight = np.array([matrix[pathway] for pathway in pathways], dtype=float).reshape(
+        -1, len(MODERATORS)
+    )
+    history_score = np.array(
+        [score for table in tables for score in table[3]], dtype=float
+    )
+    preference_score = np.array(
+        [score for table in tables for score in table[4]], dtype=float
+    )
+    coachiness = np.array(
+        [selector.mpm[pathway]["coachiness"] for pathway in pathways], dtype=float
+    )
+
+    # summed column by column so every score adds up in the same order as _score_gain and friends
+    numerator = np.zeros(len(pathways))
+    denominator = np.zeros(len(pathways))
+    for column in range(len(MODERATORS)):
+        numerator = numerator + values[:, column] * weight[:, column]
+        denominator = denominator + weight[:, column]
+    motivating_score = (
+        numerator / denominator if settings.use_mi else np.zeros(len(pathways))
+    )
+
+    # rounded with round() rather than np.round so scores match _final_score to the last bit
+    scores = np.array(
+        [
+            round(score, 2)
+            for score in (
+                motivating_score * 1 + history_score * 2 + preference_score * 1.3
+            ).tolist()
+        ],
+        dtype=float,
+    )
+
+    candidates = [candidate for table in tables for candidate in table[0]]
+    for i, candidate in enumerate(candidates):
+        candidate[URIRef("motivating_score")] = Literal(
+            motivating_score[i].item(), datatype=XSD.double
+        )
+        candidate[URIRef("history_score")] = Literal(
+            history_score[i].item(), datatype=XSD.double
+        )
+        candidate[URIRef("preference_score")] = Literal(
+            preference_score[i].item(), datatype=XSD.double
+        )
+        candidate[URIRef("coachiness_score")] = Literal(
+            selector.mpm[pathways[i]]["coachiness"], datatype=XSD.double
+        )
+        candidate[SLOWMO.Score] = Literal(scores[i].item(), datatype=XSD.double)
+
+    results = []
+    start = 0
+    for table in tables:
+        end = start + len(table[0])
+        results.append((table[0], scores[start:end], coachiness[start:end]))
+        start = end
+    return results
+
+
+def score_candidates(selector, candidates: List[Resource]) -> tuple:
+    """Scores one subject's candidates, see score_tables"""
+    return score_tables(selector, [tabulate(selector, candidates)])[0]
+
+
+def select(candidates: List[Resource], scores: np.ndarray, coachiness: np.ndarray) -> Resource:
+    """Picks a highest scoring candidate from the highest coachiness category, like MPM_candidate_selector._select"""
+    eligible = np.ones(len(candidates), dtype=bool)
+    if settings.use_coachiness:
+        for category in (1.0, 0.5):
+            if (coachiness == category).any():
+                eligible = coachiness == category
+                break
+
+    best = scores[eligible].max() if eligible.any() else None
+    return random.choice(
+        [
+            candidate
+            for candidate, score, keep in zip(candidates, scores, eligible)
+            if keep and score == best
+        ]
+    )
@@ -0,0 +1,17 @@
+"""
+Gunicorn settings for `pipeline web --preload`.
+
+The API module, and with it the knowledge base and reference tables loaded by startup, is imported once
+in the master process. Workers are forked from it and share those pages copy-on-write instead of each
+loading its own copy.
+"""
+
+import gc
+
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # keep the startup state out of the collector's reach so the workers' pages stay shared
+    gc.freeze()
@@ -1,3 +1,5 @@
 from src.models.measure import Measure
+from src.models.message_template import MessageTemplate
+from src.models.precondition_index import PreconditionIndex
 
-__all__ = ["Measure"]
\ No newline at end of file
+__all__ = ["Measure", "MessageTemplate", "PreconditionIndex"]
@@ -0,0 +1,94 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from rdflib import RDF, Graph, Literal, URIRef
+from rdflib.resource import Resource
+from rdflib.term import Node
+
+from src.utils.namespace import CPO, IAO, PSDO, SCHEMA
+
+PERFORMANCE_SUMMARY_DISPLAY_TEMPLATE = URIRef(
+    "http://data.bioontology.org/ontologies/PSDO/classes/http%3A%2F%2Fpurl.obolibrary.org%2Fobo%2FPSDO_0000002"
+)
+CPO_HAS_PRECONDITIONS = URIRef(
+    "http://purl.bioontology.org/ontology/SNOMEDCT/has_precondition"
+)
+
+DEFAULT_DISPLAY = URIRef(
+    "https://schema.metadatacenter.org/properties/5b4f16a9-feb7-4724-8741-2739d8808760"
+)
+TEMPLATE_TEXT = URIRef(
+    "https://schema.metadatacenter.org/properties/6b9dfdf9-9c8a-4d85-8684-a24bee4b85a8"
+)
+
+DIRECTIONS = {"increase": PSDO.desired_increase, "decrease": PSDO.desired_decrease}
+
+
+@dataclass(frozen=True, slots=True)
+class MessageTemplate:
+    identifier: Node
+    name: Optional[Literal]
+    text: Optional[Literal]
+    display: Optional[Literal]
+    roles: tuple[Node, ...]
+    directions: frozenset[str]
+    comparator: Optional[Node]
+    causal_pathway: Optional[Node]
+    causal_pathway_name: Optional[Literal]
+    preconditions: frozenset[Node]
+
+    @classmethod
+    def from_graph(cls, graph: Graph) -> dict[Node, "MessageTemplate"]:
+        return {
+            template: cls.from_resource(graph.resource(template))
+            for template in graph.subjects(RDF.type, PERFORMANCE_SUMMARY_DISPLAY_TEMPLATE)
+        }
+
+    @classmethod
+    def from_resource(cls, template: Resource) -> "MessageTemplate":
+        graph = template.graph
+        roles = tuple(graph.objects(template.identifier, IAO.is_about))
+
+        causal_pathway = graph.value(template.identifier, CPO.has_causal_pathway)
+
+        return cls(
+            identifier=template.identifier,
+            name=graph.value(template.identifier, SCHEMA.name),
+            text=graph.value(template.identifier, TEMPLATE_TEXT),
+            display=graph.value(template.identifier, DEFAULT_DISPLAY),
+            roles=roles,
+            directions=frozenset(
+                direction
+                for direction, direction_iri in DIRECTIONS.items()
+                if any(str(role) == str(direction_iri) for role in roles)
+            ),
+            comparator=next(
+                (
+                    role
+                    for role in roles
+                    if (role, RDF.type, PSDO.comparator_content) in graph
+                ),
+                None,
+            ),
+            causal_pathway=causal_pathway,
+            causal_pathway_name=graph.value(causal_pathway, SCHEMA.name)
+            if causal_pathway is not None
+            else None,
+            preconditions=frozenset(graph.objects(causal_pathway, CPO_HAS_PRECONDITIONS))
+            if causal_pathway is not None
+            else frozenset(),
+        )
+
+    @staticmethod
+    def by_direction(
+        templates: dict[Node, "MessageTemplate"],
+    ) -> dict[str, tuple["MessageTemplate", ...]]:
+        """Buckets the templates by the measure improvement notation they are about, keeping catalog order"""
+        return {
+            direction: tuple(
+                template
+                for template in templates.values()
+                if direction in template.directions
+            )
+            for direction in DIRECTIONS
+        }
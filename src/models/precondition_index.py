@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Iterable
+
+from rdflib.term import Node
+
+from src.models.message_template import MessageTemplate
+
+
+@dataclass(frozen=True, slots=True)
+class PreconditionIndex:
+    """
+    Causal pathway preconditions compiled to bitmasks.
+
+    Every role and precondition IRI is interned to a bit position, each causal pathway's
+    preconditions become a mask, and a pathway accepts a set of dispositions when all of
+    its precondition bits are set in the dispositions' mask.
+    """
+
+    bits: dict[Node, int]
+    pathways: dict[Node, int]
+
+    @classmethod
+    def from_templates(cls, templates: Iterable[MessageTemplate]) -> "PreconditionIndex":
+        bits: dict[Node, int] = {}
+        pathways: dict[Node, int] = {}
+
+        for template in templates:
+            for node in (*template.roles, *template.preconditions):
+                bits.setdefault(node, 1 << len(bits))
+            if template.causal_pathway is not None:
+                pathways[template.causal_pathway] = sum(
+                    bits[precondition] for precondition in template.preconditions
+                )
+
+        return cls(bits=bits, pathways=pathways)
+
+    def mask(self, nodes: Iterable[Node]) -> int:
+        """Mask of the given roles and dispositions. Nodes outside the index can't satisfy any precondition and are ignored"""
+        mask = 0
+        for node in nodes:
+            mask |= self.bits.get(node, 0)
+        return mask
+
+    def accepts(self, pathway: Node, mask: int) -> bool:
+        required = self.pathways[pathway]
+        return mask & required == required
+
+    def acceptable_pathways(self, mask: int) -> list[Node]:
+        """All causal pathways whose preconditions are satisfied by the mask, in index order"""
+        return [
+            pathway
+            for pathway, required in self.pathways.items()
+            if mask & required == required
+        ]
@@ -0,0 +1,291 @@
+import functools
+import io
+import math
+import pathlib
+
+import matplotlib
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Layout of the charts in points, as the matplotlib renderer lays out its 5 by 2.5 inch figure
+# once tight_layout and the tight bounding box are applied
+WIDTH, HEIGHT = 352.8, 167.0
+LEFT, RIGHT, TOP, BOTTOM = 34.0, 342.0, 9.5, 127.2  # axes box
+TICK, TICK_PAD = 3.5, 3.5
+LEGEND_Y = 154.0  # middle of the legend row
+HANDLE_LENGTH, HANDLE_PAD, COLUMN_SPACING = 2.0, 0.8, 2.0  # in legend font sizes
+SUPERSAMPLE = 2  # drawn at twice the resolution and scaled down, Pillow doesn't antialias lines
+
+FONTS = pathlib.Path(matplotlib.get_data_path(), "fonts", "ttf")
+
+
+@functools.lru_cache(maxsize=32)
+def font(size: int, bold: bool = False) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(
+        str(FONTS / ("DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf")), size
+    )
+
+
+class FixedLayoutChart:
+    """
+    A chart drawn directly with Pillow on a precomputed layout.
+
+    Draws the same line and bar charts as the matplotlib renderer at a fraction of the cost: the axes
+    box, ticks and legend sit at fixed positions, so there is no layout pass and no text engine.
+    Coordinates are data units on the axes and points everywhere else.
+    """
+
+    def __init__(self, dpi: float, x_limits: tuple, y_limits: tuple):
+        self.scale = dpi / 72 * SUPERSAMPLE
+        self.size = (round(WIDTH * dpi / 72), round(HEIGHT * dpi / 72))
+        self.image = Image.new(
+            "RGB", (self.size[0] * SUPERSAMPLE, self.size[1] * SUPERSAMPLE), "white"
+        )
+        self.draw = ImageDraw.Draw(self.image)
+        self.x_limits = x_limits
+        self.y_limits = y_limits
+
+    def px(self, points: float) -> float:
+        return points * self.scale
+
+    def x(self, value: float) -> float:
+        low, high = self.x_limits
+        return self.px(LEFT + (value - low) / (high - low) * (RIGHT - LEFT))
+
+    def y(self, value: float) -> float:
+        low, high = self.y_limits
+        return self.px(BOTTOM - (value - low) / (high - low) * (BOTTOM - TOP))
+
+    def width(self, points: float) -> int:
+        return max(1, round(self.px(points)))
+
+    def text(self, lines: list, x: float, y: float, size: float, color, bold=False, anchor="ms"):
+        """Draws lines of text, the last one anchored at (x, y) in pixels, earlier ones stacked above it"""
+        text_font = font(round(self.px(size)), bold)
+        for i, line in enumerate(reversed(lines)):
+            self.draw.text(
+                (x, y - i * self.px(size * 1.2)), line, fill=color, font=text_font, anchor=anchor
+            )
+
+    def line(self, xs, ys, color, linewidth: float, marker=True):
+        """A data series, broken where values are missing, with dot markers"""
+        points = [
+            (self.x(x), self.y(y)) if not math.isnan(y) else None for x, y in zip(xs, ys)
+        ]
+        for start, end in zip(points, points[1:]):
+            if start and end:
+                self.draw.line([start, end], fill=color, width=self.width(linewidth), joint="curve")
+        if marker:
+            radius = self.px(1.5)
+            for point in filter(None, points):
+                self.dot(point, radius, color)
+
+    def dot(self, point: tuple, radius: float, color):
+        x, y = point
+        self.draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=color)
+
+    def dashed(self, start: tuple, end: tuple, color, linewidth: float):
+        """A horizontal dashed line between two points in pixels, with matplotlib's dash pattern for the line width"""
+        dash, gap = self.px(3.7 * linewidth), self.px(1.6 * linewidth)
+        x, y = start
+        while x < end[0]:
+            self.draw.line(
+                [(x, y), (min(x + dash, end[0]), y)], fill=color, width=self.width(linewidth)
+            )
+            x += dash + gap
+
+    def vertical(self, x: float, color, linewidth: float):
+        self.draw.line(
+            [(self.x(x), self.px(TOP)), (self.x(x), self.px(BOTTOM))],
+            fill=color,
+            width=self.width(linewidth),
+        )
+
+    def axes(self, x_ticks, x_labels, y_ticks, y_labels):
+        """The axes frame with its ticks and tick labels"""
+        black = (0, 0, 0)
+        self.draw.rectangle(
+            [self.px(LEFT), self.px(TOP), self.px(RIGHT), self.px(BOTTOM)],
+            outline=black,
+            width=self.width(0.8),
+        )
+        for tick, label in zip(x_ticks, x_labels):
+            x = self.x(tick)
+            self.draw.line(
+                [(x, self.px(BOTTOM)), (x, self.px(BOTTOM + TICK))], fill=black, width=self.width(0.8)
+            )
+            self.text([label], x, self.px(BOTTOM + TICK + TICK_PAD), 7, black, anchor="ma")
+        for tick, label in zip(y_ticks, y_labels):
+            y = self.y(tick)
+            self.draw.line(
+                [(self.px(LEFT - TICK), y), (self.px(LEFT), y)], fill=black, width=self.width(0.8)
+            )
+            self.text([label], self.px(LEFT - TICK - TICK_PAD), y, 7, black, anchor="rm")
+
+    def legend(self, entries: list, size: float = 6):
+        """
+        A single row legend centered under the axes. Entries are (label, kind, color) with kind one of
+        "line", "dashed" or "patch"
+        """
+        text_font = font(round(self.px(size)))
+        widths = [
+            self.px(size * (HANDLE_LENGTH + HANDLE_PAD)) + text_font.getlength(label)
+            for label, _, _ in entries
+        ]
+        total = sum(widths) + self.px(size * COLUMN_SPACING) * (len(entries) - 1)
+
+        x = self.px((LEFT + RIGHT) / 2) - total / 2
+        y = self.px(LEGEND_Y)
+        handle = self.px(size * HANDLE_LENGTH)
+        for (label, kind, color), width in zip(entries, widths):
+            if kind == "patch":
+                half = self.px(size * 0.35)
+                self.draw.rectangle([x, y - half, x + handle, y + half], fill=color)
+            elif kind == "dashed":
+                self.dashed((x, y), (x + handle, y), color, 0.5)
+            else:
+                self.draw.line([(x, y), (x + handle, y)], fill=color, width=self.width(1.2))
+                self.dot((x + handle / 2, y), self.px(1.5), color)
+            self.draw.text(
+                (x + self.px(size * (HANDLE_LENGTH + HANDLE_PAD)), y),
+                label,
+                fill=(0, 0, 0),
+                font=text_font,
+                anchor="lm",
+            )
+            x += width + self.px(size * COLUMN_SPACING)
+
+    def finish(self) -> Image.Image:
+        return self.image.reduce(SUPERSAMPLE)
+
+
+def _margins(low: float, high: float) -> tuple:
+    """matplotlib's default 5% axis margins"""
+    span = high - low
+    return low - 0.05 * span, high + 0.05 * span
+
+
+def line_chart(
+    months: list, performance: list, comparator: list, comparator_label: str,
+    labels: list, dpi: float,
+) -> Image.Image:
+    """
+    Line chart of the performance and comparator levels (percent) by month, with the performance
+    label lines of the last three months
+    """
+    values = np.array([*performance, *comparator], dtype=float)
+    low, high = _margins(np.nanmin(values), np.nanmax(values))
+    n = len(months)
+    chart = FixedLayoutChart(
+        dpi, _margins(0, n - 1), (min(low, 0), max(high, 100))
+    )
+
+    for i in range(n):
+        chart.vertical(i, (128, 128, 128), 0.3)
+    chart.line(range(n), performance, "#063763", 1.2)
+    chart.line(range(n), comparator, "#02b5af", 1.0)
+    chart.axes(range(n), months, range(0, 101, 20), [f"{v}%" for v in range(0, 101, 20)])
+
+    for i in range(n)[-3:]:
+        if math.isnan(performance[i]):
+            continue  # no label without a level, as matplotlib
+        offset = 15 if performance[i] < 25 else -15
+        chart.text(
+            labels[i], chart.x(i), chart.y(performance[i]) - chart.px(offset), 5, "#063763", bold=True
+        )
+
+    chart.legend([("You", "line", "#063763"), (comparator_label, "line", "#02b5af")])
+    return chart.finish()
+
+
+BAR_WIDTH = 0.45  # in months
+
+
+def bar_chart(
+    months: list, performance: list, comparator: list, comparator_label: str,
+    labels: list, goal: list, dpi: float,
+) -> Image.Image:
+    """
+    Bar chart of the performance and comparator levels (percent) by month, with each month's
+    performance label lines, and the goal line when goal levels are given
+    """
+    n = len(months)
+    chart = FixedLayoutChart(dpi, _margins(0, n if goal else n - 0.1), (0, 100))
+
+    for i, (perf, comp) in enumerate(zip(performance, comparator)):
+        _bar(chart, i, perf, "#00254a")
+        _bar(chart, i + BAR_WIDTH, comp, "#4d5458")
+
+    for value in goal:
+        if not math.isnan(value):
+            chart.dashed((chart.x(0), chart.y(value)), (chart.x(n), chart.y(value)), "black", 0.5)
+
+    for i, (perf, comp, lines) in enumerate(zip(performance, comparator, labels)):
+        _performance_label(chart, i, perf, lines)
+        _comparator_label(chart, i, comp)
+
+    chart.axes(
+        [i + BAR_WIDTH for i in range(n)],
+        months,
+        range(0, 101, 20),
+        [f"{v}%" for v in range(0, 101, 20)],
+    )
+    chart.legend(
+        ([("Goal", "dashed", "black")] if goal else [])
+        + [("You", "patch", "#00254a"), (comparator_label, "patch", "#4d5458")]
+    )
+    return chart.finish()
+
+
+def _bar(chart: FixedLayoutChart, left: float, value: float, color):
+    if math.isnan(value) or value <= 0:
+        return
+    chart.draw.rectangle(
+        [chart.x(left), chart.y(min(value, 100)), chart.x(left + BAR_WIDTH) - 1, chart.y(0)],
+        fill=color,
+    )
+
+
+def _performance_label(chart: FixedLayoutChart, i: int, value: float, lines: list):
+    if math.isnan(value):
+        return
+    offset, color = (15, "#00254a") if value < 25 else (-15, "#ffffff")
+    chart.text(
+        lines,
+        chart.x(i + BAR_WIDTH / 2) - chart.px(BAR_WIDTH / 2),
+        chart.y(value) - chart.px(offset),
+        4.5,
+        color,
+        bold=True,
+        anchor="md",
+    )
+
+
+def _comparator_label(chart: FixedLayoutChart, i: int, value: float):
+    if math.isnan(value):
+        return
+    offset = 20 if value < 25 else -20
+    chart.text(
+        [f"{value:.0f}"],
+        chart.x(i + 1.5 * BAR_WIDTH) - chart.px(BAR_WIDTH / 2),
+        chart.y(value) - chart.px(offset),
+        5,
+        "#f3f0ed",
+        bold=True,
+        anchor="md",
+    )
+
+
+def encode(image: Image.Image, image_format: str, optimize: bool = False) -> bytes:
+    """Saves a chart the way the matplotlib renderer saves its figures"""
+    s = io.BytesIO()
+    if image_format == "webp":
+        image.save(s, format="webp", lossless=True)
+    elif optimize:
+        # charts only have a handful of colors, a palette image is several times smaller
+        image.quantize(256, method=Image.Quantize.FASTOCTREE).save(
+            s, format="png", optimize=True
+        )
+    else:
+        image.save(s, format="png")
+    return s.getvalue()
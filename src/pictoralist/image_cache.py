@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+
+
+def chart_key(**content) -> str:
+    """Content hash of everything that ends up in a chart: the plotted data and the render settings"""
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class ImageCache:
+    """
+    Rendered charts by content key.
+
+    A bounded in-memory LRU tier, backed by an optional directory of image files that is shared
+    between processes and trimmed to a size budget, oldest first. The directory is only scanned when
+    its size as of the last scan, plus what this process wrote since, exceeds the budget.
+    """
+
+    def __init__(self, max_items: int = 0, directory: str = "", max_bytes: int = 0):
+        self.max_items = max_items
+        self.directory = pathlib.Path(directory) if directory else None
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None  # unknown until the first scan
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        image = self._read(key)
+        if image is not None:
+            self._remember(key, image)
+        return image
+
+    def put(self, key: str, image: bytes):
+        self._remember(key, image)
+        self._write(key, image)
+
+    def _remember(self, key: str, image: bytes):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = image
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f"chart-{key}.img"
+
+    def _read(self, key: str) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            image = path.read_bytes()
+            os.utime(path)  # most recently used files are evicted last
+        except OSError:
+            return None
+        return image
+
+    def _write(self, key: str, image: bytes):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            # write to a temporary file first so other workers never read a partial image
+            temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temp_path.write_bytes(image)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save chart {path}: {e}")
+            return
+
+        self._count_written(len(image))
+
+    def _count_written(self, size: int):
+        if self.max_bytes <= 0:
+            return
+        with self._disk_lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+                if self._disk_bytes <= self.max_bytes:
+                    return
+            self._disk_bytes = self._evict()
+
+    def _evict(self) -> int:
+        """Deletes the least recently used files until the directory fits the budget, returns its size"""
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        return total
+
+    def _files(self):
+        for path in self.directory.glob("chart-*.img"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
@@ -3,18 +3,51 @@ import datetime
 import io
 import os
 import sys
+from dataclasses import dataclass, field
+from functools import partial
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from loguru import logger
+from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
 
 from src import context
+from src.pictoralist import fixed_layout
+from src.pictoralist.image_cache import ImageCache, chart_key
+from src.pictoralist.render_pool import RenderPool
+from src.utils.settings import settings as instance_settings
 
 ## Logging setup
 logger.remove()
 logger.add(sys.stdout, colorize=True, format="{level} | {message}")
 
+# media types of the image formats charts can be saved in
+IMAGE_MEDIA_TYPES = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+MIN_DPI = 50  # lowest resolution charts are scaled down to when fitting image_max_bytes
+
+# columns of the plotted window, everything a chart shows
+CHART_COLUMNS = [
+    "period.start",
+    "performance_level",
+    "comparator_level",
+    "passed_count",
+    "measureScore.denominator",
+    "goal_percent",
+]
+
+# charts already rendered, by content
+image_cache = ImageCache(
+    instance_settings.image_cache_size,
+    instance_settings.image_cache_dir,
+    instance_settings.image_cache_max_bytes,
+)
+
+# charts drawn in worker processes for deferred image delivery, started on first use
+render_pool = RenderPool(instance_settings.render_workers, image_cache)
+
 
 class Pictoralist:
     def __init__(
@@ -60,12 +93,19 @@ class Pictoralist:
             self.acceptable_by.append(
                 pathway
             )  # Add string value of rdflib literal to list
-        self.base64_image = []  # Initialize as empty key to later fill image into
+        self.image = None  # Rendered (or cached) chart, raw bytes
+        self.chart_key = None  # Content key of the chart in the image cache
+        self.image_ticket = None  # Ticket of a chart handed to the render pool
 
         # Config settings from main basesettings class
         self.log_level = settings.log_level
         self.generate_image = settings.generate_image
         self.cache_image = settings.cache_image
+        self.image_format = settings.image_format
+        self.image_dpi = settings.image_dpi
+        self.image_optimize = settings.image_optimize
+        self.image_max_bytes = settings.image_max_bytes
+        self.chart_renderer = settings.chart_renderer
         self.display_timeframe = settings.display_window
         self.plot_goal_line = settings.plot_goal_line
 
@@ -234,31 +274,183 @@ class Pictoralist:
 
     # # # # # # # # # # # Graphing Functions # # # # # # # # # # # # # #
 
+    ### Save a copy of the chart locally (cache_image):
+    def save_image(self, image):
+        # Specify cache folder name and image filename
+        folderName = "pictoralist_cache"
+        os.makedirs(folderName, exist_ok=True)
+        imgName = os.path.join(
+            folderName, f"response_{self.init_time}.{self.image_format}"
+        )
+
+        with open(imgName, "wb") as f:  # Save figure locally
+            f.write(image)
+
+    ### Content key of the chart about to be drawn, everything that ends up in the image:
+    def content_key(self):
+        window = self.performance_data[-self.display_timeframe :]
+        return chart_key(
+            display_format=self.display_format,
+            comparator_type=self.comparator_type,
+            display_timeframe=self.display_timeframe,
+            plot_goal_line=self.plot_goal_line,
+            image_format=self.image_format,
+            dpi=self.image_dpi,
+            optimize=self.image_optimize,
+            renderer=self.chart_renderer,
+            max_bytes=self.image_max_bytes,
+            data={column: window[column].tolist() for column in CHART_COLUMNS},
+        )
+
+    ### The plotted window and render settings, everything the chart is drawn from:
+    def chart(self):
+        return Chart(
+            performance_data=self.performance_data[-self.display_timeframe :][CHART_COLUMNS],
+            display_format=self.display_format,
+            comparator_type=self.comparator_type,
+            display_timeframe=self.display_timeframe,
+            plot_goal_line=self.plot_goal_line,
+            image_format=self.image_format,
+            image_dpi=self.image_dpi,
+            image_optimize=self.image_optimize,
+            image_max_bytes=self.image_max_bytes,
+            chart_renderer=self.chart_renderer,
+        )
+
+    ### Graphing function control logic (modularized to allow for changes and extra display formats in the future):
+    def graph_controller(self, defer_image=False):
+        if self.display_format not in ("line chart", "bar chart") or not self.generate_image:
+            logger.info("Generating text only feedback message, graphing skipped...")
+            return
+
+        self.chart_key = self.content_key()
+        image = image_cache.get(self.chart_key)
+        if image is not None:
+            logger.info(f"Reusing identical {self.display_format}...")
+        elif defer_image:
+            # the response goes out with a ticket, the chart is collected from /image/{ticket}
+            logger.info(f"Handing {self.display_format} to the render pool...")
+            render_pool.submit(self.chart_key, partial(draw_chart, self.chart()))
+            self.image_ticket = self.chart_key
+            return
+        else:
+            image = draw_chart(self.chart())
+            image_cache.put(self.chart_key, image)
+
+        self.image = image
+        if self.cache_image:
+            self.save_image(image)
+
+    ### Prepare selected message as done previously for LDT continuity:
+    def prepare_selected_message(self, binary_image=False):
+        logger.debug("Running pictoralist/prepare_selected_message...")
+        candidate = {}
+        message = {}
+        candidate["message_template_id"] = self.template_id
+        candidate["message_template_name"] = self.template_name
+        candidate["display"] = self.display_format
+        candidate["measure"] = self.selected_measure
+        candidate["acceptable_by"] = self.acceptable_by
+        message["text_message"] = self.message_text
+        message["measure"] = self.selected_measure
+        message["measure_full_title"] = self.sel_measure_title
+        # message["message_addtl_text"]       =self.template_addtl_text  # Ditto
+        if self.image is None:
+            message["image"] = []
+        elif binary_image:
+            message["image"] = self.image  # raw bytes, for responses that carry the chart as its own part
+        else:
+            message["image"] = base64.b64encode(self.image).decode("ascii")
+        if self.image_ticket:
+            message["image_ticket"] = self.image_ticket
+
+        full_message = {
+            "pfkb_version": "0.0.0",  # Need to soft code this so it is accurate
+            "pfp_version": "0.2.1",  # Ditto
+            "subject": context.current().subject,
+            "selected_candidate": candidate,
+            "selected_comparator": self.comparator_type,
+            "performance_month": self.performance_data["period.start"]
+            .iloc[-1]
+            .strftime("%B %Y"),  # Becomes string in response, format here
+            "message_generated_datetime": self.init_time,
+            "message": message,
+        }
+
+        return full_message
+
+
+@dataclass
+class Chart:
+    """
+    The plotted window of a Pictoralist and its render settings, everything a chart is drawn from.
+    Small enough to hand to render pool workers.
+    """
+
+    performance_data: pd.DataFrame  # the months to plot, CHART_COLUMNS
+    display_format: str
+    comparator_type: str
+    display_timeframe: int
+    plot_goal_line: bool
+    image_format: str
+    image_dpi: int
+    image_optimize: bool
+    image_max_bytes: int
+    chart_renderer: str
+    figure: Figure = field(default=None, init=False, repr=False)
+    axes: Axes = field(default=None, init=False, repr=False)
+
     ### Modularized plotting and saving shared code for both visual display types:
     def plot_and_save(self):
         logger.debug("Running 'plot_and_save'...")
-        plt.tight_layout()
-        plt.gca().set_alpha(
+        self.figure.tight_layout()
+        self.axes.set_alpha(
             0
         )  # Set alpha channel level to 0, full transparency of current axes
-        # plt.show()  # Allow for spot-check of graph locally (not for production)
 
-        ## Image cacheing functional code:
-        if self.cache_image:
-            # Specify cache folder name and image filename
-            folderName = "pictoralist_cache"
-            os.makedirs(folderName, exist_ok=True)
-            imgName = os.path.join(folderName, f"response_{self.init_time}.png")
+        return self.fit_budget(self.save_figure)
+
+    ### Save the chart at the configured resolution, lowering it until the image fits the size budget:
+    def fit_budget(self, save):
+        dpi = self.image_dpi
+        image = save(dpi)
+        while (
+            self.image_max_bytes
+            and len(image) > self.image_max_bytes
+            and self.image_format != "svg"  # vector output doesn't shrink with resolution
+            and dpi > MIN_DPI
+        ):
+            dpi = max(MIN_DPI, int(dpi * 0.9 * (self.image_max_bytes / len(image)) ** 0.5))
+            logger.debug(f"Chart is {len(image)} bytes, saving again at {dpi} dpi...")
+            image = save(dpi)
 
-            # Save figure to cache, then save to io bytes object, convert to base64 and return
-            plt.savefig(imgName, dpi=300, bbox_inches="tight")  # Save figure locally
+        if self.image_max_bytes and len(image) > self.image_max_bytes:
+            logger.warning(
+                f"Chart is {len(image)} bytes at {dpi} dpi, over the {self.image_max_bytes} byte budget"
+            )
+        return image
 
-        ## Save figure to io bytes object, encode base64, and return:
+    ### Save the figure to bytes in the configured format:
+    def save_figure(self, dpi):
         s = io.BytesIO()
-        plt.savefig(s, format="png", dpi=300, bbox_inches="tight")
-        plt.close()
-        s = base64.b64encode(s.getvalue()).decode("utf-8").replace("\n", "")
-        return s
+        if self.image_format == "webp":
+            # lossless keeps text and lines sharp, and is smaller than lossy for flat-colored charts
+            self.figure.savefig(
+                s, format="webp", dpi=dpi, bbox_inches="tight", pil_kwargs={"lossless": True}
+            )
+        else:
+            self.figure.savefig(s, format=self.image_format, dpi=dpi, bbox_inches="tight")
+
+        if self.image_format == "png" and self.image_optimize:
+            s.seek(0)
+            return fixed_layout.encode(Image.open(s), "png", optimize=True)
+        return s.getvalue()
+
+    ### Create a figure and its axes, drawn with Agg directly rather than through pyplot's global state:
+    def new_figure(self):
+        self.figure = Figure(figsize=(5, 2.5))
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
 
     ### Function to generate line chart
     def generate_linegraph(self):
@@ -268,7 +460,7 @@ class Pictoralist:
         x_values = self.performance_data["period.start"][
             -self.display_timeframe :
         ].dt.strftime("%b '%y")
-        plt.figure(figsize=(5, 2.5))  # Create the plot
+        self.new_figure()  # Create the plot
 
         ## Restrict graph to timeframe specified by set_timeframe()
         perf_series = self.performance_data["performance_level"][
@@ -280,10 +472,10 @@ class Pictoralist:
 
         ## Add vertical lines for each month
         for x in x_values:
-            plt.axvline(x=x, color="gray", linewidth=0.3)
+            self.axes.axvline(x=x, color="gray", linewidth=0.3)
 
         ## Plot performance and comparator level series
-        plt.plot(
+        self.axes.plot(
             x_values,
             perf_series,
             label="You",
@@ -291,7 +483,7 @@ class Pictoralist:
             linewidth=1.2,
             marker=".",
         )
-        plt.plot(
+        self.axes.plot(
             x_values,
             comp_series,
             label=self.comparator_type,
@@ -301,14 +493,15 @@ class Pictoralist:
         )
 
         ## Add month labels to x axis
-        plt.xticks(fontsize=7)
+        for label in self.axes.get_xticklabels():
+            label.set_fontsize(7)
 
         ## Set Axes and plot labels
-        plt.yticks(y_values, y_labels, fontsize=7)
+        self.axes.set_yticks(y_values, y_labels, fontsize=7)
         # Requested removal of labels, may implement again in debug for spot checking images
-        # plt.ylabel("Performance Level", weight='bold', fontsize=5)
-        # plt.xlabel("Time", weight='bold', fontsize=5)
-        # plt.title(f"Performance Over Time for Measure {self.selected_measure}", weight='bold', fontsize=5)
+        # self.axes.set_ylabel("Performance Level", weight='bold', fontsize=5)
+        # self.axes.set_xlabel("Time", weight='bold', fontsize=5)
+        # self.axes.set_title(f"Performance Over Time for Measure {self.selected_measure}", weight='bold', fontsize=5)
 
         ## Add data labels for the last three months of performance levels as floats
         last_three_months = x_values[-3:]
@@ -329,7 +522,7 @@ class Pictoralist:
             if performance < 25:
                 vert_offset = 15
 
-            plt.annotate(
+            self.axes.annotate(
                 label_text,
                 (month, performance),
                 textcoords="offset points",
@@ -340,7 +533,7 @@ class Pictoralist:
                 color="#063763",
             )
 
-        plt.legend(
+        self.axes.legend(
             loc="lower center",
             bbox_to_anchor=(0.5, -0.3),
             ncol=2,
@@ -348,12 +541,12 @@ class Pictoralist:
             frameon=False,
         )
 
-        ## Save and display the graph
-        self.base64_image = self.plot_and_save()
+        ## Save and return the graph
+        return self.plot_and_save()
 
     ### Function to generate bar chart
     def generate_barchart(self):
-        plt.figure(figsize=(5, 2.5))  # Create figure instance (500x250 @ 300dpi)
+        self.new_figure()  # Create figure instance (500x250 @ 300dpi)
         bar_width = 0.45  # Arbitrary bar width, adjust to find a good ratio to the display window
         bar_spacing = 0
 
@@ -378,7 +571,7 @@ class Pictoralist:
 
         ## If include_goal_line is True, plot the goal line
         if self.plot_goal_line and self.comparator_type != "Goal Value":
-            plt.hlines(
+            self.axes.hlines(
                 y=self.performance_data["goal_percent"][
                     -self.display_timeframe :
                 ].values,
@@ -393,8 +586,8 @@ class Pictoralist:
         ## Plot the bars for both data series
         x1 = np.arange(len(x_values)) + bar_width / 2  # position for first bar
         x2 = [x + bar_width + bar_spacing for x in x1]  # position for second bar
-        plt.bar(x1, graphed_perf, width=bar_width, label="You", color="#00254a")
-        plt.bar(
+        self.axes.bar(x1, graphed_perf, width=bar_width, label="You", color="#00254a")
+        self.axes.bar(
             x2,
             graphed_comp,
             width=bar_width,
@@ -416,7 +609,7 @@ class Pictoralist:
                     vert_offset = 15
                     text_color = "#00254a"
 
-                plt.annotate(
+                self.axes.annotate(
                     label_text,
                     (month, performance),
                     ha="center",
@@ -442,7 +635,7 @@ class Pictoralist:
                     vert_offset = 20
                     text_color = "#000000"
 
-                plt.annotate(
+                self.axes.annotate(
                     label_text,
                     (month, comparator),
                     ha="center",
@@ -458,66 +651,91 @@ class Pictoralist:
                 )
 
         ## Configure labels, titles, ticks, and limits
-        plt.yticks(y_values, y_labels, fontsize=7)
-        plt.xticks(x1 + bar_width / 2, x_values, fontsize=7)
-        plt.ylim(0, 100)
-        # plt.title(f"Performance Over Time for Measure {self.selected_measure}", weight='bold', fontsize=5)
-        # plt.xlabel("Time", weight='bold', fontsize=5)
-        # plt.ylabel("Performance Level", weight='bold', fontsize=5)
+        self.axes.set_yticks(y_values, y_labels, fontsize=7)
+        self.axes.set_xticks(x1 + bar_width / 2, x_values, fontsize=7)
+        self.axes.set_ylim(0, 100)
+        # self.axes.set_title(f"Performance Over Time for Measure {self.selected_measure}", weight='bold', fontsize=5)
+        # self.axes.set_xlabel("Time", weight='bold', fontsize=5)
+        # self.axes.set_ylabel("Performance Level", weight='bold', fontsize=5)
 
         ## Format legend and grid
-        plt.legend(
+        self.axes.legend(
             loc="lower center",
             bbox_to_anchor=(0.5, -0.3),
             ncol=3,
             fontsize=6,
             frameon=False,
         )
-        plt.grid(False)
-
-        ## Save and display the graph
-        self.base64_image = self.plot_and_save()
+        self.axes.grid(False)
 
-    ### Graphing function control logic (modularized to allow for changes and extra display formats in the future):
-    def graph_controller(self):
-        if self.display_format == "line chart" and self.generate_image:
-            logger.info("Generating line chart from performance data...")
-            self.generate_linegraph()
+        ## Save and return the graph
+        return self.plot_and_save()
 
-        elif self.display_format == "bar chart" and self.generate_image:
-            logger.info("Generating bar chart from performance data...")
-            self.generate_barchart()
+    ### Draw the chart for the display format with the configured renderer, returns the image (also run in render pool workers):
+    def draw(self):
+        if self.chart_renderer not in renderers:
+            raise ValueError(
+                f"Unknown chart renderer {self.chart_renderer!r}, available renderers are {', '.join(renderers)}"
+            )
+        return renderers[self.chart_renderer](self)
+
+    ### Fixed layout version of the line and bar charts, drawn with Pillow:
+    def draw_fixed_layout(self, dpi):
+        window = self.performance_data[-self.display_timeframe :]
+        months = list(window["period.start"].dt.strftime("%b '%y"))
+        performance = window["performance_level"].astype(float).tolist()
+        comparator = window["comparator_level"].astype(float).tolist()
+        labels = [
+            [f"{performance:.0f}%", f"{passed} / {denom}"]
+            for performance, passed, denom in zip(
+                window["performance_level"],
+                window["passed_count"],
+                window["measureScore.denominator"],
+            )
+        ]
 
+        if self.display_format == "line chart":
+            image = fixed_layout.line_chart(
+                months, performance, comparator, self.comparator_type, labels, dpi
+            )
         else:
-            logger.info("Generating text only feedback message, graphing skipped...")
+            goal = []
+            if self.plot_goal_line and self.comparator_type != "Goal Value":
+                goal = window["goal_percent"].astype(float).tolist()
+            image = fixed_layout.bar_chart(
+                months,
+                performance,
+                comparator,
+                self.comparator_type,
+                labels,
+                goal,
+                dpi,
+            )
+        return fixed_layout.encode(image, self.image_format, self.image_optimize)
 
-    ### Prepare selected message as done previously for LDT continuity:
-    def prepare_selected_message(self):
-        logger.debug("Running pictoralist/prepare_selected_message...")
-        candidate = {}
-        message = {}
-        candidate["message_template_id"] = self.template_id
-        candidate["message_template_name"] = self.template_name
-        candidate["display"] = self.display_format
-        candidate["measure"] = self.selected_measure
-        candidate["acceptable_by"] = self.acceptable_by
-        message["text_message"] = self.message_text
-        message["measure"] = self.selected_measure
-        message["measure_full_title"] = self.sel_measure_title
-        # message["message_addtl_text"]       =self.template_addtl_text  # Ditto
-        message["image"] = self.base64_image
 
-        full_message = {
-            "pfkb_version": "0.0.0",  # Need to soft code this so it is accurate
-            "pfp_version": "0.2.1",  # Ditto
-            "subject": context.subject,
-            "selected_candidate": candidate,
-            "selected_comparator": self.comparator_type,
-            "performance_month": self.performance_data["period.start"]
-            .iloc[-1]
-            .strftime("%B %Y"),  # Becomes string in response, format here
-            "message_generated_datetime": self.init_time,
-            "message": message,
-        }
+def draw_chart(chart: Chart) -> bytes:
+    """Draws the chart, in this process or a render pool worker"""
+    return chart.draw()
 
-        return full_message
+
+def draw_matplotlib(chart: Chart) -> bytes:
+    if chart.display_format == "line chart":
+        logger.info("Generating line chart from performance data...")
+        return chart.generate_linegraph()
+
+    logger.info("Generating bar chart from performance data...")
+    return chart.generate_barchart()
+
+
+def draw_fixed_layout(chart: Chart) -> bytes:
+    if chart.image_format == "svg":
+        # the fixed layout renderer only draws raster images
+        return draw_matplotlib(chart)
+
+    logger.info(f"Generating {chart.display_format} with the fixed layout renderer...")
+    return chart.fit_budget(chart.draw_fixed_layout)
+
+
+# chart renderers by name (chart_renderer setting), each draws a Chart and returns the image
+renderers = {"matplotlib": draw_matplotlib, "pillow": draw_fixed_layout}
@@ -0,0 +1,89 @@
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Optional
+
+from loguru import logger
+
+from src.pictoralist.image_cache import ImageCache
+
+
+class RenderPool:
+    """
+    Charts drawn in a pool of worker processes, by ticket.
+
+    A ticket is the chart's content key: identical charts requested while one is still being
+    drawn share the render, and finished charts are stored in the image cache. The most recent
+    tickets are kept here as well, so their charts can be collected when the cache is disabled.
+    """
+
+    def __init__(self, workers: int, cache: ImageCache, max_tickets: int = 1024):
+        self.workers = workers
+        self.cache = cache
+        self.max_tickets = max_tickets
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tickets: OrderedDict[str, Future] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, ticket: str, render: Callable[[], bytes]) -> Future:
+        """Draws the chart with render (a picklable callable returning the image) unless it is already being drawn"""
+        with self._lock:
+            future = self._tickets.get(ticket)
+            if future is None or _failed(future):
+                try:
+                    future = self._executor_for_submit().submit(render)
+                except BrokenProcessPool:
+                    # a worker died (killed, out of memory), start over with a new pool
+                    self._executor = None
+                    future = self._executor_for_submit().submit(render)
+                future.add_done_callback(partial(self._rendered, ticket))
+
+            self._tickets[ticket] = future
+            self._tickets.move_to_end(ticket)
+            while len(self._tickets) > self.max_tickets:
+                self._tickets.popitem(last=False)
+        return future
+
+    def get(self, ticket: str) -> Optional[Future]:
+        """The ticket's chart, drawn or still being drawn. None for tickets that are neither pending nor cached"""
+        with self._lock:
+            future = self._tickets.get(ticket)
+        if future is not None:
+            return future
+
+        image = self.cache.get(ticket)
+        if image is None:
+            return None
+        future = Future()
+        future.set_result(image)
+        return future
+
+    def _executor_for_submit(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawned rather than forked, the API process has threads running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _rendered(self, ticket: str, future: Future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.warning(f"Could not draw chart {ticket}: {future.exception()!r}")
+            return
+        self.cache.put(ticket, future.result())
+
+
+def _failed(future: Future) -> bool:
+    return future.done() and (future.cancelled() or future.exception() is not None)
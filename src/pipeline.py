@@ -14,16 +14,29 @@ from src.utils.namespace import PSDO, SLOWMO
 from src.utils.settings import settings
 from src.utils.utils import (
     candidates_records,
-    load_esteemer,
     merge_and_pivot,
     render,
+    select_candidate,
     set_logger,
 )
 
 set_logger()
 
 
-def pipeline():
+def pipeline(defer_image=False, binary_image=False):
+    performance_df = prepare_candidates()
+
+    # esteemer
+    logger.debug("Calling Esteemer from main...")
+    selected_candidate = select_candidate()
+
+    return compose_message(
+        performance_df, selected_candidate, defer_image, binary_image
+    )
+
+
+def prepare_candidates():
+    """Runs the stages up to candidate selection for the current context, returns the prepared performance data"""
     performance_df = bitstomach.prepare()
 
     # BitStomach
@@ -34,20 +47,26 @@ def pipeline():
     if len(list(performance_content[PSDO.motivating_information])) == 0:
         raise_error("Insufficient significant data found for providing feedback, process aborted. Detail: No motivating information found in the performance content.")
 
-    context.subject_graph += g
+    context.current().subject_graph += g
 
     # candidate_pudding
     logger.debug("Calling candidate_pudding from main...")
     candidate_pudding.create_candidates()
     
-    if not set(context.subject_graph[: SLOWMO.AcceptableBy :]):
+    if not set(context.current().subject_graph[: SLOWMO.AcceptableBy :]):
         raise_error("Insufficient significant data found for providing feedback, process aborted. Detail: No acceptable candidates found after candidate creation.")
-       
-    # esteemer
-    logger.debug("Calling Esteemer from main...")
-    esteemer = load_esteemer(context)
-    selected_candidate = esteemer.select_candidate()    
 
+    return performance_df
+
+
+def compose_message(
+    performance_df, selected_candidate, defer_image=False, binary_image=False
+):
+    """
+    Runs the stages after candidate selection for the current context, returns the response.
+    With defer_image, charts are drawn in the render pool and the response carries an image ticket instead.
+    With binary_image, the chart is left as raw bytes rather than base64.
+    """
     preferences = get_preferences()
  
     if preferences["Display_Format"] and selected_candidate:
@@ -55,14 +74,18 @@ def pipeline():
             preferences["Display_Format"]
         )
 
-    selected_message = render(context.subject_graph, selected_candidate.identifier if selected_candidate else None)
+    selected_message = render(context.current().subject_graph, selected_candidate.identifier if selected_candidate else None)
 
     ### Pictoralist 2, now on the Nintendo DS: ###
     logger.debug("Calling Pictoralist from main...")
     if selected_message["message_text"] != "No message selected":
         ## Initialize and run message and display generation:
         pc = Pictoralist(
-            merge_and_pivot(performance_df),
+            merge_and_pivot(
+                performance_df,
+                str(selected_message["measure_name"]),
+                settings.display_window,
+            ),
             selected_message,
             settings,
         )
@@ -70,9 +93,9 @@ def pipeline():
         pc.fill_missing_months()  # Fill holes in dataframe where they exist
         pc.set_timeframe()  # Ensure no less than three months being graphed
         pc.finalize_text()  # Finalize text message and labels
-        pc.graph_controller()  # Select and run graphing based on display type
+        pc.graph_controller(defer_image)  # Select and run graphing based on display type
 
-        full_selected_message = pc.prepare_selected_message()
+        full_selected_message = pc.prepare_selected_message(binary_image)
     else:
         full_selected_message = selected_message
 
@@ -86,17 +109,18 @@ def pipeline():
             "memory_info.rss": mem_info.rss / 1024 / 1024,
         }
 
-        response["candidates"] = candidates_records(context.subject_graph)
+        response["candidates"] = candidates_records(context.current().subject_graph)
 
     response.update(full_selected_message)
 
     return response
 
 def raise_error(message):
-    context.subject_graph.close()
+    run = context.current()
+    run.subject_graph.close()
     detail = {
             "message": message,
-            "subject": context.subject,
+            "subject": run.subject,
         }
     raise HTTPException(
             status_code=400,
@@ -7,14 +7,15 @@ import pandas as pd
 import requests
 from dotenv import load_dotenv
 from loguru import logger
-from rdflib import RDF, Graph
+from rdflib import RDF, Graph, URIRef
 from requests_file import FileAdapter
 
-from src.models import Measure
-from src.utils.graph_operations import manifest_to_graph
+from src.models import Measure, MessageTemplate, PreconditionIndex
+from src.utils.graph_operations import load_knowledge_base
 from src.utils.namespace._PSDO import PSDO
+from src.utils.report_tables import compact, memory_size, read_report
 from src.utils.settings import settings
-from src.utils.utils import load_kb_config, set_logger
+from src.utils.utils import load_kb_config, resolve_esteemer, set_logger
 
 set_logger()
 
@@ -33,10 +34,39 @@ performance_measure_report = pd.DataFrame()
 practitioner_role = pd.DataFrame()
 comparator_measure_report = pd.DataFrame()
 
+# columns of the report tables the pipeline uses, the only ones read from Parquet and Feather files
+PERFORMANCE_COLUMNS = [
+    "measure",
+    "subject",
+    "period.start",
+    "period.end",
+    "measureScore.rate",
+    "measureScore.denominator",
+]
+COMPARATOR_COLUMNS = [
+    "measure",
+    "period.start",
+    "period.end",
+    "measureScore.rate",
+    "group.subject",
+    "group.code",
+    "PractitionerRole.code",
+]
+
+# positions of each subject's (or comparator group's) rows in the tables above
+performance_partitions: dict = {}
+practitioner_role_partitions: dict = {}
+comparator_partitions: dict = {}
+comparator_partition_columns: list[str] = []
+
 performance_month = ""
 esteemer_plugin_name = ""
 esteemer_plugin_version = ""
+esteemer_factory = None  # the configured plugin class, resolved by reload_esteemer
 measure_catalog: dict[str, Measure] = {}
+message_templates: dict[URIRef, MessageTemplate] = {}
+message_templates_by_direction: dict[str, tuple[MessageTemplate, ...]] = {}
+precondition_index = PreconditionIndex.from_templates([])
 
 # Set up request session as se, config to handle file URIs with FileAdapter
 se = requests.Session()
@@ -63,9 +93,14 @@ def startup(performance_data_path: pathlib.Path = None, performance_m: str = "")
             practitioner_role, \
             performance_month, \
             config, \
-            esteemer_plugin_name, \
-            esteemer_plugin_version, \
-            measure_catalog
+            measure_catalog, \
+            performance_partitions, \
+            practitioner_role_partitions, \
+            comparator_partitions, \
+            comparator_partition_columns, \
+            message_templates, \
+            message_templates_by_direction, \
+            precondition_index
 
         default_preferences_text = se.get(settings.default_preferences).text
         default_preferences_original_dict = json.loads(default_preferences_text)
@@ -73,21 +108,33 @@ def startup(performance_data_path: pathlib.Path = None, performance_m: str = "")
             k.lower(): v for k, v in default_preferences_original_dict.items()
         }
 
-        base_graph = manifest_to_graph(settings.manifest)
-        
-        measure_catalog = Measure.from_graph(base_graph)
-        kb_config = load_kb_config(settings.config)
-        plugin_cfg = kb_config.get("plugins", {}).get("scaffold.esteemer")
-        if not plugin_cfg:
-            raise ValueError("No scaffold.esteemer plugin configured")
-        esteemer_plugin_name = plugin_cfg.get("name")
-        esteemer_plugin_version = plugin_cfg.get("version")
+        base_graph, measure_catalog = load_knowledge_base(
+            settings.manifest, settings.kb_snapshot_dir
+        )
+        message_templates = MessageTemplate.from_graph(base_graph)
+        message_templates_by_direction = MessageTemplate.by_direction(message_templates)
+        precondition_index = PreconditionIndex.from_templates(message_templates.values())
+        reload_esteemer()
+
+        if settings.performance_month:
+            performance_month = settings.performance_month
+
+        if performance_m:
+            performance_month = performance_m
 
         if performance_data_path:
-            performance_measure_report = pd.read_csv(
-                os.path.join(performance_data_path, "PerformanceMeasureReport.csv"),
+            filters = period_filters(performance_month)
+
+            performance_measure_report = read_report(
+                performance_data_path,
+                "PerformanceMeasureReport",
+                columns=PERFORMANCE_COLUMNS,
+                filters=filters,
+                dates=["period.start", "period.end"],
+                strings=["subject"],
+                categories=["measure", "subject"],
                 parse_dates=["period.start", "period.end"],
-                dtype={"subject": str}                
+                dtype={"subject": str},
             )
             
             # force the column to numeric and drop bad rows
@@ -107,8 +154,13 @@ def startup(performance_data_path: pathlib.Path = None, performance_m: str = "")
                 subset=["measureScore.denominator"]
             )
             
-            comparator_measure_report = pd.read_csv(
-                os.path.join(performance_data_path, "ComparatorMeasureReport.csv"),
+            comparator_measure_report = read_report(
+                performance_data_path,
+                "ComparatorMeasureReport",
+                columns=COMPARATOR_COLUMNS,
+                filters=filters,
+                dates=["period.start", "period.end"],
+                categories=["measure", "group.code"],
                 parse_dates=["period.start", "period.end"],
             )
             
@@ -119,12 +171,40 @@ def startup(performance_data_path: pathlib.Path = None, performance_m: str = "")
                 comparator_measure_report["group.code"].isin(comparator_uri_strings)
             ]
             
-            practitioner_role = pd.read_csv(
-                os.path.join(performance_data_path, "PractitionerRole.csv"),
+            if settings.compact_tables:
+                performance_measure_report = compact_report(
+                    "PerformanceMeasureReport",
+                    performance_measure_report,
+                    categories=["measure", "subject"],
+                    integers=["measureScore.denominator"],
+                )
+                comparator_measure_report = compact_report(
+                    "ComparatorMeasureReport",
+                    comparator_measure_report,
+                    categories=["measure", "group.code", "group.subject", "PractitionerRole.code"],
+                )
+
+            practitioner_role = read_report(
+                performance_data_path,
+                "PractitionerRole",
+                strings=["PractitionerRole.identifier"],
                 dtype={"PractitionerRole.identifier": str},
             )
             config = json.load(open(os.path.join(performance_data_path, "config.json")))
 
+            performance_partitions = partition(performance_measure_report, ["subject"])
+            practitioner_role_partitions = partition(
+                practitioner_role, ["PractitionerRole.identifier"]
+            )
+            comparator_partition_columns = [
+                column
+                for column in ["group.subject", "PractitionerRole.code"]
+                if column in config.get("ComparatorMergeColumns", [])
+            ]
+            comparator_partitions = partition(
+                comparator_measure_report, comparator_partition_columns
+            )
+
             if settings.use_preferences:
                 preferences_file = os.path.join(performance_data_path, "Preference.csv")
                 if os.path.exists(preferences_file):
@@ -142,14 +222,76 @@ def startup(performance_data_path: pathlib.Path = None, performance_m: str = "")
                     )
                     history.set_index("subject", inplace=True, drop=False)
 
-        if settings.performance_month:
-            performance_month = settings.performance_month
-
-        if performance_m:
-            performance_month = performance_m
-
     except Exception as e:
         print("Startup aborted:", e)
         exit(0)
 
 
+def reload_esteemer():
+    """
+    Reads the esteemer plugin from the KB config and resolves it, so requests don't scan entry points.
+    Call again when the KB config changes
+    """
+    global esteemer_plugin_name, esteemer_plugin_version, esteemer_factory
+
+    kb_config = load_kb_config(settings.config)
+    plugin_cfg = kb_config.get("plugins", {}).get("scaffold.esteemer")
+    if not plugin_cfg:
+        raise ValueError("No scaffold.esteemer plugin configured")
+
+    reset = getattr(esteemer_factory, "reset", None)
+    if reset:
+        reset()
+    esteemer_factory = resolve_esteemer(plugin_cfg.get("name"), plugin_cfg.get("version"))
+    esteemer_plugin_name = plugin_cfg.get("name")
+    esteemer_plugin_version = plugin_cfg.get("version")
+
+
+def period_filters(month: str) -> list[tuple]:
+    """
+    The periods of the report tables to read for the performance month with performance_lookback
+    set: that many months up to it. All periods without it
+    """
+    if not month or settings.performance_lookback <= 0:
+        return []
+    month = pd.Timestamp(month)
+    return [
+        ("period.start", "<=", month),
+        ("period.start", ">=", month - pd.DateOffset(months=settings.performance_lookback - 1)),
+    ]
+
+
+def compact_report(name: str, frame: pd.DataFrame, **columns) -> pd.DataFrame:
+    """The report table in compact types (see report_tables.compact), logging the memory it saves"""
+    compacted = compact(frame, **columns)
+    logger.info(
+        f"{name}: {memory_size(frame)} -> {memory_size(compacted)} in compact tables"
+    )
+    return compacted
+
+
+def partition(frame: pd.DataFrame, columns: list[str]) -> dict:
+    """
+    Positions of the rows for each value of the columns (a tuple of values when there are several columns),
+    in table order, so a subject's rows can be taken without scanning the whole table
+    """
+    if not columns:
+        return {}
+    return frame.groupby(columns, sort=False, observed=True).indices
+
+
+def partition_rows(frame: pd.DataFrame, partitions: dict, key) -> pd.DataFrame:
+    return frame.iloc[partitions.get(key, [])]
+
+
+def comparator_rows(values: dict) -> pd.DataFrame:
+    """Comparator rows matching the given values of the ComparatorMergeColumns"""
+    if not comparator_partition_columns:
+        return comparator_measure_report.copy()
+
+    key = tuple(values[column] for column in comparator_partition_columns)
+    return partition_rows(
+        comparator_measure_report,
+        comparator_partitions,
+        key if len(key) > 1 else key[0],
+    )
@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from urllib.parse import urljoin
 from urllib.request import urlopen
 
@@ -5,35 +7,113 @@ import yaml
 from loguru import logger
 from rdflib import Graph
 
+from src.models import Measure
+from src.utils import kb_snapshot
+from src.utils.settings import settings
 from src.utils.utils import set_logger
 
 set_logger()
 
 
-def manifest_to_graph(manifest_path: str) -> Graph:
+def read_manifest(manifest_path: str) -> list[str]:
+    """Resolve the manifest into the list of knowledge base file URLs, in manifest order"""
+    with urlopen(manifest_path) as f:
+        manifest_file = yaml.safe_load(f.read().decode("utf-8"))
+
+    files = []
+    for key, values in manifest_file.items():
+        base = urljoin(manifest_path, key)
+        for value in values:
+            files.append(urljoin(base, value))
+    return files
+
+
+def fetch_file(file: str) -> Optional[str]:
+    try:
+        with urlopen(file) as f:
+            return f.read().decode("utf-8")
+    except Exception as e:
+        logger.error(f"Error processing item {file}: {e}")
+        return None
+
+
+def fetch_sources(manifest_path: str) -> dict[str, Optional[str]]:
+    """Read every file listed in the manifest, keyed by file URL. Files that cannot be read map to None"""
+    files = read_manifest(manifest_path)
+    with ThreadPoolExecutor(max_workers=settings.kb_load_workers) as executor:
+        return dict(zip(files, executor.map(fetch_file, files)))
+
+
+def parse_file(file: str, file_content: Optional[str]) -> Optional[Graph]:
+    if file_content is None:
+        return None
+    try:
+        return Graph().parse(data=file_content, format="json-ld")
+    except Exception as e:
+        logger.error(f"Error processing item {file}: {e}")
+        return None
+
+
+def graph_from_sources(sources: dict[str, Optional[str]]) -> Graph:
+    """
+    Parses the fetched files into one graph, in manifest order. Parsing is CPU bound and holds the
+    GIL, so unlike fetching it is not spread over threads.
+    """
     g: Graph = Graph()
 
+    for file, file_content in sources.items():
+        temp_graph = parse_file(file, file_content)
+        if temp_graph is None:
+            continue
+        g += temp_graph
+
+        logger.debug(f"Graphed file {file}")
+
+    return g
+
+
+def manifest_to_graph(manifest_path: str) -> Graph:
     try:
-        with urlopen(manifest_path) as f:
-            manifest_file = yaml.safe_load(f.read().decode("utf-8"))
+        sources = fetch_sources(manifest_path)
     except Exception as e:
         logger.error(f"Error loading manifest: {e}")
-        return g  # Return an empty graph if the manifest cannot be loaded
+        return Graph()  # Return an empty graph if the manifest cannot be loaded
 
-    for key, values in manifest_file.items():
-        base = urljoin(manifest_path, key)
-        for value in values:
-            file = urljoin(base, value)
-            try:
-                with urlopen(file) as f:
-                    file_content = f.read().decode("utf-8")
+    return graph_from_sources(sources)
 
-                temp_graph = Graph().parse(data=file_content, format="json-ld")
-                g += temp_graph
 
-                logger.debug(f"Graphed file {file}")
-            except Exception as e:
-                logger.error(f"Error processing item {file}: {e}")
-                continue
+def load_knowledge_base(
+    manifest_path: str, snapshot_dir: Optional[str] = None
+) -> tuple[Graph, dict[str, Measure]]:
+    """
+    Builds the base graph and measure catalog from the manifest.
 
-    return g
+    When a snapshot directory is given, the result is stored there as a compiled snapshot
+    keyed by the content of the manifest files, and later calls load the snapshot instead of
+    parsing the JSON-LD again. Any change to the manifest or its files yields a new key, so the
+    snapshot is rebuilt automatically.
+    """
+    if not snapshot_dir:
+        graph = manifest_to_graph(manifest_path)
+        return graph, Measure.from_graph(graph)
+
+    try:
+        sources = fetch_sources(manifest_path)
+    except Exception as e:
+        logger.error(f"Error loading manifest: {e}")
+        return Graph(), {}
+
+    manifest = kb_snapshot.manifest_id(manifest_path)
+    key = kb_snapshot.snapshot_key(sources)
+    snapshot = kb_snapshot.load_snapshot(snapshot_dir, manifest, key)
+    if snapshot:
+        return snapshot
+
+    graph = graph_from_sources(sources)
+    measure_catalog = Measure.from_graph(graph)
+
+    # don't keep a snapshot of a partially fetched knowledge base
+    if None not in sources.values():
+        kb_snapshot.save_snapshot(snapshot_dir, manifest, key, graph, measure_catalog)
+
+    return graph, measure_catalog
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import pathlib
+import pickle
+from typing import Optional
+
+import rdflib
+from loguru import logger
+from rdflib import Graph
+
+from src.models import Measure
+
+SNAPSHOT_FORMAT = "1"
+
+
+def snapshot_key(sources: dict[str, Optional[str]]) -> str:
+    """Content hash of the knowledge base files (and the format of the snapshot itself)"""
+    digest = hashlib.sha256()
+    digest.update(f"{SNAPSHOT_FORMAT}\0{rdflib.__version__}\0".encode("utf-8"))
+    for file, content in sources.items():
+        digest.update(f"{file}\0{content}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def manifest_id(manifest_path: str) -> str:
+    """Short hash of the manifest location, so snapshots of different manifests can share a directory"""
+    return hashlib.sha256(str(manifest_path).encode("utf-8")).hexdigest()[:12]
+
+
+def snapshot_path(snapshot_dir: str, manifest: str, key: str) -> pathlib.Path:
+    return pathlib.Path(snapshot_dir) / f"kb-{manifest}-{key}.pickle"
+
+
+def load_snapshot(
+    snapshot_dir: str, manifest: str, key: str
+) -> Optional[tuple[Graph, dict[str, Measure]]]:
+    path = snapshot_path(snapshot_dir, manifest, key)
+    if not path.exists():
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            graph, measure_catalog = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable knowledge base snapshot {path}: {e}")
+        return None
+
+    logger.debug(f"Loaded knowledge base snapshot {path}")
+    return graph, measure_catalog
+
+
+def save_snapshot(
+    snapshot_dir: str,
+    manifest: str,
+    key: str,
+    graph: Graph,
+    measure_catalog: dict[str, Measure],
+):
+    path = snapshot_path(snapshot_dir, manifest, key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write to a temporary file first so concurrent workers never see a partial snapshot
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(temp_path, "wb") as f:
+            pickle.dump((graph, measure_catalog), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+        # only replace older snapshots of the same manifest
+        for stale in path.parent.glob(f"kb-{manifest}-*.pickle"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"Could not save knowledge base snapshot {path}: {e}")
+        return
+
+    logger.debug(f"Saved knowledge base snapshot {path}")
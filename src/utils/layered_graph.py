@@ -0,0 +1,71 @@
+from rdflib import Graph
+from rdflib.paths import Path
+
+
+class LayeredGraph(Graph):
+    """
+    A graph that overlays a small, writable delta on top of a shared base graph.
+
+    The base graph is held by reference and never modified; reads see the union of
+    base and delta, writes only ever land in the delta. Removing a base triple records
+    it in a per-graph set of removed triples that reads filter out, so ``remove`` and
+    ``set`` behave as on a plain graph. This lets each request work against the full
+    knowledge base without copying it.
+    """
+
+    def __init__(self, base: Graph, **kwargs):
+        super().__init__(**kwargs)
+        self.base = base
+        self.removed: set = set()
+        self.namespace_manager = base.namespace_manager
+
+    def add(self, triple):
+        if triple in self.base:
+            self.removed.discard(triple)
+            return self
+        return super().add(triple)
+
+    def addN(self, quads):  # noqa: N802
+        return super().addN(
+            (s, p, o, c) for s, p, o, c in quads if not self._restore((s, p, o))
+        )
+
+    def _restore(self, triple) -> bool:
+        """Whether the triple is in the base graph, bringing it back if it was removed"""
+        if triple not in self.base:
+            return False
+        self.removed.discard(triple)
+        return True
+
+    def remove(self, triple):
+        self.removed.update(self._base_triples(triple))
+        return super().remove(triple)
+
+    def triples(self, triple):
+        s, p, o = triple
+        if isinstance(p, Path):
+            for _s, _o in p.eval(self, s, o):
+                yield _s, p, _o
+            return
+
+        yield from self._base_triples((s, p, o))
+        yield from super().triples((s, p, o))
+
+    def _base_triples(self, triple):
+        if not self.removed:
+            return self.base.triples(triple)
+        return (t for t in self.base.triples(triple) if t not in self.removed)
+
+    def triples_choices(self, triple, context=None):
+        # the store would only answer from the delta, so match each choice in turn
+        for index, choices in enumerate(triple):
+            if isinstance(choices, (list, tuple)):
+                for choice in choices:
+                    pattern = list(triple)
+                    pattern[index] = choice
+                    yield from self.triples(tuple(pattern))
+                return
+        yield from self.triples(triple)
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.removed) + super().__len__()
@@ -0,0 +1,144 @@
+import operator
+import pathlib
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+# columnar formats by extension, in the order they are looked for
+COLUMNAR_FORMATS = {".parquet": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+}
+
+
+def report_path(directory, name: str) -> pathlib.Path:
+    """The report file for the table name: a Parquet or Feather file when there is one, the CSV file otherwise"""
+    for extension in COLUMNAR_FORMATS:
+        path = pathlib.Path(directory, name + extension)
+        if path.exists():
+            return path
+    return pathlib.Path(directory, name + ".csv")
+
+
+def read_report(
+    directory,
+    name: str,
+    columns: Optional[list[str]] = None,
+    filters: list[tuple] = (),
+    dates: list[str] = (),
+    strings: list[str] = (),
+    categories: list[str] = (),
+    **csv_options,
+) -> pd.DataFrame:
+    """
+    Reads a report table from the directory, see report_path.
+
+    Filters are (column, operator, value) tuples that every row must match. Only the given columns
+    (those the file has) are read. From Parquet and Feather files only the matching rows are read,
+    with the dates parsed and the category columns made categorical. CSV files are read with the CSV
+    options, and filtered afterwards.
+
+    The string columns of columnar files are converted to text, like CSV columns read with dtype str.
+    """
+    path = report_path(directory, name)
+    if path.suffix == ".csv":
+        return _read_csv(path, columns, filters, csv_options)
+
+    logger.debug(f"Reading {path.name} ({len(filters)} filters)...")
+    frame = read_columnar(path, columns, filters)
+    for column in _present(frame, dates):
+        frame[column] = pd.to_datetime(frame[column]).astype("datetime64[ns]")
+    for column in _present(frame, strings):
+        frame[column] = frame[column].where(frame[column].isna(), frame[column].astype(str))
+    for column in _present(frame, categories):
+        frame[column] = frame[column].astype("category")
+    return frame
+
+
+def _read_csv(path: pathlib.Path, columns: Optional[list[str]], filters, csv_options: dict) -> pd.DataFrame:
+    if columns is not None:
+        csv_options.setdefault("usecols", lambda column: column in columns)
+    frame = pd.read_csv(path, **csv_options)
+    for column, op, value in filters:
+        frame = frame[OPERATORS[op](frame[column], value)]
+    return frame
+
+
+def _present(frame: pd.DataFrame, columns) -> list[str]:
+    return [column for column in columns if column in frame]
+
+
+def read_columnar(path: pathlib.Path, columns: Optional[list[str]], filters) -> pd.DataFrame:
+    try:
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError(
+            f"Reading {path.name} needs pyarrow, install scaffold with the columnar extra"
+        ) from e
+
+    dataset = ds.dataset(path, format=COLUMNAR_FORMATS[path.suffix])
+    if columns is not None:
+        columns = [column for column in columns if column in dataset.schema.names]
+    return dataset.to_table(
+        columns=columns, filter=_filter_expression(dataset.schema, filters)
+    ).to_pandas()
+
+
+def _filter_expression(schema, filters):
+    """The filters as a pyarrow expression on the dataset's columns, None without filters"""
+    import pyarrow.dataset as ds
+
+    expression = None
+    for column, op, value in filters:
+        condition = OPERATORS[op](
+            ds.field(column), _date_scalar(schema.field(column).type, value)
+        )
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _date_scalar(field_type, value):
+    """A date to compare a column with, in the column's type"""
+    import pyarrow as pa
+
+    if pa.types.is_string(field_type) or pa.types.is_large_string(field_type):
+        return pd.Timestamp(value).strftime("%Y-%m-%d")  # ISO dates compare as text
+    if pa.types.is_date(field_type):
+        return pa.scalar(pd.Timestamp(value).date(), type=field_type)
+    return pa.scalar(pd.Timestamp(value), type=field_type)
+
+
+def compact(
+    frame: pd.DataFrame, categories: list[str] = (), integers: list[str] = ()
+) -> pd.DataFrame:
+    """
+    The table with its repeated text columns as categoricals, and its integer columns in 32 bits
+    when that loses nothing: columns holding fractions or values out of the int32 range are left
+    as they are. Rates stay in 64 bits, float32 can't hold most of them exactly (0.67).
+    """
+    frame = frame.copy()
+    for column in _present(frame, categories):
+        frame[column] = frame[column].astype("category")
+    for column in _present(frame, integers):
+        if _fits_int32(frame[column]):
+            frame[column] = frame[column].astype("int32")
+    return frame
+
+
+def _fits_int32(values: pd.Series) -> bool:
+    limits = np.iinfo(np.int32)
+    return bool(
+        (values % 1 == 0).all() and limits.min <= values.min() and values.max() <= limits.max
+    )
+
+
+def memory_size(frame: pd.DataFrame) -> str:
+    """Size of the table in memory, text included"""
+    return f"{frame.memory_usage(deep=True).sum() / 1024 / 1024:.1f} MB"
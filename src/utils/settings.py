@@ -2,7 +2,7 @@ import os
 import sys
 
 # import tomllib
-from decouple import Config, RepositoryEnv, config
+from decouple import Choices, Config, RepositoryEnv, config
 from loguru import logger
 
 ## Logging setup
@@ -26,6 +26,14 @@ else:
 #     pypro = tomllib.load(f)
 
 
+def positive_int(value) -> int:
+    """Cast for settings that need at least 1, such as numbers of workers"""
+    number = int(value)
+    if number < 1:
+        raise ValueError(f"Expected a number of at least 1, got {value}")
+    return number
+
+
 ## Settings class to store decoupled instance and build settings:
 class Settings:
     def __init__(self):
@@ -37,6 +45,19 @@ class Settings:
         self.manifest = config("manifest", cast=str, default=None)
         self.config = config("config", cast=str, default=None)
         self.default_preferences = config("default_preferences", cast=str, default=None)
+        self.kb_snapshot_dir = config(
+            "kb_snapshot_dir", cast=str, default=""
+        )  # Directory for compiled knowledge base snapshots, disabled if empty
+        self.kb_load_workers = config(
+            "kb_load_workers", cast=positive_int, default=8
+        )  # Number of manifest files fetched concurrently
+
+        self.performance_lookback = config(
+            "performance_lookback", cast=int, default=0
+        )  # Months of performance data read up to the performance month (batch_csv), all if 0
+        self.compact_tables = config(
+            "compact_tables", cast=bool, default=False
+        )  # Keep the batch_csv report tables with categoricals and 32 bit integers
 
         # self.preferences = config("preferences", cast=str, default=None)
         # self.history = config("history", cast=str, default=None)
@@ -65,10 +86,54 @@ class Settings:
         self.use_coachiness = config(
             "use_coachiness", cast=bool, default=True
         )  # use coachiness
+        self.vectorized_scoring = config(
+            "vectorized_scoring", cast=bool, default=False
+        )  # score all of a subject's candidates at once with NumPy
+
+        self.api_concurrency = config(
+            "api_concurrency", cast=positive_int, default=1
+        )  # Number of requests the API runs the pipeline for at once
+        self.api_queue_depth = config(
+            "api_queue_depth", cast=int, default=16
+        )  # Number of requests allowed to wait for a pipeline before the API returns 503
 
         # Instance display settings
         self.display_window = config("display_window", cast=int, default=6)
         self.plot_goal_line = config("plot_goal_line", cast=bool, default=True)
+        self.chart_renderer = config(
+            "chart_renderer", cast=Choices(["matplotlib", "pillow"]), default="matplotlib"
+        )  # Renderer drawing the charts, matplotlib or pillow (fixed layout)
+        self.image_format = config(
+            "image_format", cast=Choices(["png", "webp", "svg"]), default="png"
+        )  # Format charts are saved in
+        self.image_dpi = config("image_dpi", cast=int, default=300)  # Chart resolution
+        self.image_optimize = config(
+            "image_optimize", cast=bool, default=False
+        )  # Save PNG charts as optimized palette images
+        self.image_max_bytes = config(
+            "image_max_bytes", cast=int, default=0
+        )  # Size budget of a chart, lower resolutions are tried until it fits, disabled if 0
+        self.image_encoding = config(
+            "image_encoding", cast=Choices(["base64", "binary"]), default="base64"
+        )  # API charts as base64 in the JSON, or raw in a multipart/mixed response
+        self.image_cache_size = config(
+            "image_cache_size", cast=int, default=0
+        )  # Number of rendered charts kept in memory for identical charts, disabled if 0
+        self.image_cache_dir = config(
+            "image_cache_dir", cast=str, default=""
+        )  # Directory for rendered charts shared between processes, disabled if empty
+        self.image_cache_max_bytes = config(
+            "image_cache_max_bytes", cast=int, default=256 * 1024 * 1024
+        )  # Size budget of image_cache_dir, oldest charts are removed first
+        self.deferred_images = config(
+            "deferred_images", cast=bool, default=False
+        )  # API responses carry an image ticket, charts are drawn in the render pool
+        self.render_workers = config(
+            "render_workers", cast=positive_int, default=2
+        )  # Number of worker processes drawing deferred charts
+        self.image_wait_timeout = config(
+            "image_wait_timeout", cast=float, default=30.0
+        )  # Seconds /image/{ticket} waits for a chart still being drawn
 
 
 # Instantiate
@@ -4,6 +4,7 @@ from importlib.metadata import entry_points
 from typing import List
 from urllib.request import urlopen
 
+import numpy as np
 import pandas as pd
 import yaml
 from loguru import logger
@@ -111,12 +112,12 @@ def build_table(grouping_column):
     return report_table
 
 
-def add_candidates(response_data: dict):
+def add_candidates(response_data: dict, performance_month: str = None):
     global candidate_df
     data = response_data.get("candidates", None)
     if data:
         candidates = pd.DataFrame(data[1:], columns=data[0])
-        candidates["performance_month"] = context.performance_month
+        candidates["performance_month"] = performance_month or context.current().performance_month
         candidate_df = pd.concat([candidate_df, candidates], ignore_index=True)
 
 
@@ -157,20 +158,49 @@ def set_logger():
     )
 
 
-def merge_and_pivot(performance_df):
+def merge_and_pivot(performance_df, measure=None, months=None):
+    """
+    Merges the performance data with the subject's practitioner role and pivoted comparators.
+
+    With a measure, only that measure's rows are merged and pivoted. With months as well, only the
+    rows a chart of the last months is drawn from: those months and the latest row before them,
+    which gaps at the start of the window are filled from.
+    """
+    run = context.current()
+    comparator_df = run.comparator_df
+    if measure is not None:
+        performance_df = performance_df[performance_df["measure"] == measure]
+        if months:
+            performance_df = last_months(performance_df, months)
+        comparator_df = comparator_df[
+            (comparator_df["measure"] == measure)
+            & comparator_df["period.start"].isin(performance_df["period.start"])
+        ]
+
     # prepare performance data
     performance_enriched = performance_df.merge(
-        context.practitioner_role,
+        run.practitioner_role,
         how="left",
         left_on="subject",
         right_on="PractitionerRole.identifier",
     )
 
-    pivoted_comparator = context.comparator_df.pivot_table(
-        index=["period.start", "measure", "group.subject", "PractitionerRole.code"],
-        columns="group.code",
-        values="measureScore.rate",
-    ).reset_index()
+    index = ["period.start", "measure", "group.subject", "PractitionerRole.code"]
+    if measure is None:
+        pivoted_comparator = comparator_df.pivot_table(
+            index=index,
+            columns="group.code",
+            values="measureScore.rate",
+        ).reset_index()
+    else:
+        # the comparators of other measures and periods are columns of the full pivot too, left empty
+        pivoted_comparator = pivot_rows(
+            comparator_df,
+            index,
+            run.comparator_df.loc[
+                run.comparator_df["measureScore.rate"].notna(), "group.code"
+            ].unique(),
+        )
 
     final_df = performance_enriched.merge(
         pivoted_comparator,
@@ -184,6 +214,49 @@ def merge_and_pivot(performance_df):
     return performance_df
 
 
+def last_months(performance_df, months):
+    """Rows of the last months of performance data, and the latest row before them"""
+    periods = {
+        period: pd.Timestamp(period) for period in performance_df["period.start"].unique()
+    }
+    if not periods:
+        return performance_df
+    start = max(periods.values()) - pd.DateOffset(months=months - 1)
+    earlier = [date for date in periods.values() if date < start]
+    if earlier:
+        start = max(earlier)
+    return performance_df[
+        performance_df["period.start"].isin(
+            [period for period, date in periods.items() if date >= start]
+        )
+    ]
+
+
+def pivot_rows(comparator_df, index, columns):
+    """
+    The comparator pivot of merge_and_pivot (mean rate by index and group code) for the few rows of
+    one measure and window, built directly rather than paying pivot_table's fixed cost. Has a column
+    for each of the given group codes.
+    """
+    rates: dict = {}
+    for *key, code, rate in comparator_df[
+        [*index, "group.code", "measureScore.rate"]
+    ].itertuples(index=False):
+        if pd.isna(rate) or pd.isna(code) or any(pd.isna(value) for value in key):
+            continue
+        rates.setdefault(tuple(key), {}).setdefault(code, []).append(rate)
+
+    codes = sorted({*columns, *(code for by_code in rates.values() for code in by_code)})
+    rows = sorted(rates.items())
+    data = {name: [key[i] for key, _ in rows] for i, name in enumerate(index)}
+    for code in codes:
+        data[code] = np.array(
+            [np.mean(by_code[code]) if code in by_code else np.nan for _, by_code in rows],
+            dtype=float,
+        )
+    return pd.DataFrame(data, columns=[*index, *codes])
+
+
 def candidates(
     subject_graph: Graph, measure: BNode = None, filter_acceptable: bool = False
 ) -> List[Resource]:
@@ -321,7 +394,7 @@ def candidates_records(subject_graph: Graph) -> List[List]:
 def candidate_as_record(a_candidate: Resource) -> List:
     representation = []
 
-    representation.append(context.subject)
+    representation.append(context.current().subject)
     representation.append(a_candidate.value(SLOWMO.RegardingMeasure).identifier)
     score = a_candidate.value(SLOWMO.Score)
     representation.append(score)
@@ -363,12 +436,13 @@ def candidate_as_record(a_candidate: Resource) -> List:
     representation.append(PerformanceTrendSlope)
     representation.append(StreakLength)
 
-    filtered = context.performance_df[
+    run = context.current()
+    filtered = run.performance_df[
         (
-            context.performance_df["measure"]
+            run.performance_df["measure"]
             == str(a_candidate.value(SLOWMO.RegardingMeasure).identifier)
         )
-        & (context.performance_df["period.start"] == context.performance_month)
+        & (run.performance_df["period.start"] == run.performance_month)
     ]
 
     if len(filtered) != 1:
@@ -389,27 +463,59 @@ def load_kb_config(config_path: str) -> dict:
         logger.error(f"Error loading knowledgebase config: {e}")
 
 
-def load_esteemer(context):
-    plugins = entry_points(group="scaffold.esteemer")
-
-    for ep in plugins:
-        if ep.name == startup.esteemer_plugin_name:
-            cls = ep.load()
-            obj = cls(context=context)
+def resolve_esteemer(name: str, version: str) -> type[Esteemer]:
+    """
+    Finds the esteemer plugin in the installed entry points, loads it and checks its version.
+    Returns the plugin class; calling it returns the shared (already initialized) instance
+    """
+    entry_point, cls = find_esteemer(name)
+    check_esteemer_version(name, esteemer_version(entry_point, cls), version)
+
+    # so the plugin initializes again, e.g. after the KB config changed;
+    # plugins built against an SDK without shared instances have nothing to reset
+    reset = getattr(cls, "reset", None)
+    if reset:
+        reset()
+    return cls
+
+
+def find_esteemer(name: str):
+    """The entry point of the esteemer plugin and the Esteemer class it loads"""
+    for ep in entry_points(group="scaffold.esteemer"):
+        if ep.name != name:
+            continue
+        cls = ep.load()
+        if not (isinstance(cls, type) and issubclass(cls, Esteemer)):
+            raise TypeError(f"{name} does not implement required select_candidate() method.")
+        return ep, cls
+
+    raise ValueError(f"Plugin '{name}' not found.")
+
+
+def esteemer_version(entry_point, cls) -> str:
+    """The plugin's VERSION, or the version of the distribution it is installed from"""
+    version = getattr(cls, "VERSION", None)
+    if version is None and entry_point.dist is not None:
+        version = entry_point.dist.version
+    return version
+
+
+def check_esteemer_version(name: str, plugin_version: str, version: str):
+    if plugin_version != version:
+        raise ValueError(
+            f"Plugin '{name}' version mismatch. "
+            f"Expected '{version}', "
+            f"found '{plugin_version}'."
+        )
 
-            if not isinstance(obj, Esteemer):
-                raise TypeError(
-                    f"{startup.esteemer_plugin_name} does not implement required select_candidate() method."
-                )
-            plugin_version = obj.version()
 
-            if plugin_version != startup.esteemer_plugin_version:
-                raise ValueError(
-                    f"Plugin '{startup.esteemer_plugin_name}' version mismatch. "
-                    f"Expected '{startup.esteemer_plugin_version}', "
-                    f"found '{plugin_version}'."
-                )
+def load_esteemer():
+    return startup.esteemer_factory(context=context.current())
 
-            return obj
 
-    raise ValueError(f"Plugin '{startup.esteemer_plugin_name}' not found.")
+def select_candidate():
+    """Selects the current run's candidate with the configured esteemer"""
+    esteemer = load_esteemer()
+    # the esteemer instance is shared, the run's values are read from its context on this thread only
+    with esteemer.selecting_for(context.current()):
+        return esteemer.select_candidate()
@@ -7,7 +7,7 @@ from rdflib import RDF, BNode, Graph, Literal
 from rdflib.resource import Resource
 
 from src import context, startup
-from src.bitstomach.signals import Achievement
+from src.bitstomach.signals import Achievement, Approach, Loss, SignalEvaluation, Trend
 from src.bitstomach.signals._comparison import Comparison
 from src.models import Measure
 from src.utils.namespace import FHIR, PSDO, SLOWMO
@@ -119,7 +119,7 @@ def comparator_data() -> pd.DataFrame:
     ]
     jsonld_str = json.dumps(comparators)
 
-    context.subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
+    context.current().subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
     return comparator_df
 
 
@@ -470,3 +470,23 @@ def test_moderators():
     assert moderator["comparison_size"] == abs(gap)
     assert moderator["trend_size"] == abs(slope) * 2
     assert moderator["prior_comparison_size"] == abs(prior_gap)
+
+
+def test_signals_share_evaluation(perf_data, comparator_data):
+    measure_df = perf_data[perf_data["measure"] == "BP01"]
+    evaluation = SignalEvaluation(
+        measure_df, comparator_data[comparator_data["measure"] == "BP01"]
+    )
+
+    trend = evaluation.detect(Trend)
+    signals = evaluation.detect(Achievement)
+    evaluation.detect(Approach)
+    evaluation.detect(Loss)
+
+    assert evaluation.detect(Trend) is trend
+    assert evaluation.detect(Comparison) is evaluation.comparisons()
+    # detect itself computes afresh
+    assert Trend.detect(measure_df) is not trend
+    assert set(evaluation._gaps) == {
+        str(Comparison.comparator_type(signal)) for signal in signals
+    }
@@ -41,11 +41,10 @@ comparators = [
 ]
 jsonld_str = json.dumps(comparators)
 
-context.subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
-
 
 @pytest.fixture(autouse=True)
 def reset_global():
+    context.current().subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
     yield
     settings.meas_period = 1
 
@@ -103,7 +103,7 @@ def comparator_data() -> pd.DataFrame:
     ]
     jsonld_str = json.dumps(comparators)
 
-    context.subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
+    context.current().subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
     return comparator_df
 
 
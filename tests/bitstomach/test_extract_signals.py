@@ -67,7 +67,7 @@ def prep_base_graph():
     ]
     jsonld_str = json.dumps(comparators)
 
-    context.subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
+    context.current().subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
 
 
 def test_extract_signals_return_a_graph():
@@ -110,10 +110,10 @@ def test_returns_performance_content_with_multiple_elements(prep_base_graph):
         ["PONV05", "2022-11-01", 90.0, "http://purl.obolibrary.org/obo/PSDO_0000094"],
     ]
     comparator_df = pd.DataFrame(comparator_data[1:], columns=comparator_data[0])
-    context.comparator_df = comparator_df
-    context.performance_month = "2022-11-01"
-    context.subject = 157
-    context.performance_df = performance_df
+    context.current().comparator_df = comparator_df
+    context.current().performance_month = "2022-11-01"
+    context.current().subject = 157
+    context.current().performance_df = performance_df
 
     perf_df = bitstomach.prepare()
 
@@ -135,9 +135,9 @@ def test_fix_up_marks_low_count_as_invalid():
         [157, "BP02", "2022-10-01", 1, 2],
     ]
     performance_df = pd.DataFrame(perf_data[1:], columns=COLUMNS)
-    context.performance_month = "2022-11-01"
-    context.subject = 157
-    context.performance_df = performance_df
+    context.current().performance_month = "2022-11-01"
+    context.current().subject = 157
+    context.current().performance_df = performance_df
 
     g = Graph()
     g.add((BNode("PONV05"), RDF.type, FHIR.Measure))
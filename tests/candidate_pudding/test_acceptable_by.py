@@ -88,3 +88,21 @@ def test_accaptable_by(graph):
 
     # then
     assert candidate.value(SLOWMO.AcceptableBy).value == Literal("improving").value
+
+
+def test_precondition_index(graph):
+    templates = candidate_pudding.MessageTemplate.from_graph(graph)
+    index = candidate_pudding.PreconditionIndex.from_templates(templates.values())
+    pathway = URIRef(
+        "https://repo.metadatacenter.org/template-instances/0b160448-c376-476d-b4a9-5e8a5496eaf0"
+    )
+
+    trend = index.mask(
+        [PSDO.positive_performance_trend_content, PSDO.positive_performance_trend_set]
+    )
+    assert index.accepts(pathway, trend)
+    assert index.acceptable_pathways(trend) == [pathway]
+
+    partial = index.mask([PSDO.positive_performance_trend_set, PSDO.comparator_content])
+    assert not index.accepts(pathway, partial)
+    assert index.acceptable_pathways(partial) == []
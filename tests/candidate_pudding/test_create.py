@@ -145,3 +145,54 @@ def test_add_motivating_information(graph):
 
     candidate = candidate_pudding.add_motivating_information(candidate)
     assert 7 == len(list(candidate[RO.has_disposition]))
+
+
+def test_message_template_record(graph):
+    templates = candidate_pudding.MessageTemplate.from_graph(graph)
+
+    record = templates[
+        URIRef(
+            "https://repo.metadatacenter.org/template-instances/9e71ec9e-26f3-442a-8278-569bcd58e708"
+        )
+    ]
+    assert record.name == Literal(
+        "Opportunity to Improve Top 10 Peer Benchmark", datatype=XSD.string
+    )
+    assert record.comparator == PSDO.peer_90th_percentile_benchmark
+    assert record.causal_pathway_name == Literal("social worse", datatype=XSD.string)
+    assert record.display == Literal("Line chart")
+    assert set(record.roles) == {
+        PSDO.negative_performance_gap_set,
+        PSDO.peer_90th_percentile_benchmark,
+    }
+    assert record.directions == frozenset()
+
+    buckets = candidate_pudding.MessageTemplate.by_direction(templates)
+    assert buckets == {"increase": (), "decrease": ()}
+
+
+def test_message_templates_by_direction():
+    graph = Graph()
+    about = {
+        "increase-1": [PSDO.desired_increase],
+        "neither": [PSDO.negative_performance_gap_set],
+        "decrease": [PSDO.desired_decrease],
+        "both": [PSDO.desired_increase, PSDO.desired_decrease],
+        "increase-2": [PSDO.desired_increase, PSDO.positive_performance_gap_set],
+    }
+    for name, roles in about.items():
+        template = graph.resource(BNode(name))
+        template[RDF.type] = candidate_pudding.PERFORMANCE_SUMMARY_DISPLAY_TEMPLATE
+        for role in roles:
+            template.add(IAO.is_about, role)
+
+    templates = candidate_pudding.MessageTemplate.from_graph(graph)
+    buckets = candidate_pudding.MessageTemplate.by_direction(templates)
+
+    names = {direction: [str(t.identifier) for t in bucket] for direction, bucket in buckets.items()}
+    order = [str(identifier) for identifier in templates]
+    assert sorted(names["increase"]) == ["both", "increase-1", "increase-2"]
+    assert sorted(names["decrease"]) == ["both", "decrease"]
+    # catalog order is kept within a bucket
+    assert names["increase"] == [name for name in order if name in names["increase"]]
+    assert templates[BNode("decrease")].directions == frozenset({"decrease"})
@@ -0,0 +1,11 @@
+import pytest
+
+from src import context
+
+
+@pytest.fixture(autouse=True)
+def pipeline_context() -> context.PipelineContext:
+    """Every test runs with a fresh pipeline context, like a pipeline run"""
+    ctx = context.PipelineContext()
+    context.activate(ctx)
+    return ctx
@@ -110,7 +110,7 @@ def comparators():
 @pytest.fixture(autouse=True)
 def setup_subject_graph(comparators):
     jsonld_str = json.dumps(comparators)
-    context.subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
+    context.current().subject_graph = Graph().parse(data=jsonld_str, format="json-ld")
 
 
 @pytest.fixture
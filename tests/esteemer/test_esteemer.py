@@ -7,8 +7,11 @@ from rdflib import RDF, BNode, Graph, Literal, URIRef
 from src import context
 from src.bitstomach.bitstomach import prepare
 from src.bitstomach.signals import Achievement, Comparison, Loss, Trend
+from src.esteemer import scoring
 from src.esteemer.mpm_candidate_selector import MPM_candidate_selector
+from src.utils import utils
 from src.utils.namespace import PSDO, SLOWMO
+from src.utils.settings import settings
 
 PEER_AVERAGE_URI = str(PSDO.peer_average_comparator)
 PEER_75TH_URI = str(PSDO.peer_75th_percentile_benchmark)
@@ -58,9 +61,9 @@ def performance_data_frame(set_desired_increase_graph):
     ]
 
     performance_df = pd.DataFrame(performance_data[1:], columns=performance_data[0])
-    context.subject = 157
-    context.performance_df = performance_df
-    context.performance_month = "2023-08-01"
+    context.current().subject = 157
+    context.current().performance_df = performance_df
+    context.current().performance_month = "2023-08-01"
     perf_df = prepare()
 
     set_desired_increase_graph("PONV05")
@@ -114,17 +117,17 @@ def patched_dependencies(history, mpm):
 
 
 def test_score(candidate_resource):
-    context.subject = 157
-    context.performance_month = "2023-08-01"
-    MPM_candidate_selector(context)._score(candidate_resource)
+    context.current().subject = 157
+    context.current().performance_month = "2023-08-01"
+    MPM_candidate_selector(context.current())._score(candidate_resource)
     assert candidate_resource.value(SLOWMO.Score).value == pytest.approx(2.05)
 
 
 def test_calculate_preference_score(candidate_resource):
-    context.subject = 157
-    context.performance_month = ""
+    context.current().subject = 157
+    context.current().performance_month = ""
     assert (
-        MPM_candidate_selector(context)._score_preferences(candidate_resource, {}) == 0
+        MPM_candidate_selector(context.current())._score_preferences(candidate_resource, {}) == 0
     )
 
 
@@ -145,17 +148,17 @@ def test_select_candidate():
     candidate1[SLOWMO.AcceptableBy] = Literal("Improving")
 
     with patch.object(MPM_candidate_selector, "_score", return_value=None):
-        with patch.object(context, "subject_graph", graph):
-            context.subject = 157
-            context.performance_month = ""
-            selected_candidate = MPM_candidate_selector(context).select_candidate()
+        with patch.object(context.current(), "subject_graph", graph):
+            context.current().subject = 157
+            context.current().performance_month = ""
+            selected_candidate = MPM_candidate_selector(context.current()).select_candidate()
             assert str(selected_candidate.identifier) in ["candidate1", "candidate2"]
             assert str(selected_candidate.identifier) == "candidate1"
 
             candidate3 = graph.resource(BNode("candidate3"))
             candidate3[SLOWMO.Score] = Literal(0.2)
             candidate3[SLOWMO.AcceptableBy] = Literal("Social Worse")
-            selected_candidate = MPM_candidate_selector(context).select_candidate()
+            selected_candidate = MPM_candidate_selector(context.current()).select_candidate()
             assert str(selected_candidate.identifier) in ["candidate1", "candidate3"]
             selected_score = graph.resource(selected_candidate.identifier).value(
                 SLOWMO.Score
@@ -163,6 +166,30 @@ def test_select_candidate():
             assert selected_score.toPython() == pytest.approx(0.2)
 
 
+def test_social_rules_prefer_highest_and_lowest_comparators():
+    graph = Graph()
+    measure = BNode("PONV05")
+
+    def social_candidate(name, pathway, comparator):
+        candidate = graph.resource(BNode(name))
+        candidate[RDF.type] = SLOWMO.Candidate
+        candidate[SLOWMO.RegardingMeasure] = measure
+        candidate[SLOWMO.AcceptableBy] = Literal(pathway)
+        candidate[SLOWMO.RegardingComparator] = comparator
+        return candidate
+
+    gain_average = social_candidate("ga", "Social Gain", PSDO.peer_average_comparator)
+    gain_75th = social_candidate("g75", "Social Gain", PSDO.peer_75th_percentile_benchmark)
+    loss_90th = social_candidate("l90", "Social Loss", PSDO.peer_90th_percentile_benchmark)
+    loss_75th = social_candidate("l75", "Social Loss", PSDO.peer_75th_percentile_benchmark)
+
+    selector = MPM_candidate_selector(context.current())
+    assert not selector._rule_social_highest(gain_average)
+    assert selector._rule_social_highest(gain_75th)
+    assert not selector._rule_social_lowest(loss_90th)
+    assert selector._rule_social_lowest(loss_75th)
+
+
 def test_get_trend_info():
     candidate_resource = Trend._resource(0.0034)
     mods = Trend.moderators([candidate_resource])[0]
@@ -174,27 +201,61 @@ def test_get_trend_info():
 
 
 def test_no_history_signal_is_score_0(candidate_resource):
-    context.subject = 157
-    context.performance_month = "2023-08-01"
+    context.current().subject = 157
+    context.current().performance_month = "2023-08-01"
     assert (
-        MPM_candidate_selector(context)._score_history(candidate_resource, {}, {})
+        MPM_candidate_selector(context.current())._score_history(candidate_resource, {}, {})
         == pytest.approx(1.0)
     )
     assert (
-        MPM_candidate_selector(context)._score_history(candidate_resource, None, {})
+        MPM_candidate_selector(context.current())._score_history(candidate_resource, None, {})
         == pytest.approx(1.0)
     )
 
 
 def test_history_with_two_recurrances(candidate_resource, history, mpm):
-    context.subject = 157
-    context.performance_month = "2023-08-01"
-    score = MPM_candidate_selector(context)._score_history(
+    context.current().subject = 157
+    context.current().performance_month = "2023-08-01"
+    score = MPM_candidate_selector(context.current())._score_history(
         candidate_resource, history, mpm["Social Better"]
     )
     assert score == pytest.approx(0.586589)
 
 
+def test_history_score_leaves_history_unchanged(candidate_resource, history, mpm):
+    context.current().subject = 157
+    context.current().performance_month = "2023-06-01"
+    periods = list(history)
+    MPM_candidate_selector(context.current())._score_history(
+        candidate_resource, history, mpm["Social Better"]
+    )
+    assert list(history) == periods
+
+
+def test_parse_history_by_subject():
+    history = pd.DataFrame(
+        {
+            "subject": ["157", "157", "158", "159"],
+            "period.start": ["2023-05-01", "2023-06-01", "2023-06-01", "2023-06-01"],
+            "history.json": [
+                "{'measure': 'PONV05'}",
+                "{'measure': 'SUS04'}",
+                "{'measure': 'PONV05'}",
+                "not a dict {",
+            ],
+        }
+    )
+    parsed = MPM_candidate_selector(context.current())._parse_history(history)
+    assert parsed == {
+        "157": {
+            "2023-05-01": {"measure": "PONV05"},
+            "2023-06-01": {"measure": "SUS04"},
+        },
+        "158": {"2023-06-01": {"measure": "PONV05"}},
+        "159": {},
+    }
+
+
 def test_social_better_score(performance_data_frame, comparator_data_frame, mpm):
     graph = Graph()
     candidate_resource = graph.resource(BNode())
@@ -204,10 +265,10 @@ def test_social_better_score(performance_data_frame, comparator_data_frame, mpm)
     motivating_informations = Comparison.detect(
         performance_data_frame, comparator_data_frame
     )
-    context.subject = 157
-    context.performance_month = ""
+    context.current().subject = 157
+    context.current().performance_month = ""
 
-    score = MPM_candidate_selector(context)._score_better(
+    score = MPM_candidate_selector(context.current())._score_better(
         candidate_resource, motivating_informations, mpm["Social Better"]
     )
     assert score == pytest.approx(0.05)
@@ -267,9 +328,9 @@ def test_social_worse_score(comparator_data, set_desired_increase_graph, mpm):
     set_desired_increase_graph("PONV05")
 
     motivating_informations = Comparison.detect(data_frame, comparator_df)
-    context.subject = 157
-    context.performance_month = ""
-    score = MPM_candidate_selector(context)._score_worse(
+    context.current().subject = 157
+    context.current().performance_month = ""
+    score = MPM_candidate_selector(context.current())._score_worse(
         candidate_resource, motivating_informations, mpm["Social Worse"]
     )
     assert score == pytest.approx(0.02)
@@ -292,9 +353,9 @@ def test_improving_score(set_desired_increase_graph, mpm):
             },  # slope 1.0
         )
     )
-    context.subject = 157
-    context.performance_month = ""
-    score = MPM_candidate_selector(context)._score_improving(
+    context.current().subject = 157
+    context.current().performance_month = ""
+    score = MPM_candidate_selector(context.current())._score_improving(
         candidate_resource, motivating_informations, mpm["Improving"]
     )
     assert score == pytest.approx(0.02)
@@ -317,9 +378,9 @@ def test_worsening_score(set_desired_increase_graph, mpm):
             },  # slope 1.0
         )
     )
-    context.subject = 157
-    context.performance_month = ""
-    score = MPM_candidate_selector(context)._score_worsening(
+    context.current().subject = 157
+    context.current().performance_month = ""
+    score = MPM_candidate_selector(context.current())._score_worsening(
         candidate_resource, motivating_informations, mpm["Worsening"]
     )
     assert score == pytest.approx(0.02)
@@ -345,9 +406,9 @@ def test_goal_gain_score(comparator_data, set_desired_increase_graph, mpm):
     set_desired_increase_graph("PONV05")
 
     motivating_informations = Achievement.detect(data_frame, comparator_df)
-    context.subject = 157
-    context.performance_month = ""
-    score = MPM_candidate_selector(context)._score_gain(
+    context.current().subject = 157
+    context.current().performance_month = ""
+    score = MPM_candidate_selector(context.current())._score_gain(
         candidate_resource, motivating_informations, mpm["Goal Gain"]
     )
     assert score == pytest.approx(0.062407407407407404)
@@ -374,9 +435,159 @@ def test_goal_loss_score(comparator_data, set_desired_increase_graph, mpm):
     set_desired_increase_graph("PONV05")
 
     motivating_informations = Loss.detect(data_frame, comparator_df)
-    context.subject = 157
-    context.performance_month = ""
-    score = MPM_candidate_selector(context)._score_loss(
+    context.current().subject = 157
+    context.current().performance_month = ""
+    score = MPM_candidate_selector(context.current())._score_loss(
         candidate_resource, motivating_informations, mpm["Goal Loss"]
     )
     assert score == pytest.approx(0.0696296)
+
+
+def performance(rates):
+    return pd.DataFrame(
+        {
+            "measure": "PONV05",
+            "measureScore.rate": rates,
+            "valid": True,
+            "period.start": ["2023-11-01", "2023-12-01", "2024-01-01"],
+        }
+    )
+
+
+def add_candidate(graph, pathway, comparator, motivating_informations):
+    candidate = graph.resource(BNode())
+    candidate[RDF.type] = SLOWMO.Candidate
+    candidate[SLOWMO.RegardingMeasure] = BNode("PONV05")
+    candidate[SLOWMO.AcceptableBy] = Literal(pathway)
+    if comparator:
+        candidate[SLOWMO.RegardingComparator] = comparator
+    for signal in motivating_informations:
+        candidate.add(PSDO.motivating_information, signal)
+        graph += signal.graph
+    return candidate
+
+
+@pytest.fixture
+def scoring_candidates(comparator_data, set_desired_increase_graph):
+    comparator_df = pd.DataFrame(comparator_data[1:], columns=comparator_data[0])
+    set_desired_increase_graph("PONV05")
+
+    gain = Achievement.detect(performance([0.88, 0.89, 0.91]), comparator_df)
+    loss = Loss.detect(performance([0.92, 0.91, 0.88]), comparator_df)
+    comparisons = Comparison.detect(performance([0.89, 0.91, 0.93]), comparator_df)
+    trend = Trend.detect(performance([0.89, 0.90, 0.91]))
+
+    graph = Graph()
+    return {
+        "Goal Gain": add_candidate(graph, "Goal Gain", PSDO.goal_comparator_content, gain),
+        "Goal Loss": add_candidate(graph, "Goal Loss", PSDO.goal_comparator_content, loss),
+        "Social Better": add_candidate(
+            graph, "Social Better", PSDO.peer_average_comparator, comparisons
+        ),
+        "Social Worse": add_candidate(
+            graph, "Social Worse", PSDO.peer_90th_percentile_benchmark, comparisons
+        ),
+        "Improving": add_candidate(graph, "Improving", None, trend),
+    }
+
+
+@pytest.mark.parametrize(
+    "pathway", ["Goal Gain", "Goal Loss", "Social Better", "Social Worse", "Improving"]
+)
+def test_vectorized_scoring_matches_per_candidate_scoring(scoring_candidates, pathway):
+    context.current().subject = 157
+    context.current().performance_month = ""
+    selector = MPM_candidate_selector(context.current())
+    selector._selection.inputs = None
+
+    scored, scores, _ = scoring.score_candidates(selector, list(scoring_candidates.values()))
+    vectorized = dict(zip(scored, scores))
+
+    candidate = scoring_candidates[pathway]
+    candidate.remove(SLOWMO.Score)
+    selector._score(candidate)
+
+    assert len(vectorized) == len(scoring_candidates)
+    assert candidate.value(SLOWMO.Score) is not None
+    assert vectorized[candidate] == candidate.value(SLOWMO.Score).value
+
+
+@pytest.fixture
+def subject_runs(comparator_data, set_desired_increase_graph):
+    """
+    Builds the runs of three subjects with their own candidates and message format preferences.
+    Only the first subject has a peer 90th percentile Social Better candidate, which rules out
+    its peer average one.
+    """
+    comparator_df = pd.DataFrame(comparator_data[1:], columns=comparator_data[0])
+    set_desired_increase_graph("PONV05")
+    subjects = {
+        157: ([0.89, 0.91, 0.93], {"Goal Loss": 3, "Social Worse": 1}),
+        158: ([0.92, 0.91, 0.88], {"Goal Loss": 1, "Social Worse": 3}),
+        159: ([0.88, 0.90, 0.95], {"Goal Loss": 2, "Social Worse": 2}),
+    }
+
+    def build() -> list:
+        runs = []
+        for subject, (rates, message_format) in subjects.items():
+            comparisons = Comparison.detect(performance(rates), comparator_df)
+            loss = Loss.detect(performance([0.92, 0.91, 0.88]), comparator_df)
+            graph = Graph()
+            add_candidate(graph, "Goal Loss", PSDO.goal_comparator_content, loss)
+            add_candidate(
+                graph, "Social Worse", PSDO.peer_90th_percentile_benchmark, comparisons
+            )
+            add_candidate(graph, "Social Better", PSDO.peer_average_comparator, comparisons)
+            if subject == 157:
+                add_candidate(
+                    graph, "Social Better", PSDO.peer_90th_percentile_benchmark, comparisons
+                )
+
+            run = context.PipelineContext()
+            run.subject = subject
+            run.performance_month = "2024-01-01"
+            run.request_info = {"Preferences": {"Utilities": {"Message_Format": message_format}}}
+            run.subject_graph = graph
+            runs.append(run)
+        return runs
+
+    return build
+
+
+def scored_candidates(run) -> dict:
+    return {
+        (
+            candidate.value(SLOWMO.AcceptableBy).value,
+            candidate.value(SLOWMO.RegardingComparator).identifier,
+        ): (candidate.value(SLOWMO.Score).value, candidate.value(SLOWMO.Selected) is not None)
+        for candidate in utils.candidates(run.subject_graph)
+        if candidate.value(SLOWMO.Score) is not None
+    }
+
+
+def test_vectorized_selection_of_many_subjects_matches_serial_selection(
+    subject_runs, monkeypatch
+):
+    selector = MPM_candidate_selector(context.current())
+
+    monkeypatch.setattr(settings, "vectorized_scoring", False)
+    serial_runs = subject_runs()
+    for run in serial_runs:
+        with selector.selecting_for(run):
+            selector.select_candidate()
+
+    monkeypatch.setattr(settings, "vectorized_scoring", True)
+    vectorized_runs = subject_runs()
+    selector.select_candidates(vectorized_runs)
+
+    serial = [scored_candidates(run) for run in serial_runs]
+    assert [scored_candidates(run) for run in vectorized_runs] == serial
+
+    # each subject was scored with its own preferences and comparators
+    selected = [
+        next(key for key, (_, is_selected) in candidates.items() if is_selected)
+        for candidates in serial
+    ]
+    assert [pathway for pathway, _ in selected] == ["Goal Loss", "Social Worse", "Goal Loss"]
+    assert ("Social Better", PSDO.peer_average_comparator) not in serial[0]
+    assert ("Social Better", PSDO.peer_average_comparator) in serial[1]
@@ -58,9 +58,9 @@ def performance_data_frame_periodic(set_desired_increase_graph):
     ]
 
     performance_df = pd.DataFrame(performance_data[1:], columns=performance_data[0])
-    context.subject = 157
-    context.performance_df = performance_df
-    context.performance_month = "2024-01-01"
+    context.current().subject = 157
+    context.current().performance_df = performance_df
+    context.current().performance_month = "2024-01-01"
     set_desired_increase_graph("PONV05")
     perf_df = prepare()
     return perf_df
@@ -113,9 +113,9 @@ def test_history_with_two_recurrances_periodic(
             MPM_candidate_selector, "_load_preferences", return_value=({}, {})
         ),
     ):
-        context.subject = 157
-        context.performance_month = "2024-01-01"
-        score = MPM_candidate_selector(context)._score_history(
+        context.current().subject = 157
+        context.current().performance_month = "2024-01-01"
+        score = MPM_candidate_selector(context.current())._score_history(
             candidate_resource_periodic, history_periodic, mpm["Social Better"]
         )
 
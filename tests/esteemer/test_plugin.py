@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+from rdflib import RDF, BNode, Graph, Literal
+
+from src.esteemer.random_candidate_selector import Random_candidate_selector
+from src.utils.namespace import SLOWMO
+from src.utils.utils import resolve_esteemer
+
+
+def test_resolve_esteemer_returns_plugin_class():
+    factory = resolve_esteemer("random_candidate_selector", "1.0.1")
+
+    assert factory is Random_candidate_selector
+    assert factory(context=None) is factory(context=None)
+
+
+def test_resolve_esteemer_checks_version():
+    with pytest.raises(ValueError, match="version mismatch"):
+        resolve_esteemer("random_candidate_selector", "0.0.0")
+
+
+def test_resolve_esteemer_unknown_plugin():
+    with pytest.raises(ValueError, match="not found"):
+        resolve_esteemer("no_such_selector", "1.0.0")
+
+
+def test_select_candidates_selects_from_each_context():
+    def run(subject):
+        graph = Graph()
+        candidate = graph.resource(BNode(f"candidate-{subject}"))
+        candidate[RDF.type] = SLOWMO.Candidate
+        candidate[SLOWMO.AcceptableBy] = Literal("Social Better")
+        return SimpleNamespace(
+            subject=subject,
+            performance_month="",
+            request_info=None,
+            subject_graph=graph,
+        )
+
+    selector = Random_candidate_selector(context=run("shared"))
+    selections = selector.select_candidates([run("a"), run("b")])
+
+    assert [str(selected.identifier) for selected in selections] == [
+        "candidate-a",
+        "candidate-b",
+    ]
+    assert selector.subject == "shared"
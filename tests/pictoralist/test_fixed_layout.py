@@ -0,0 +1,99 @@
+import math
+
+import pytest
+from PIL import ImageChops
+
+from src.pictoralist import fixed_layout
+from src.pictoralist.fixed_layout import BAR_WIDTH, SUPERSAMPLE, FixedLayoutChart
+
+DPI = 100
+NAVY, GRAY, WHITE = (0, 37, 74), (77, 84, 88), (255, 255, 255)
+
+
+def layout(x_limits, y_limits=(0, 100)):
+    """Where the chart functions put data coordinates, in pixels of the finished image"""
+    chart = FixedLayoutChart(DPI, x_limits, y_limits)
+    return lambda x, y: (
+        round(chart.x(x) / SUPERSAMPLE),
+        round(chart.y(y) / SUPERSAMPLE),
+    )
+
+
+def near(color, expected, tolerance=8):
+    return all(abs(a - b) <= tolerance for a, b in zip(color, expected))
+
+
+def bar_chart(labels=None, goal=()):
+    performance, comparator = [50.0, 80.0], [30.0, math.nan]
+    return fixed_layout.bar_chart(
+        ["Jan '25", "Feb '25"],
+        performance,
+        comparator,
+        "Peer Average",
+        labels or [["50%", "5 / 10"], ["80%", "8 / 10"]],
+        list(goal),
+        DPI,
+    )
+
+
+def test_bars():
+    image = bar_chart()
+    at = layout(fixed_layout._margins(0, 2 - 0.1))
+
+    assert near(image.getpixel(at(BAR_WIDTH / 2, 10)), NAVY)
+    assert near(image.getpixel(at(1 + BAR_WIDTH / 2, 70)), NAVY)
+    assert near(image.getpixel(at(1.5 * BAR_WIDTH, 10)), GRAY)
+    # above the bars, and no comparator bar without a level
+    assert image.getpixel(at(BAR_WIDTH / 2, 60)) == WHITE
+    assert image.getpixel(at(1 + 1.5 * BAR_WIDTH, 10)) == WHITE
+
+
+def test_goal_line():
+    def dark_pixels_at(image, at, level):
+        left, y = at(0, level)
+        right, _ = at(1.8, level)  # short of the axes frame
+        return sum(
+            sum(image.getpixel((x, y + dy))) < 600
+            for x in range(left, right)
+            for dy in (-1, 0, 1)
+        )
+
+    with_goal = bar_chart(goal=[90.0, 90.0])
+    without_goal = bar_chart()
+
+    assert dark_pixels_at(with_goal, layout(fixed_layout._margins(0, 2)), 90) > 20
+    assert dark_pixels_at(without_goal, layout(fixed_layout._margins(0, 2 - 0.1)), 90) == 0
+
+
+def test_bar_labels():
+    labelled = bar_chart()
+    unlabelled = bar_chart(labels=[[""], [""]])
+    at = layout(fixed_layout._margins(0, 2 - 0.1))
+
+    left, top, right, bottom = ImageChops.difference(labelled, unlabelled).getbbox()
+
+    # labels inside the top of both performance bars
+    assert left <= at(BAR_WIDTH / 2, 50)[0] and right >= at(1 + BAR_WIDTH / 2, 80)[0]
+    assert right < at(1 + BAR_WIDTH, 80)[0]
+    assert at(0, 80)[1] <= top and bottom < at(0, 0)[1]
+
+
+@pytest.mark.parametrize("months", [2, 3, 5])
+def test_line_chart_labels_the_last_three_months(months):
+    performance = [40.0 + 10 * i for i in range(months)]
+
+    def line_chart(labels):
+        return fixed_layout.line_chart(
+            [f"M{i}" for i in range(months)], performance, [30.0] * months, "Peer Average",
+            labels, DPI,
+        )
+
+    labelled = line_chart([[f"{level:.0f}%", "1 / 2"] for level in performance])
+    unlabelled = line_chart([[""]] * months)
+    at = layout(fixed_layout._margins(0, months - 1))
+
+    left, _, right, _ = ImageChops.difference(labelled, unlabelled).getbbox()
+
+    first = max(0, months - 3)
+    assert at(first - 0.5, 0)[0] < left < at(first, 0)[0]
+    assert at(months - 1, 0)[0] < right < at(months - 0.5, 0)[0]
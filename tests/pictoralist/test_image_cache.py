@@ -0,0 +1,56 @@
+from src.pictoralist.image_cache import ImageCache, chart_key
+
+
+def test_chart_key_depends_on_content():
+    key = chart_key(display_format="line chart", data={"performance_level": [80.0, 90.0]})
+
+    assert key == chart_key(
+        data={"performance_level": [80.0, 90.0]}, display_format="line chart"
+    )
+    assert key != chart_key(display_format="bar chart", data={"performance_level": [80.0, 90.0]})
+    assert key != chart_key(display_format="line chart", data={"performance_level": [80.0, 91.0]})
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ImageCache(max_items=2)
+    cache.put("a", b"A")
+    cache.put("b", b"B")
+    cache.get("a")
+    cache.put("c", b"C")
+
+    assert cache.get("a") == b"A"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"C"
+
+
+def test_disk_tier_is_shared_and_trimmed_to_budget(tmp_path):
+    cache = ImageCache(max_items=0, directory=str(tmp_path), max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+
+    assert ImageCache(directory=str(tmp_path)).get("a") == b"12345"
+
+    cache.put("c", b"12345")
+
+    assert cache.get("c") == b"12345"
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 10
+
+
+def test_disk_tier_is_scanned_only_over_budget(tmp_path, monkeypatch):
+    cache = ImageCache(max_items=0, directory=str(tmp_path), max_bytes=20)
+    scans = []
+    files = cache._files
+    monkeypatch.setattr(cache, "_files", lambda: scans.append(1) or files())
+
+    for key in "abcd":
+        cache.put(key, b"12345")
+
+    # once to learn the size of the directory, not again while the writes fit
+    assert len(scans) == 1
+
+    cache.put("e", b"12345")
+
+    assert len(scans) == 2
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        f"chart-{key}.img" for key in "bcde"
+    ]
@@ -0,0 +1,128 @@
+import io
+import pickle
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from PIL import Image
+
+from src.pictoralist.pictoralist import CHART_COLUMNS, Chart, Pictoralist, draw_chart
+
+
+def performance() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "period.start": pd.date_range("2024-11-01", periods=3, freq="MS"),
+            "performance_level": [85.0, 20.0, 100.0],
+            "comparator_level": [0.9, 0.9, 0.9],
+            "passed_count": [85, 20, 100],
+            "measureScore.denominator": [100, 100, 100],
+            "goal_percent": [0.8, 0.8, 0.8],
+        }
+    )
+
+
+def line_chart(**settings) -> Chart:
+    return Chart(
+        **{
+            "performance_data": performance(),
+            "display_format": "line chart",
+            "display_timeframe": 3,
+            "comparator_type": "Peer Average",
+            "plot_goal_line": True,
+            "chart_renderer": "matplotlib",
+            "image_format": "png",
+            "image_dpi": 300,
+            "image_optimize": False,
+            "image_max_bytes": 0,
+            **settings,
+        }
+    )
+
+
+def chart(**image_settings) -> bytes:
+    plot = line_chart(**image_settings)
+    plot.new_figure()
+    plot.axes.plot(["Jan", "Feb", "Mar"], [20, 80, 50], label="You", marker=".")
+    plot.axes.legend()
+    return plot.plot_and_save()
+
+
+def test_formats():
+    assert chart().startswith(b"\x89PNG")
+    assert chart(image_format="webp")[8:12] == b"WEBP"
+    assert b"<svg" in chart(image_format="svg")
+
+
+def test_optimized_png_is_a_smaller_palette_image():
+    png = chart()
+    optimized = chart(image_optimize=True)
+
+    assert Image.open(io.BytesIO(optimized)).mode == "P"
+    assert len(optimized) < len(png)
+
+
+def test_resolution_is_lowered_to_fit_the_budget():
+    png = chart()
+    budget = len(png) // 3
+
+    image = chart(image_max_bytes=budget)
+
+    assert len(image) <= budget
+    assert Image.open(io.BytesIO(image)).width < Image.open(io.BytesIO(png)).width
+
+
+@pytest.mark.parametrize("display_format", ["line chart", "bar chart"])
+def test_fixed_layout_renderer_matches_the_matplotlib_chart_size(display_format):
+    matplotlib_chart = Image.open(io.BytesIO(line_chart(display_format=display_format).draw()))
+    fixed_layout_chart = Image.open(
+        io.BytesIO(line_chart(display_format=display_format, chart_renderer="pillow").draw())
+    )
+
+    assert abs(fixed_layout_chart.width - matplotlib_chart.width) < 20
+    assert abs(fixed_layout_chart.height - matplotlib_chart.height) < 20
+
+
+def test_unknown_renderer():
+    with pytest.raises(ValueError, match="Unknown chart renderer"):
+        line_chart(chart_renderer="plotly").draw()
+
+
+@pytest.mark.parametrize("chart_renderer", ["matplotlib", "pillow"])
+def test_charts_are_drawn_from_the_plotted_window_only(chart_renderer):
+    earlier = performance().assign(
+        **{"period.start": pd.date_range("2024-08-01", periods=3, freq="MS")}
+    )
+    candidate = {
+        "measure_name": "PONV05",
+        "measure_title": "Nausea",
+        "template_id": "template",
+        "template_name": "Template",
+        "display": "bar chart",
+        "message_text": "not needed to draw the chart",
+        "comparator_type": "Peer Average",
+        "acceptable_by": [],
+    }
+    settings = SimpleNamespace(
+        log_level="INFO",
+        generate_image=True,
+        cache_image=False,
+        image_format="png",
+        image_dpi=300,
+        image_optimize=False,
+        image_max_bytes=0,
+        chart_renderer=chart_renderer,
+        display_window=3,
+        plot_goal_line=True,
+    )
+    data = pd.concat([earlier, performance()], ignore_index=True)
+    data["measureScore.rate"] = data["passed_count"] / data["measureScore.denominator"]
+    pc = Pictoralist(data, candidate, settings)
+
+    plot = pickle.loads(pickle.dumps(pc.chart()))
+
+    assert list(plot.performance_data.columns) == CHART_COLUMNS
+    assert plot.performance_data["period.start"].tolist() == performance()["period.start"].tolist()
+    assert draw_chart(plot) == draw_chart(
+        line_chart(display_format="bar chart", chart_renderer=chart_renderer)
+    )
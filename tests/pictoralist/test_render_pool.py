@@ -0,0 +1,26 @@
+from functools import partial
+
+from src.pictoralist.image_cache import ImageCache
+from src.pictoralist.render_pool import RenderPool
+
+
+def test_tickets_share_renders():
+    cache = ImageCache(max_items=4)
+    pool = RenderPool(workers=1, cache=cache)
+    try:
+        future = pool.submit("a", partial(bytes, b"PNG"))
+
+        assert pool.submit("a", partial(bytes, b"other")) is future
+        assert future.result(timeout=60) == b"PNG"
+        assert pool.get("a").result() == b"PNG"
+    finally:
+        pool.shutdown()
+
+
+def test_unknown_tickets_are_looked_up_in_the_cache():
+    cache = ImageCache(max_items=4)
+    cache.put("b", b"PNG")
+    pool = RenderPool(workers=1, cache=cache)
+
+    assert pool.get("b").result() == b"PNG"
+    assert pool.get("c") is None
@@ -0,0 +1,150 @@
+import asyncio
+import email
+import threading
+from concurrent.futures import Future
+
+import httpx
+import orjson
+import pytest
+
+from src import startup
+from src.utils.settings import settings
+
+
+@pytest.fixture(scope="module")
+def api():
+    # the API loads the knowledge base on import, these tests don't need one
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(startup, "startup", lambda: None)
+        from src import api
+    return api
+
+
+async def post(client: httpx.AsyncClient, request_id: str) -> httpx.Response:
+    return await client.post("/createprecisionfeedback/", json={"@id": request_id})
+
+
+def client(api) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test")
+
+
+def test_busy_api_returns_503(api, monkeypatch):
+    monkeypatch.setattr(settings, "api_concurrency", 1)
+    monkeypatch.setattr(settings, "api_queue_depth", 0)
+    started, release = threading.Event(), threading.Event()
+
+    def create_feedback(req_info):
+        started.set()
+        release.wait(5)
+        return {"message": {"text_message": "done"}, "message_instance_id": req_info["@id"]}
+
+    monkeypatch.setattr(api, "create_feedback", create_feedback)
+
+    async def requests():
+        async with client(api) as c:
+            first = asyncio.create_task(post(c, "first"))
+            await asyncio.to_thread(started.wait, 5)
+            busy = await post(c, "second")
+            release.set()
+            return await first, busy, await post(c, "third")
+
+    first, busy, third = asyncio.run(requests())
+
+    assert first.status_code == 200
+    assert first.json()["message_instance_id"] == "first"
+    assert busy.status_code == 503
+    assert busy.headers["Retry-After"] == "1"
+    assert busy.json()["detail"]["message_instance_id"] == "second"
+    # the slot is free again once the first request is done
+    assert third.status_code == 200
+    assert api.pending_requests == 0
+
+
+@pytest.mark.parametrize("body", [{"@id": "overloaded"}, {}, ["not", "a", "request"]])
+def test_overloaded_api_returns_503(api, monkeypatch, body):
+    monkeypatch.setattr(settings, "api_concurrency", 1)
+    monkeypatch.setattr(settings, "api_queue_depth", 0)
+    monkeypatch.setattr(api, "pending_requests", 1)
+
+    async def requests():
+        async with client(api) as c:
+            return await c.post("/createprecisionfeedback/", json=body)
+
+    response = asyncio.run(requests())
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["detail"] == {
+        "message": "Server is busy, try again later.",
+        "message_instance_id": body.get("@id") if isinstance(body, dict) else None,
+    }
+
+
+def parts(response: httpx.Response) -> list:
+    message = email.message_from_bytes(
+        f"Content-Type: {response.headers['content-type']}\r\n\r\n".encode() + response.content
+    )
+    return message.get_payload()
+
+
+def multipart(api, monkeypatch, full_message: dict) -> list:
+    monkeypatch.setattr(settings, "image_encoding", "binary")
+    monkeypatch.setattr(settings, "image_format", "png")
+    monkeypatch.setattr(api, "create_feedback", lambda req_info: full_message)
+
+    async def requests():
+        async with client(api) as c:
+            return await post(c, "multipart")
+
+    response = asyncio.run(requests())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("multipart/mixed; boundary=")
+    return parts(response)
+
+
+def test_binary_image_is_a_part_of_its_own(api, monkeypatch):
+    full_message = {"message": {"text_message": "done", "image": b"\x89PNG chart"}}
+
+    message, image = multipart(api, monkeypatch, full_message)
+
+    assert message.get_content_type() == "application/json"
+    assert orjson.loads(message.get_payload(decode=True))["message"]["image"] == "cid:image"
+    assert image.get_content_type() == "image/png"
+    assert image["Content-ID"] == "<image>"
+    assert image.get_payload(decode=True) == b"\x89PNG chart"
+
+
+@pytest.mark.parametrize(
+    "full_message",
+    [
+        {"message": {"text_message": "done", "image": []}},
+        {"message_instance_id": "no message selected"},
+    ],
+)
+def test_multipart_without_chart(api, monkeypatch, full_message):
+    (message,) = multipart(api, monkeypatch, full_message)
+
+    assert message.get_content_type() == "application/json"
+    assert orjson.loads(message.get_payload(decode=True)) == full_message
+
+
+@pytest.mark.parametrize(
+    "image_format, media_type", [("png", "image/png"), ("webp", "image/webp"), ("svg", "image/svg+xml")]
+)
+def test_image_is_served_with_the_configured_media_type(api, monkeypatch, image_format, media_type):
+    monkeypatch.setattr(settings, "image_format", image_format)
+    drawn = Future()
+    drawn.set_result(b"chart")
+    monkeypatch.setattr(api.render_pool, "get", lambda ticket: drawn if ticket == "known" else None)
+
+    async def requests():
+        async with client(api) as c:
+            return await c.get("/image/known"), await c.get("/image/unknown")
+
+    known, unknown = asyncio.run(requests())
+
+    assert known.status_code == 200
+    assert known.headers["content-type"] == media_type
+    assert known.content == b"chart"
+    assert unknown.status_code == 404
@@ -0,0 +1,267 @@
+import gc
+import os
+import pathlib
+import random
+import shutil
+import subprocess
+import threading
+
+import orjson
+import pandas as pd
+import pytest
+from rdflib import BNode, Graph, Literal
+
+from src import cli, context, gunicorn_conf, startup
+from src.utils import utils
+from src.utils.namespace import SLOWMO
+from src.utils.settings import settings
+
+SANDBOX = pathlib.Path(__file__).parent.parent / "sandbox" / "hospital quality dashboard usecase"
+KNOWLEDGE_BASE = SANDBOX / "knowledge-base"
+
+thread_counts_at_fork = []
+os.register_at_fork(before=lambda: thread_counts_at_fork.append(threading.active_count()))
+
+
+def square(item: int, loaded: int) -> tuple[int, int]:
+    return item, loaded * loaded
+
+
+def load(item: int) -> int:
+    return item + 1
+
+
+def double(item: int) -> int:
+    return item * 2
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_prefetch_map_keeps_order(workers):
+    results = list(cli._prefetch_map(square, load, list(range(20)), workers))
+
+    assert results == [(item, (item + 1) ** 2) for item in range(20)]
+
+
+def test_workers_are_forked_before_io_threads_start():
+    thread_counts_at_fork.clear()
+    threads = threading.active_count()
+
+    list(cli._prefetch_map(square, load, list(range(10)), 2))
+
+    assert thread_counts_at_fork == [threads, threads]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_worker_map_keeps_order(workers):
+    assert list(cli._worker_map(double, list(range(15)), workers)) == [
+        item * 2 for item in range(15)
+    ]
+
+
+def test_written_messages(tmp_path):
+    good = tmp_path / "good"
+    good.mkdir()
+    unwritable = tmp_path / "unwritable"
+    unwritable.mkdir()
+    (unwritable / "messages").write_text("a file where the messages folder should be")
+
+    input_files = [good / "a.json", good / "b.json", unwritable / "c.json"]
+    results = [
+        ({"message": "a"}, True, "2024-01-01"),
+        ({"message": "failed"}, False, "2024-01-01"),
+        ({"message": "c"}, True, "2024-01-01"),
+    ]
+
+    written = list(cli._written(input_files, iter(results), workers=2))
+
+    assert written[:2] == results[:2]
+    assert written[2][1] is False
+    assert written[2][0]["input_file"] == str(unwritable / "c.json")
+    assert [path.name for path in (good / "messages").iterdir()] == [
+        "a - message for 2024-01-01.json"
+    ]
+    assert orjson.loads(
+        (good / "messages" / "a - message for 2024-01-01.json").read_bytes()
+    ) == {"message": "a"}
+
+
+def test_record_results_counts():
+    results = [({}, True, "2024-01-01"), ({}, False, "2024-01-01"), ({}, True, "2024-01-01")]
+
+    assert cli._record_results(iter(results), stats_only=True) == (2, 1)
+
+
+class FailingEsteemer:
+    """Selects the first runs of a batch, then fails"""
+
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+
+    def select_candidates(self, batch):
+        selections = []
+        for index, run in enumerate(batch):
+            if index == self.fail_at:
+                raise ValueError("batch selection failed")
+            selections.append(mark_selected(run))
+        return selections
+
+
+def mark_selected(run):
+    candidate = run.subject_graph.resource(BNode())
+    candidate[SLOWMO.Selected] = Literal(True)
+    return candidate
+
+
+@pytest.fixture
+def subject_runs(monkeypatch):
+    selected_alone = []
+
+    def from_global(subject):
+        run = context.PipelineContext()
+        run.subject = subject
+        run.performance_month = f"2024-0{subject}-01"
+        run.subject_graph = Graph()
+        context.activate(run)
+
+    def select_candidate():
+        selected_alone.append(context.current().subject)
+        return mark_selected(context.current())
+
+    def compose_message(performance_df, selected_candidate):
+        graph = context.current().subject_graph
+        return {"selected": len(list(graph.subjects(SLOWMO.Selected, Literal(True))))}
+
+    def subject_runs(esteemer, subjects):
+        monkeypatch.setattr(cli, "load_esteemer", lambda: esteemer)
+        return cli._run_subjects(subjects, pathlib.Path("unused"), stats_only=True)
+
+    subject_runs.selected_alone = selected_alone
+    monkeypatch.setattr(context, "from_global", from_global)
+    monkeypatch.setattr(cli, "prepare_candidates", lambda: None)
+    monkeypatch.setattr(cli, "select_candidate", select_candidate)
+    monkeypatch.setattr(cli, "compose_message", compose_message)
+    return subject_runs
+
+
+def test_failed_batch_selection_selects_per_subject(subject_runs):
+    results = subject_runs(FailingEsteemer(fail_at=2), [1, 2, 3])
+
+    assert [success for _, success, _ in results] == [True, True, True]
+    # the candidates selected before the failure are not selected twice
+    assert [message["selected"] for message, _, _ in results] == [1, 1, 1]
+    assert subject_runs.selected_alone == [1, 2, 3]
+
+
+def test_failed_selection_of_one_subject_is_not_retried(subject_runs):
+    results = subject_runs(FailingEsteemer(fail_at=0), [1])
+
+    assert results == [
+        ({"message": "batch selection failed", "subject": 1}, False, "2024-01-01")
+    ]
+    assert subject_runs.selected_alone == []
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        subprocess, "run", lambda command, **options: commands.append((command, options))
+    )
+    return commands
+
+
+def test_web_preload_runs_gunicorn(commands):
+    cli.web(workers=3, preload=True)
+
+    assert commands == [
+        (
+            ["gunicorn", "src.api:app", "--workers", "3", "--config", "python:src.gunicorn_conf"],
+            {"check": True},
+        )
+    ]
+
+
+def test_web_runs_uvicorn(commands):
+    cli.web(workers=2, preload=False)
+
+    assert commands == [
+        (["uvicorn", "src.api:app", "--workers", "2", "--use-colors"], {})
+    ]
+
+
+def test_gunicorn_preloads_and_freezes_startup_state(monkeypatch):
+    frozen = []
+    monkeypatch.setattr(gc, "freeze", lambda: frozen.append(True))
+
+    gunicorn_conf.pre_fork(server=None, worker=None)
+
+    assert gunicorn_conf.preload_app is True
+    assert frozen == [True]
+
+
+def test_gunicorn_worker_class_is_installed():
+    util = pytest.importorskip("gunicorn.util")
+
+    worker = util.load_class(gunicorn_conf.worker_class)
+
+    assert worker.__name__ == "UvicornWorker"
+
+
+@pytest.fixture
+def sandbox(monkeypatch, tmp_path):
+    """Runs batch_csv on a copy of the sandbox tabular inputs with the sandbox knowledge base"""
+    default_preferences = (KNOWLEDGE_BASE / "preferences.json").as_uri()
+    monkeypatch.setattr(settings, "manifest", (KNOWLEDGE_BASE / "manifest.yaml").as_uri())
+    monkeypatch.setattr(settings, "config", (KNOWLEDGE_BASE / "config.yaml").as_uri())
+    monkeypatch.setattr(settings, "default_preferences", default_preferences)
+    monkeypatch.setattr(settings, "kb_snapshot_dir", "")
+    monkeypatch.setenv("default_preferences", default_preferences)
+    monkeypatch.setenv(
+        "mpm",
+        str(KNOWLEDGE_BASE / "prioritization_algorithms" / "motivational_potential_model.csv"),
+    )
+    monkeypatch.delenv("history", raising=False)
+    monkeypatch.delenv("preferences", raising=False)
+
+    # ties between candidates are broken at random, seeded per subject like a replay
+    from_global = context.from_global
+
+    def seeded(subject):
+        random.seed(subject)
+        from_global(subject)
+
+    monkeypatch.setattr(context, "from_global", seeded)
+
+    def batch_csv(name, **options) -> tuple[pathlib.Path, list]:
+        inputs = tmp_path / name / "tabular inputs"
+        shutil.copytree(SANDBOX / "data" / "tabular inputs", inputs)
+        monkeypatch.setattr(utils, "candidate_df", pd.DataFrame())
+        monkeypatch.setattr(utils, "response_df", pd.DataFrame())
+
+        cli.batch_csv(inputs, max_files=6, performance_month="2024-12-01", **options)
+        return inputs.parent / "messages", list(utils.response_df["subject"])
+
+    yield batch_csv
+    # don't leave the plugin initialized with the sandbox model to later tests
+    startup.esteemer_factory.reset()
+
+
+def written_message(path: pathlib.Path) -> dict:
+    message = orjson.loads(path.read_bytes())
+    message.pop("message_generated_datetime")
+    return message
+
+
+def test_batch_csv_workers_write_the_same_messages(sandbox):
+    serial, serial_subjects = sandbox("serial", workers=1)
+    parallel, parallel_subjects = sandbox("parallel", workers=2)
+
+    names = sorted(path.name for path in serial.iterdir())
+    assert len(names) == 6
+    assert sorted(path.name for path in parallel.iterdir()) == names
+    for name in names:
+        assert written_message(parallel / name) == written_message(serial / name), name
+
+    # results are recorded in subject order either way
+    assert parallel_subjects == serial_subjects
+    assert len(set(serial_subjects)) == 6
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+from src import startup
+
+
+@pytest.fixture
+def comparators():
+    return pd.DataFrame(
+        {
+            "measure": ["M1", "M1", "M2", "M1", "M2"],
+            "group.subject": ["org1", "org1", "org1", "org2", "org2"],
+            "PractitionerRole.code": ["R1", "R2", "R1", "R1", "R1"],
+            "measureScore.rate": [0.1, 0.2, 0.3, 0.4, 0.5],
+        }
+    )
+
+
+@pytest.fixture
+def comparator_partitions(monkeypatch, comparators):
+    def use(columns):
+        monkeypatch.setattr(startup, "comparator_measure_report", comparators)
+        monkeypatch.setattr(startup, "comparator_partition_columns", columns)
+        monkeypatch.setattr(
+            startup, "comparator_partitions", startup.partition(comparators, columns)
+        )
+
+    return use
+
+
+def test_partition_rows_keep_table_order(comparators):
+    partitions = startup.partition(comparators, ["group.subject"])
+
+    rows = startup.partition_rows(comparators, partitions, "org1")
+
+    assert rows["measureScore.rate"].tolist() == [0.1, 0.2, 0.3]
+
+
+def test_missing_key_has_no_rows(comparators):
+    partitions = startup.partition(comparators, ["group.subject"])
+
+    rows = startup.partition_rows(comparators, partitions, "org3")
+
+    assert rows.empty
+    assert list(rows.columns) == list(comparators.columns)
+
+
+def test_no_columns_no_partitions(comparators):
+    assert startup.partition(comparators, []) == {}
+
+
+def test_categorical_keys(comparators):
+    comparators["group.subject"] = comparators["group.subject"].astype(
+        pd.CategoricalDtype(["org1", "org2", "org3"])
+    )
+
+    partitions = startup.partition(comparators, ["group.subject"])
+
+    # categories without rows get no partition
+    assert set(partitions) == {"org1", "org2"}
+    rows = startup.partition_rows(comparators, partitions, "org2")
+    assert rows["measureScore.rate"].tolist() == [0.4, 0.5]
+    assert startup.partition_rows(comparators, partitions, "org3").empty
+
+
+def test_comparator_rows_by_several_columns(comparator_partitions):
+    comparator_partitions(["group.subject", "PractitionerRole.code"])
+
+    rows = startup.comparator_rows({"group.subject": "org1", "PractitionerRole.code": "R1"})
+
+    assert rows["measureScore.rate"].tolist() == [0.1, 0.3]
+    assert startup.comparator_rows(
+        {"group.subject": "org2", "PractitionerRole.code": "R2"}
+    ).empty
+
+
+def test_comparator_rows_by_one_column(comparator_partitions):
+    comparator_partitions(["group.subject"])
+
+    rows = startup.comparator_rows({"group.subject": "org2", "PractitionerRole.code": "R9"})
+
+    assert rows["measureScore.rate"].tolist() == [0.4, 0.5]
+
+
+def test_comparator_rows_without_merge_columns(comparator_partitions, comparators):
+    comparator_partitions([])
+
+    rows = startup.comparator_rows({"group.subject": "org1", "PractitionerRole.code": "R1"})
+
+    assert rows.equals(comparators)
+    assert rows is not comparators
+
+
+def test_all_periods_without_lookback(monkeypatch):
+    monkeypatch.setattr(startup.settings, "performance_lookback", 0)
+
+    assert startup.period_filters("2025-01-01") == []
+
+
+def test_lookback_periods(monkeypatch):
+    monkeypatch.setattr(startup.settings, "performance_lookback", 3)
+
+    assert startup.period_filters("2025-01-01") == [
+        ("period.start", "<=", pd.Timestamp("2025-01-01")),
+        ("period.start", ">=", pd.Timestamp("2024-11-01")),
+    ]
+    assert startup.period_filters(None) == []
@@ -0,0 +1,60 @@
+import contextvars
+import threading
+
+import pytest
+
+from src import context
+
+
+def test_contexts_are_isolated():
+    first = context.PipelineContext()
+    second = context.PipelineContext()
+
+    def run(ctx, subject):
+        context.activate(ctx)
+        context.current().subject = subject
+        context.current().performance_df["rate"] = [subject]
+        return context.current()
+
+    assert contextvars.copy_context().run(run, first, "a") is first
+    assert contextvars.copy_context().run(run, second, "b") is second
+
+    assert (first.subject, second.subject) == ("a", "b")
+    assert first.performance_df["rate"].tolist() == ["a"]
+    assert second.performance_df["rate"].tolist() == ["b"]
+    # neither run touched the context of the caller
+    assert context.current() not in (first, second)
+    assert context.current().subject == "0"
+
+
+def test_no_context_outside_a_run():
+    def run():
+        return context.current()
+
+    # a new thread starts without any context
+    with pytest.raises(RuntimeError):
+        contextvars.Context().run(run)
+
+
+def test_from_req_is_isolated_per_thread():
+    start = threading.Barrier(2)
+    seen = {}
+
+    def run(subject):
+        context.from_req(
+            {
+                "subject": subject,
+                "performance_month": "2024-05-01",
+                "Preferences": {},
+            }
+        )
+        start.wait()
+        seen[subject] = (context.current().subject, context.current().request_info["subject"])
+
+    threads = [threading.Thread(target=run, args=(s,)) for s in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert seen == {"a": ("a", "a"), "b": ("b", "b")}
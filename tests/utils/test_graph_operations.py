@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from rdflib import Literal, URIRef
+
+from src import startup  # noqa: F401 - imported first, as the app does, for the import cycle through utils
+from src.utils import graph_operations
+from src.utils.settings import positive_int
+
+EXAMPLE = "http://example.com/"
+
+
+def json_ld(name: str) -> str:
+    return json.dumps({"@id": EXAMPLE + name, EXAMPLE + "label": name})
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    (tmp_path / "measures").mkdir()
+    for name in ("a", "b", "c"):
+        (tmp_path / "measures" / f"{name}.json").write_text(json_ld(name))
+    path = tmp_path / "manifest.yaml"
+    path.write_text("measures/:\n  - a.json\n  - missing.json\n  - b.json\n  - c.json\n")
+    return path.as_uri()
+
+
+def test_manifest_files_in_order(manifest):
+    files = graph_operations.read_manifest(manifest)
+
+    assert [file.rsplit("/", 1)[1] for file in files] == [
+        "a.json",
+        "missing.json",
+        "b.json",
+        "c.json",
+    ]
+
+
+def test_graph_has_every_readable_file(manifest, monkeypatch):
+    monkeypatch.setattr(graph_operations.settings, "kb_load_workers", 2)
+
+    sources = graph_operations.fetch_sources(manifest)
+    graph = graph_operations.manifest_to_graph(manifest)
+
+    assert [content is None for content in sources.values()] == [False, True, False, False]
+    assert {str(label) for label in graph.objects(None, URIRef(EXAMPLE + "label"))} == {
+        "a",
+        "b",
+        "c",
+    }
+    assert (URIRef(EXAMPLE + "b"), URIRef(EXAMPLE + "label"), Literal("b")) in graph
+
+
+def test_unparsable_file_is_skipped():
+    graph = graph_operations.graph_from_sources(
+        {"file:///kb/a.json": json_ld("a"), "file:///kb/bad.json": "{not json"}
+    )
+
+    assert len(graph) == 1
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_worker_count_must_be_positive(value):
+    with pytest.raises(ValueError):
+        positive_int(value)
+
+    assert positive_int("3") == 3
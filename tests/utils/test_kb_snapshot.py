@@ -0,0 +1,69 @@
+from rdflib import RDF, BNode, Graph, Literal
+
+from src.models import Measure
+from src.utils import kb_snapshot
+from src.utils.namespace import FHIR
+
+SOURCES = {"file:///kb/measures/PONV05.json": '{"@id": "_:PONV05"}'}
+MANIFEST = kb_snapshot.manifest_id("file:///kb/manifest.yaml")
+
+
+def knowledge_base() -> tuple[Graph, dict[str, Measure]]:
+    g = Graph()
+    measure = g.resource(BNode("PONV05"))
+    measure[RDF.type] = FHIR.Measure
+    measure[FHIR.identifier] = Literal("PONV05")
+    return g, Measure.from_graph(g)
+
+
+def test_snapshot_round_trip(tmp_path):
+    graph, catalog = knowledge_base()
+    key = kb_snapshot.snapshot_key(SOURCES)
+
+    assert kb_snapshot.load_snapshot(tmp_path, MANIFEST, key) is None
+
+    kb_snapshot.save_snapshot(tmp_path, MANIFEST, key, graph, catalog)
+    loaded_graph, loaded_catalog = kb_snapshot.load_snapshot(tmp_path, MANIFEST, key)
+
+    assert set(loaded_graph) == set(graph)
+    assert loaded_catalog == catalog
+
+
+def test_key_follows_content():
+    changed = {"file:///kb/measures/PONV05.json": '{"@id": "_:PONV06"}'}
+    moved = {"file:///kb/other/PONV05.json": '{"@id": "_:PONV05"}'}
+
+    assert kb_snapshot.snapshot_key(SOURCES) == kb_snapshot.snapshot_key(dict(SOURCES))
+    assert kb_snapshot.snapshot_key(SOURCES) != kb_snapshot.snapshot_key(changed)
+    assert kb_snapshot.snapshot_key(SOURCES) != kb_snapshot.snapshot_key(moved)
+
+
+def test_stale_snapshots_are_replaced(tmp_path):
+    graph, catalog = knowledge_base()
+    old_key = kb_snapshot.snapshot_key(SOURCES)
+    new_key = kb_snapshot.snapshot_key({"file:///kb/measures/PONV05.json": "{}"})
+
+    kb_snapshot.save_snapshot(tmp_path, MANIFEST, old_key, graph, catalog)
+    kb_snapshot.save_snapshot(tmp_path, MANIFEST, new_key, graph, catalog)
+
+    assert [p.name for p in tmp_path.iterdir()] == [f"kb-{MANIFEST}-{new_key}.pickle"]
+
+
+def test_snapshots_of_other_manifests_are_kept(tmp_path):
+    graph, catalog = knowledge_base()
+    other = kb_snapshot.manifest_id("file:///other/manifest.yaml")
+    key = kb_snapshot.snapshot_key(SOURCES)
+
+    kb_snapshot.save_snapshot(tmp_path, other, key, graph, catalog)
+    kb_snapshot.save_snapshot(tmp_path, MANIFEST, key, graph, catalog)
+
+    assert other != MANIFEST
+    assert kb_snapshot.load_snapshot(tmp_path, other, key) is not None
+    assert kb_snapshot.load_snapshot(tmp_path, MANIFEST, key) is not None
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    key = kb_snapshot.snapshot_key(SOURCES)
+    kb_snapshot.snapshot_path(tmp_path, MANIFEST, key).write_bytes(b"not a pickle")
+
+    assert kb_snapshot.load_snapshot(tmp_path, MANIFEST, key) is None
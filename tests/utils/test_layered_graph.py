@@ -0,0 +1,97 @@
+from rdflib import RDF, BNode, Graph, Literal
+
+from src.utils.layered_graph import LayeredGraph
+from src.utils.namespace import IAO, PSDO, SLOWMO
+
+
+def base_graph() -> Graph:
+    g = Graph()
+    template = g.resource(BNode("template"))
+    template[RDF.type] = PSDO.performance_summary_display_template
+    template.add(IAO.is_about, PSDO.positive_performance_trend_set)
+    return g
+
+
+def test_reads_see_base_and_delta():
+    base = base_graph()
+    g = LayeredGraph(base)
+
+    candidate = g.resource(BNode("candidate"))
+    candidate[RDF.type] = SLOWMO.Candidate
+    candidate[SLOWMO.AncestorTemplate] = BNode("template")
+
+    assert set(g.subjects(RDF.type, None)) == {BNode("template"), BNode("candidate")}
+    assert list(candidate[SLOWMO.AncestorTemplate / IAO.is_about]) == [
+        g.resource(PSDO.positive_performance_trend_set)
+    ]
+    assert len(g) == 4
+
+
+def test_writes_do_not_touch_base():
+    base = base_graph()
+    g = LayeredGraph(base)
+
+    g.add((BNode("x"), RDF.value, Literal(1)))
+    g += base  # already present triples are not duplicated into the delta
+    g.remove((BNode("template"), None, None))
+
+    assert len(base) == 2
+    assert (BNode("x"), RDF.value, Literal(1)) not in base
+    assert (BNode("template"), RDF.type, PSDO.performance_summary_display_template) in base
+
+
+def test_remove_base_triple():
+    base = base_graph()
+    g = LayeredGraph(base)
+    about = (BNode("template"), IAO.is_about, PSDO.positive_performance_trend_set)
+
+    g.remove(about)
+
+    assert about in base
+    assert about not in g
+    assert list(g.objects(BNode("template"), IAO.is_about)) == []
+    assert len(g) == 1 == len(list(g))
+
+    g.add(about)
+
+    assert about in g
+    assert len(g) == 2 == len(list(g))
+
+
+def test_removed_base_triples_stay_per_graph():
+    base = base_graph()
+    g = LayeredGraph(base)
+
+    g.remove((BNode("template"), None, None))
+
+    assert len(g) == 0
+    assert len(LayeredGraph(base)) == 2
+
+
+def test_set_base_triple():
+    base = base_graph()
+    g = LayeredGraph(base)
+
+    g.set((BNode("template"), IAO.is_about, PSDO.negative_performance_trend_set))
+
+    assert list(g.objects(BNode("template"), IAO.is_about)) == [
+        PSDO.negative_performance_trend_set
+    ]
+    assert list(base.objects(BNode("template"), IAO.is_about)) == [
+        PSDO.positive_performance_trend_set
+    ]
+
+
+def test_triples_choices():
+    base = base_graph()
+    g = LayeredGraph(base)
+    g.add((BNode("x"), RDF.value, Literal(1)))
+    g.remove((BNode("template"), RDF.type, None))
+
+    assert set(g.triples_choices(([BNode("template"), BNode("x")], None, None))) == {
+        (BNode("template"), IAO.is_about, PSDO.positive_performance_trend_set),
+        (BNode("x"), RDF.value, Literal(1)),
+    }
+    assert set(g.triples_choices((None, [RDF.type, RDF.value], None))) == {
+        (BNode("x"), RDF.value, Literal(1)),
+    }
@@ -0,0 +1,68 @@
+import pandas as pd
+
+from src import context
+from src.utils.utils import merge_and_pivot
+
+MONTHS = [f"2024-{month:02d}-01" for month in range(1, 11)]
+
+
+def performance():
+    rows = [
+        {
+            "subject": "1",
+            "measure": measure,
+            "period.start": month,
+            "measureScore.rate": 0.5 + i / 100,
+            "measureScore.denominator": 100,
+        }
+        for measure in ("A", "B")
+        for i, month in enumerate(MONTHS)
+        # a gap right before the last six months of A
+        if not (measure == "A" and month in ("2024-04-01", "2024-05-01", "2024-06-01"))
+    ]
+    return pd.DataFrame(rows)
+
+
+def comparators():
+    rows = [
+        {
+            "measure": measure,
+            "period.start": month,
+            "group.subject": "org",
+            "PractitionerRole.code": "role",
+            "group.code": code,
+            "measureScore.rate": 0.8,
+        }
+        for measure, codes in (("A", ["peer"]), ("B", ["peer", "goal"]))
+        for month in MONTHS
+        for code in codes
+    ]
+    return pd.DataFrame(rows)
+
+
+def run(measure, months):
+    # the test's own context, see conftest
+    ctx = context.current()
+    ctx.practitioner_role = pd.DataFrame(
+        {"PractitionerRole.identifier": ["1"], "PractitionerRole.code": ["role"]}
+    )
+    ctx.comparator_df = comparators()
+    return merge_and_pivot(performance(), measure, months)
+
+
+def test_selected_measure_rows_match_the_full_merge():
+    full = run(None, None)
+    full = full[full["measure"] == "A"].reset_index(drop=True)
+
+    selected = run("A", None).reset_index(drop=True)
+
+    assert selected[full.columns].equals(full)
+
+
+def test_window_keeps_the_row_gaps_are_filled_from():
+    selected = run("A", 6)
+
+    # the last six months start with a gap, filled from March
+    assert selected["period.start"].tolist() == MONTHS[2:3] + MONTHS[6:]
+    # B's goal comparator is a column of the full pivot, so it is here too, empty
+    assert selected["goal"].isna().all()
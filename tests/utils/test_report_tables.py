@@ -0,0 +1,118 @@
+import importlib.util
+
+import pandas as pd
+import pytest
+
+from src.utils.report_tables import compact, read_report, report_path
+
+needs_pyarrow = pytest.mark.skipif(
+    importlib.util.find_spec("pyarrow") is None, reason="pyarrow is not installed"
+)
+
+COLUMNS = ["measure", "subject", "period.start", "measureScore.rate"]
+
+
+def report():
+    return pd.DataFrame(
+        {
+            "identifier": ["a", "b", "c", "d"],
+            "measure": ["M1", "M1", "M2", "M2"],
+            "subject": ["007", "007", "008", None],
+            "period.start": pd.to_datetime(
+                ["2024-10-01", "2024-11-01", "2024-12-01", "2025-01-01"]
+            ),
+            "measureScore.rate": [0.1, 0.2, 0.3, 0.4],
+        }
+    )
+
+
+def read(directory, filters=()):
+    return read_report(
+        directory,
+        "PerformanceMeasureReport",
+        columns=COLUMNS + ["not.in.report"],
+        filters=filters,
+        dates=["period.start"],
+        strings=["subject"],
+        categories=["measure"],
+        parse_dates=["period.start"],
+        dtype={"subject": str},
+    )
+
+
+@needs_pyarrow
+def test_prefers_columnar_files(tmp_path):
+    report().to_csv(tmp_path / "PerformanceMeasureReport.csv", index=False)
+    assert report_path(tmp_path, "PerformanceMeasureReport").suffix == ".csv"
+
+    report().to_feather(tmp_path / "PerformanceMeasureReport.feather")
+    assert report_path(tmp_path, "PerformanceMeasureReport").suffix == ".feather"
+
+    report().to_parquet(tmp_path / "PerformanceMeasureReport.parquet")
+    assert report_path(tmp_path, "PerformanceMeasureReport").suffix == ".parquet"
+
+
+@needs_pyarrow
+def test_reads_only_used_columns(tmp_path):
+    report().to_parquet(tmp_path / "PerformanceMeasureReport.parquet")
+
+    frame = read(tmp_path)
+
+    assert list(frame.columns) == COLUMNS
+    assert isinstance(frame["measure"].dtype, pd.CategoricalDtype)
+    assert frame["period.start"].dtype == "datetime64[ns]"
+    assert frame["subject"].tolist()[:3] == ["007", "007", "008"]
+    assert pd.isna(frame["subject"].iloc[3])
+
+
+@needs_pyarrow
+@pytest.mark.parametrize("dates", ["timestamp", "date", "text"])
+def test_filters_match_csv(tmp_path, dates):
+    table = report()
+    if dates == "date":
+        table["period.start"] = table["period.start"].dt.date
+    if dates == "text":
+        table["period.start"] = table["period.start"].dt.strftime("%Y-%m-%d")
+    table.to_parquet(tmp_path / "PerformanceMeasureReport.parquet")
+    csv_directory = tmp_path / "csv"
+    csv_directory.mkdir()
+    report().to_csv(csv_directory / "PerformanceMeasureReport.csv", index=False)
+
+    filters = [
+        ("period.start", "<=", pd.Timestamp("2024-12-01")),
+        ("period.start", ">=", pd.Timestamp("2024-11-01")),
+    ]
+    columnar = read(tmp_path, filters)
+    csv = read(csv_directory, filters)
+
+    assert columnar["period.start"].tolist() == csv["period.start"].tolist()
+    assert columnar["measure"].astype(str).tolist() == csv["measure"].tolist()
+    assert columnar["measureScore.rate"].tolist() == [0.2, 0.3]
+
+
+def test_csv_reads_only_used_columns(tmp_path):
+    report().to_csv(tmp_path / "PerformanceMeasureReport.csv", index=False)
+
+    assert list(read(tmp_path).columns) == COLUMNS
+
+
+def test_compact_is_lossless():
+    table = report()
+    table["measureScore.denominator"] = [10.0, 20.0, 30.0, 40.0]
+    table["measureScore.numerator"] = [1.5, 2.0, 3.0, 4.0]
+    table["measureScore.count"] = [1.0, 2.0, 3.0, 2.0**40]
+
+    compacted = compact(
+        table,
+        categories=["measure", "subject", "not.in.table"],
+        integers=["measureScore.denominator", "measureScore.numerator", "measureScore.count"],
+    )
+
+    assert isinstance(compacted["measure"].dtype, pd.CategoricalDtype)
+    assert compacted["subject"].tolist()[:3] == ["007", "007", "008"]
+    assert compacted["measureScore.denominator"].dtype == "int32"
+    # fractions and values out of the int32 range are kept as they are
+    assert compacted["measureScore.numerator"].dtype == "float64"
+    assert compacted["measureScore.count"].dtype == "float64"
+    assert compacted["measureScore.rate"].dtype == "float64"
+    assert table["measure"].dtype == object
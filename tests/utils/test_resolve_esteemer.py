@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import pytest
+from scaffold_sdk import Esteemer
+
+from src import startup  # noqa: F401, loads src.utils before utils.utils
+from src.utils import utils
+
+
+class Plugin(Esteemer):
+    VERSION = "1.0"
+
+    def select_candidate(self):
+        return None
+
+    def version(self) -> str:
+        return self.VERSION
+
+
+class DistributedPlugin(Plugin):
+    VERSION = None
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    def install(cls, dist_version=None):
+        entry_point = SimpleNamespace(
+            name="plugin",
+            load=lambda: cls,
+            dist=SimpleNamespace(version=dist_version) if dist_version else None,
+        )
+        monkeypatch.setattr(utils, "entry_points", lambda group: [entry_point])
+
+    yield install
+    Esteemer._instances.pop(Plugin, None)
+    Esteemer._instances.pop(DistributedPlugin, None)
+
+
+def test_resolve_initializes_plugin_again(installed):
+    installed(Plugin)
+    first = Plugin(context=None)
+
+    assert utils.resolve_esteemer("plugin", "1.0") is Plugin
+    assert Plugin(context=None) is not first
+
+
+def test_resolve_does_not_create_the_plugin(installed):
+    installed(Plugin)
+
+    utils.resolve_esteemer("plugin", "1.0")
+
+    assert Plugin not in Esteemer._instances
+
+
+def test_resolve_plugin_without_reset(installed, monkeypatch):
+    installed(Plugin)
+    # an SDK from before plugins were shared has no reset
+    monkeypatch.delattr(Esteemer, "reset")
+
+    assert utils.resolve_esteemer("plugin", "1.0") is Plugin
+
+
+def test_resolve_checks_version(installed):
+    installed(Plugin)
+
+    with pytest.raises(ValueError, match="version mismatch"):
+        utils.resolve_esteemer("plugin", "2.0")
+
+
+def test_version_of_the_distribution(installed):
+    installed(DistributedPlugin, dist_version="3.1")
+
+    assert utils.resolve_esteemer("plugin", "3.1") is DistributedPlugin
+    with pytest.raises(ValueError, match="found '3.1'"):
+        utils.resolve_esteemer("plugin", "1.0")
+
+
+def test_unknown_plugin(installed):
+    installed(Plugin)
+
+    with pytest.raises(ValueError, match="not found"):
+        utils.resolve_esteemer("other", "1.0")
@@ -0,0 +1,12 @@
+import pytest
+
+from src.utils.settings import Settings
+
+
+@pytest.mark.parametrize("name", ["render_workers", "api_concurrency"])
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_worker_counts_must_be_positive(monkeypatch, name, value):
+    monkeypatch.setenv(name, value)
+
+    with pytest.raises(ValueError, match="at least 1"):
+        Settings()